@@ -1,15 +1,34 @@
 """Small group management application."""
 
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 
+from .alternatives import shutdown_pool
 from .database import init_db
+from .instrumentation import TimedJinja2Templates, install as install_instrumentation
+from .profiling import install as install_profiling
+from .telemetry import telemetry_store
+from .tempering import start_forkserver
+from .tracing import install as install_tracing
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optimizer worker processes fork from a server started here rather
+    # than in the first request
+    start_forkserver()
+    yield
+    # The alternatives worker pool must not outlive the server
+    shutdown_pool()
+    # Optimizer runs still queued for SQLite are written before exiting
+    telemetry_store.flush()
+
 
 # Create the FastAPI app
-app = FastAPI(title="Small Group Manager")
+app = FastAPI(title="Small Group Manager", lifespan=lifespan)
 
 # Mount static files
 static_path = Path(__file__).parent / "static"
@@ -19,11 +38,20 @@ app.mount("/static", StaticFiles(directory=str(static_path)), name="static")
 # Set up templates
 templates_path = Path(__file__).parent / "templates"
 templates_path.mkdir(exist_ok=True)
-templates = Jinja2Templates(directory=str(templates_path))
+templates = TimedJinja2Templates(directory=str(templates_path))
 
 # Make templates available in app.state
 app.state.templates = templates
 
+# Record per-route latency, SQL and template timings
+install_instrumentation(app)
+
+# Write sampled request traces to traces.jsonl in the data directory
+install_tracing(app)
+
+# Profile individual requests on demand (only when ENABLE_PROFILING is set)
+install_profiling(app)
+
 # Initialize database if DB_PATH is set
 db_path = os.environ.get("DB_PATH")
 if db_path:
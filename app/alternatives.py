@@ -0,0 +1,285 @@
+"""Several good, mutually distinct partitions from one optimization run.
+
+Organizers sometimes need to choose between options, for example to avoid a
+pairing no constraint describes. find_alternatives runs ALTERNATIVE_STARTS
+independent local searches (with single-member moves and rotations, see
+app.partition) in a pool of worker processes, all attached to one
+SharedRoster. The first search starts from the given partition, the others
+from random placement-preserving swaps of it, so they end in different local
+optima. Results are deduplicated by canonical_form and the best ``k`` are
+returned with their score breakdowns.
+
+The pool is created on first use and kept until shutdown_pool(), which the
+app calls on shutdown, so workers keep their attachment caches warm. Tasks
+only carry the roster handle, a seed and the name of a one-byte cancellation
+flag the workers poll every sweep; results only an assignment vector and
+scores.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Sequence, Tuple
+
+from loguru import logger
+
+from .constraints import ConstraintSet
+from .diversity import DiversityConfig
+from .group_divider import Group, partition_score_components
+from .history import RepeatPairing
+from .partition import improve_state
+from .shared_roster import RosterHandle, SharedRoster, attach
+from .single_flight import CancellationToken
+from .telemetry import OptimizerTelemetry
+from .tempering import _CONTEXT
+from .tracing import record_span
+
+# Independent searches per run
+ALTERNATIVE_STARTS = int(os.getenv("ALTERNATIVE_STARTS", "8"))
+
+# Worker processes of the search pool
+ALTERNATIVE_WORKERS = int(os.getenv("ALTERNATIVE_WORKERS", str(os.cpu_count() or 1)))
+
+# Wall-clock budget when the caller sets none
+ALTERNATIVES_TIME_LIMIT = float(os.getenv("ALTERNATIVES_TIME_LIMIT", "5"))
+
+# Pool workers fork from the server shared with app.tempering
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+CanonicalForm = Tuple[Tuple[int, ...], ...]
+
+
+@dataclass
+class Alternative:
+    """One of the partitions returned by find_alternatives."""
+
+    groups: List[Group]
+    score_components: Dict[str, float]
+    constraint_violations: int
+
+
+def canonical_form(groups: Sequence[Group]) -> CanonicalForm:
+    """The sorted member ids of each non-empty group, sorted; equal for
+    partitions that only differ in group or member order."""
+    return tuple(
+        sorted(tuple(sorted(m.id for m in g.members)) for g in groups if g.members)
+    )
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=ALTERNATIVE_WORKERS, mp_context=_CONTEXT
+            )
+        return _executor
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes; the next run starts a new pool."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+
+
+class _CancelFlag:
+    """Cancellation token of a worker's search: one byte of shared memory
+    that find_alternatives sets once its own token is cancelled."""
+
+    def __init__(self, name: str):
+        self._shm = SharedMemory(name=name)
+
+    @property
+    def cancelled(self) -> bool:
+        return bool(self._shm.buf[0])
+
+    def close(self) -> None:
+        self._shm.close()
+
+
+def _search(
+    handle: RosterHandle, cancel_flag: str, seed: int, kicks: int, deadline: float
+) -> Tuple[List[int], float, int, str] | None:
+    """Worker task: ``kicks`` random swaps, then local search until
+    stagnation, ``deadline`` (a time.time() value) or cancellation.
+
+    :param cancel_flag: Name of the run's cancellation flag block
+    :return: The assignment, total score, violations and stop reason of the
+        search, or None if it was cancelled or the deadline passed before the
+        task started
+    """
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        return None
+    try:
+        token = _CancelFlag(cancel_flag)
+    except FileNotFoundError:
+        # The run ended before this task started
+        return None
+    try:
+        if token.cancelled:
+            return None
+        return _kick_and_improve(handle, token, seed, kicks, remaining)
+    finally:
+        token.close()
+
+
+def _kick_and_improve(
+    handle: RosterHandle, token: _CancelFlag, seed: int, kicks: int, remaining: float
+) -> Tuple[List[int], float, int, str] | None:
+    state = attach(handle).state()
+    # The local search draws from the module RNG
+    random.seed(seed)
+    num_members = len(state.members)
+    for _ in range(kicks if len(state.group_members) > 1 else 0):
+        i, j = random.randrange(num_members), random.randrange(num_members)
+        if state.assignment[i] != state.assignment[j] and state.can_swap(i, j):
+            state.apply_swap(i, j)
+    stop_reason = improve_state(
+        state,
+        deadline=time.perf_counter() + remaining,
+        cancel_token=token,
+        neighborhood=True,
+    )
+    if stop_reason == "cancelled":
+        return None
+    return state.assignment, state.total, state.violations, stop_reason
+
+
+def find_alternatives(
+    groups: List[Group],
+    k: int = 3,
+    target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+    starts: int | None = None,
+) -> List[Alternative]:
+    """
+    Find up to ``k`` distinct good partitions of the members of ``groups``.
+
+    :param groups: Partition to start from, typically the heuristic placement
+    :param k: Number of partitions to return
+    :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token checked while the searches run; once
+        it is cancelled the workers stop at their next sweep and
+        OptimizationCancelled is raised
+    :param telemetry: Optional telemetry record filled in with the number of
+        searches, the "alternatives" phase time and the scores and
+        violations of the best partition
+    :param time_limit: Wall-clock budget in seconds; defaults to
+        ALTERNATIVES_TIME_LIMIT
+    :param diversity: Diversity config the score is computed with
+    :param constraints: Optional constraints; partitions with fewer
+        violations rank first
+    :param pairing: Optional repeat-pairing penalty, part of the score
+    :param starts: Number of searches; defaults to ALTERNATIVE_STARTS
+    :return: Distinct partitions, best first; fewer than ``k`` if the
+        searches did not find that many
+    """
+    phase_start = time.perf_counter()
+    if time_limit is None:
+        time_limit = ALTERNATIVES_TIME_LIMIT
+    starts = max(starts or ALTERNATIVE_STARTS, k)
+    deadline = time.time() + time_limit
+    seed = random.randrange(2**32)
+    kicks = sum(len(g.members) for g in groups) // 2
+
+    results: List[Tuple[List[int], float, int, str]] = []
+    cancel_flag = SharedMemory(create=True, size=1)
+    cancel_flag.buf[0] = 0
+    roster = SharedRoster(groups, target_size, diversity, constraints, pairing)
+    try:
+        pending: set[Future] = {
+            _pool().submit(
+                _search,
+                roster.handle,
+                cancel_flag.name,
+                seed + s,
+                kicks if s else 0,
+                deadline,
+            )
+            for s in range(starts)
+        }
+        while pending:
+            if cancel_token is not None and cancel_token.cancelled:
+                cancel_flag.buf[0] = 1
+                for future in pending:
+                    future.cancel()
+                break
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            results.extend(r for r in (f.result() for f in done) if r is not None)
+    except BrokenProcessPool:
+        shutdown_pool()
+        raise
+    finally:
+        cancel_flag.close()
+        cancel_flag.unlink()
+        roster.close()
+
+    seconds = time.perf_counter() - phase_start
+    if cancel_token is not None and cancel_token.cancelled:
+        if telemetry is not None:
+            telemetry.stop_reason = "cancelled"
+            telemetry.add_phase("alternatives", seconds)
+        cancel_token.raise_if_cancelled()
+
+    alternatives: List[Alternative] = []
+    seen = set()
+    for assignment, _, violations, _ in sorted(
+        results, key=lambda result: (result[2], -result[1])
+    ):
+        candidate = roster.to_groups(assignment)
+        form = canonical_form(candidate)
+        if form in seen:
+            continue
+        seen.add(form)
+        alternatives.append(
+            Alternative(
+                groups=candidate,
+                score_components=partition_score_components(
+                    candidate, target_size, diversity, pairing
+                ),
+                constraint_violations=violations,
+            )
+        )
+        if len(alternatives) == k:
+            break
+
+    logger.info(
+        f"Found {len(alternatives)} distinct partitions in {len(results)} "
+        f"searches over {seconds:.2f}s"
+    )
+    record_span(
+        "alternatives",
+        phase_start,
+        seconds,
+        members=len(roster.members),
+        searches=len(results),
+        alternatives=len(alternatives),
+    )
+    if telemetry is not None:
+        telemetry.roster_size = len(roster.members)
+        telemetry.num_groups = len(groups)
+        telemetry.iterations += len(results)
+        timed_out = len(results) < starts or any(
+            result[3] == "time_limit" for result in results
+        )
+        telemetry.stop_reason = "time_limit" if timed_out else "stagnation"
+        telemetry.add_phase("alternatives", seconds)
+        if alternatives:
+            telemetry.score_components = alternatives[0].score_components
+            telemetry.constraint_violations = alternatives[0].constraint_violations
+    return alternatives
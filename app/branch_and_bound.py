@@ -0,0 +1,633 @@
+"""Exact division of small rosters by branch and bound.
+
+On quiet weeks there are few enough members that the best partition can be
+found outright instead of improved by swaps. The search keeps the number of
+groups of the partition it starts from and maximizes the partition score of
+PartitionState, which is a sum of per-group scores because the partition-wide
+averages only depend on the roster and the number of groups.
+
+The search space is cut down three ways:
+
+* Group sizes are fixed up front, one non-increasing size vector at a time,
+  so the size penalties are constants of each subproblem. So are the
+  graduate quotas: every way of handing the groups of the starting partition
+  out to the sizes is a subproblem of its own.
+* Members the score cannot tell apart (same diversity positions, prep,
+  leader and graduate status and caps, and no pair constraint or repeat
+  pairing of their own) form one type, and the search decides how many members of each type
+  go to each group rather than where each member goes.
+  Groups of equal size and quota that have received the same members so far
+  are interchangeable, so the first of them always gets at least as many
+  members of the next type as the others.
+* Every node is bounded by the best score the partition could still reach:
+  per group and diversity term, the remaining places are filled with the
+  rarest categories still available, the remaining prep attendees and
+  leaders are spread over the free places as evenly as possible, and each
+  member still to be placed adds at least the repeat-pairing weight it has
+  with the members of the cheapest group it can join. Subtrees whose bound
+  does not beat the best partition found so far are skipped.
+
+Besides the score, the division follows the placement rules the other
+engines keep: every group gets a leader when there are enough leaders, and
+every group has as many graduates as one of the starting partition's groups,
+whose graduate-only groups stay graduate-only (see PartitionState.can_move).
+All constraints must hold.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from loguru import logger
+
+from .constraints import ConstraintSet
+from .diversity import DiversityConfig
+from .group_divider import Group, partition_score_components
+from .history import RepeatPairing
+from .partition import MIN_IMPROVEMENT, PartitionState
+from .single_flight import CancellationToken
+from .telemetry import OptimizerTelemetry
+from .tracing import record_span
+
+# Rosters up to this size are divided exactly by the branch_and_bound engine
+BRANCH_AND_BOUND_MAX_MEMBERS = int(os.getenv("BRANCH_AND_BOUND_MAX_MEMBERS", "20"))
+
+# Search budget in seconds when the caller sets no time limit
+BRANCH_AND_BOUND_TIME_LIMIT = float(os.getenv("BRANCH_AND_BOUND_TIME_LIMIT", "5"))
+
+
+@dataclass(slots=True)
+class _MemberType:
+    """Roster members the search treats as interchangeable."""
+
+    members: List[int]
+    positions: Tuple[int, ...]
+    prep: int
+    leader: int
+    graduated: int
+    caps: Tuple[int, ...]
+    individual: bool
+
+
+# Graduates of a group, and whether it has no other members
+Quota = Tuple[int, bool]
+
+
+def _size_vectors(total: int, parts: int, largest: int) -> Iterator[Tuple[int, ...]]:
+    """Non-increasing group sizes of at least one member adding up to ``total``."""
+    if parts == 1:
+        if 1 <= total <= largest:
+            yield (total,)
+        return
+    for first in range(min(largest, total - parts + 1), -(-total // parts) - 1, -1):
+        for rest in _size_vectors(total - first, parts - 1, first):
+            yield (first, *rest)
+
+
+class _Search:
+    """Depth-first branch and bound over the member types of a roster."""
+
+    def __init__(
+        self,
+        state: PartitionState,
+        constraints: ConstraintSet | None,
+        deadline: float | None,
+        cancel_token: CancellationToken | None,
+    ):
+        self.state = state
+        self.deadline = deadline
+        self.cancel_token = cancel_token
+        self.num_groups = len(state.group_members)
+        members = state.members
+        kernel = state.kernel
+        self.xlogx = kernel.xlogx
+        self.position_weights = kernel.position_weights
+
+        compiled = constraints.compile(members) if constraints else None
+        self.separate = compiled.separate if compiled else None
+        self.together = compiled.together if compiled else None
+        self.cap_limits = [cap.limit for cap in compiled.caps] if compiled else []
+        self.pair_weights = state.pair_weights
+
+        types: Dict[tuple, _MemberType] = {}
+        for i in range(len(members)):
+            individual = bool(
+                (compiled and (compiled.separate[i] or compiled.together[i]))
+                or (self.pair_weights and self.pair_weights[i])
+            )
+            caps = compiled.member_caps[i] if compiled else ()
+            key = (
+                ("member", i)
+                if individual
+                else (
+                    state.positions[i],
+                    state.is_prep[i],
+                    state.is_leader[i],
+                    state.is_graduated[i],
+                    caps,
+                )
+            )
+            if key not in types:
+                types[key] = _MemberType(
+                    [],
+                    state.positions[i],
+                    state.is_prep[i],
+                    state.is_leader[i],
+                    state.is_graduated[i],
+                    caps,
+                    individual,
+                )
+            types[key].members.append(i)
+        # Leaders first so the leader rule prunes early, then larger types and
+        # the members with the most repeat-pairing weight at stake
+        pair_weight = [
+            sum(weights.values())
+            for weights in self.pair_weights or [{}] * len(members)
+        ]
+        self.types = sorted(
+            types.values(),
+            key=lambda t: (
+                -t.leader,
+                -len(t.members),
+                -pair_weight[t.members[0]],
+                t.members[0],
+            ),
+        )
+        # Members with repeat-pairing weights, by the depth they are placed at
+        self.paired = [
+            (depth, t.members[0])
+            for depth, t in enumerate(self.types)
+            if self.pair_weights and self.pair_weights[t.members[0]]
+        ]
+        self.need_leader = sum(state.is_leader) >= self.num_groups
+        self.quotas = sorted(
+            (graduates, graduates == size)
+            for graduates, size in zip(state.graduates, state.sizes)
+        )
+
+        # Diversity positions of each term, for the entropy bound
+        terms: Dict[int, set] = {}
+        for positions in state.positions:
+            for term, p in enumerate(positions):
+                terms.setdefault(term, set()).add(p)
+        self.terms = [sorted(positions) for positions in terms.values()]
+        # Entropy sums of _fill by (room, position counts, available positions)
+        self.fill_cache: Dict[tuple, float] = {}
+
+        self.best_total = float("-inf")
+        self.best: List[List[int]] | None = None
+        self.nodes = 0
+        self.stop_reason = "optimal"
+        self.upper_bound = float("inf")
+
+    def _reset(self, sizes: Tuple[int, ...], quotas: Tuple[Quota, ...]) -> None:
+        k = self.num_groups
+        state = self.state
+        self.sizes = sizes
+        self.room = list(sizes)
+        self.graduate_room = [graduates for graduates, _ in quotas]
+        self.counts = [[0] * len(self.position_weights) for _ in range(k)]
+        self.entropy_sums = [0.0] * k
+        self.prep = [0] * k
+        self.leaders = [0] * k
+        self.cap_counts = [[0] * len(self.cap_limits) for _ in range(k)]
+        self.repeat = [0.0] * k
+        self.individuals: List[List[int]] = [[] for _ in range(k)]
+        self.group_of: Dict[int, int] = {}
+        self.tied = [
+            g > 0 and sizes[g] == sizes[g - 1] and quotas[g] == quotas[g - 1]
+            for g in range(k)
+        ]
+        self.available = [0] * len(self.position_weights)
+        for positions in state.positions:
+            for p in positions:
+                self.available[p] += 1
+        self.prep_left = sum(state.is_prep)
+        self.leaders_left = sum(state.is_leader)
+        self.allocations: List[Tuple[int, ...]] = []
+
+    def run(self) -> bool:
+        """Search every size vector; False if the search was cut short."""
+        total = len(self.state.members)
+        k = self.num_groups
+        bounded = []
+        for sizes in _size_vectors(total, k, total - k + 1):
+            for quotas in self._quota_vectors(sizes, self.quotas):
+                self._reset(sizes, quotas)
+                bounded.append((self._bound(), sizes, quotas))
+        bounded.sort(reverse=True)
+        for bound, sizes, quotas in bounded:
+            if bound <= self.best_total + MIN_IMPROVEMENT:
+                break
+            # No division left to search can score more than this
+            self.upper_bound = bound
+            self._reset(sizes, quotas)
+            if not self._branch(0):
+                return False
+        self.upper_bound = self.best_total
+        return True
+
+    def _quota_vectors(
+        self,
+        sizes: Tuple[int, ...],
+        left: List[Quota],
+        g: int = 0,
+        previous: Quota | None = None,
+    ) -> Iterator[Tuple[Quota, ...]]:
+        """Ways to hand the quotas ``left`` to the groups from ``g`` on: a
+        graduate-only group must be exactly as large as its quota, any other
+        larger. Groups of equal size take their quotas in descending order."""
+        if g == len(sizes):
+            yield ()
+            return
+        tied = g > 0 and sizes[g] == sizes[g - 1]
+        for q, quota in enumerate(left):
+            graduates, graduate_only = quota
+            if (q and quota == left[q - 1]) or (tied and quota > previous):
+                continue
+            if graduates > sizes[g] or (graduates == sizes[g]) != graduate_only:
+                continue
+            for rest in self._quota_vectors(
+                sizes, left[:q] + left[q + 1 :], g + 1, quota
+            ):
+                yield (quota, *rest)
+
+    def _fill(self, counts: List[int], room: int) -> float:
+        """Smallest entropy sum ``room`` more available members can give a
+        group with position ``counts``: each term's places go to the rarest
+        categories."""
+        available = self.available
+        xlogx = self.xlogx
+        weights = self.position_weights
+        entropy_sum = 0.0
+        for term in self.terms:
+            levels = [counts[p] for p in term]
+            spare = [available[p] for p in term]
+            for _ in range(room):
+                lowest = -1
+                for q, level in enumerate(levels):
+                    if spare[q] and (lowest < 0 or level < levels[lowest]):
+                        lowest = q
+                levels[lowest] += 1
+                spare[lowest] -= 1
+            entropy_sum += weights[term[0]] * sum(xlogx[c] for c in levels)
+        return entropy_sum
+
+    def _bound(self) -> float:
+        """Best score the partition can still reach.
+
+        The entropy and size terms are bounded group by group; the prep and
+        leader penalties by handing out the remaining prep attendees and
+        leaders as evenly as the free places of the groups allow.
+        """
+        state = self.state
+        sizes = self.sizes
+        total = 0.0
+        for g, room in enumerate(self.room):
+            if room:
+                counts = self.counts[g]
+                key = (room, tuple(counts), tuple(self.available))
+                entropy_sum = self.fill_cache.get(key)
+                if entropy_sum is None:
+                    entropy_sum = self.fill_cache[key] = self._fill(counts, room)
+            else:
+                entropy_sum = self.entropy_sums[g]
+            # At the average prep and leader counts only those terms remain
+            total += (
+                state._score(
+                    sizes[g],
+                    state.avg_prep,
+                    state.ideal_leader_ratio * sizes[g],
+                    entropy_sum,
+                )
+                - self.repeat[g]
+            )
+
+        if self.paired:
+            total -= self._repeat_ahead()
+
+        avg_prep = state.avg_prep
+        ratio = state.ideal_leader_ratio
+        total -= self._spread(
+            self.prep, self.prep_left, lambda g, x: (x - avg_prep) ** 2 * 0.4
+        )
+        total -= self._spread(
+            self.leaders,
+            self.leaders_left,
+            lambda g, x: (x / sizes[g] - ratio) ** 2 * sizes[g] * 0.6,
+        )
+        return total
+
+    def _repeat_ahead(self) -> float:
+        """Repeat-pairing penalty the members still to be placed add at least:
+        each of them joins some group with free places and the members already
+        placed there."""
+        depth = len(self.allocations)
+        group_of = self.group_of
+        room = self.room
+        penalty = 0.0
+        for placed_at, i in self.paired:
+            if placed_at < depth:
+                continue
+            added = [0.0] * self.num_groups
+            for j, weight in self.pair_weights[i].items():
+                g = group_of.get(j)
+                if g is not None:
+                    added[g] += weight
+            penalty += min(a for a, free in zip(added, room) if free)
+        return penalty
+
+    def _spread(
+        self, counts: List[int], left: int, cost: Callable[[int, int], float]
+    ) -> float:
+        """Smallest total ``cost(g, count)`` over the groups once ``left`` more
+        members are added to groups with free places; ``cost`` is convex in
+        the count, so adding them one at a time where it costs least is
+        optimal."""
+        current = list(counts)
+        room = list(self.room)
+        penalty = sum(cost(g, c) for g, c in enumerate(current))
+        for _ in range(left):
+            cheapest, step = -1, 0.0
+            for g, c in enumerate(current):
+                if room[g]:
+                    change = cost(g, c + 1) - cost(g, c)
+                    if cheapest < 0 or change < step:
+                        cheapest, step = g, change
+            current[cheapest] += 1
+            room[cheapest] -= 1
+            penalty += step
+        return penalty
+
+    def _allocations(
+        self, member_type: _MemberType, left: int, g: int = 0, previous: int = 0
+    ) -> Iterator[Tuple[int, ...]]:
+        """How many members of ``member_type`` each group from ``g`` on gets."""
+        if g == self.num_groups:
+            if not left:
+                yield ()
+            return
+        most = min(left, self._free(member_type, g))
+        if self.tied[g]:
+            most = min(most, previous)
+        if most and not self._accepts(member_type, g):
+            most = 0
+        least = left - sum(
+            self._free(member_type, h) for h in range(g + 1, self.num_groups)
+        )
+        for count in range(most, max(least, 0) - 1, -1):
+            if count:
+                counts = self.cap_counts[g]
+                if any(
+                    counts[c] + count > self.cap_limits[c] for c in member_type.caps
+                ):
+                    continue
+            for rest in self._allocations(member_type, left - count, g + 1, count):
+                yield (count, *rest)
+
+    def _free(self, member_type: _MemberType, g: int) -> int:
+        """Places of group ``g`` left for members of ``member_type``; the
+        graduate quota is kept for graduates."""
+        if member_type.graduated:
+            return self.graduate_room[g]
+        return self.room[g] - self.graduate_room[g]
+
+    def _accepts(self, member_type: _MemberType, g: int) -> bool:
+        """Whether group ``g`` may take members of ``member_type``."""
+        if member_type.individual and self.separate is not None:
+            i = member_type.members[0]
+            group_of = self.group_of
+            if any(group_of.get(j) == g for j in self.separate[i]):
+                return False
+            if any(group_of.get(j, g) != g for j in self.together[i]):
+                return False
+        return True
+
+    def _apply(
+        self, member_type: _MemberType, allocation: Tuple[int, ...]
+    ) -> List[bool]:
+        """Place members of ``member_type``; returns the ties _undo restores."""
+        tied = list(self.tied)
+        xlogx = self.xlogx
+        weights = self.position_weights
+        total = sum(allocation)
+        for p in member_type.positions:
+            self.available[p] -= total
+        self.prep_left -= member_type.prep * total
+        self.leaders_left -= member_type.leader * total
+        for g, count in enumerate(allocation):
+            if g and self.tied[g] and count != allocation[g - 1]:
+                self.tied[g] = False
+            if not count:
+                continue
+            self.room[g] -= count
+            self.graduate_room[g] -= member_type.graduated * count
+            counts = self.counts[g]
+            for p in member_type.positions:
+                c = counts[p]
+                self.entropy_sums[g] += weights[p] * (xlogx[c + count] - xlogx[c])
+                counts[p] = c + count
+            self.prep[g] += member_type.prep * count
+            self.leaders[g] += member_type.leader * count
+            for c in member_type.caps:
+                self.cap_counts[g][c] += count
+            if member_type.individual:
+                i = member_type.members[0]
+                if self.pair_weights is not None:
+                    get = self.pair_weights[i].get
+                    self.repeat[g] += sum(get(j, 0.0) for j in self.individuals[g])
+                self.individuals[g].append(i)
+                self.group_of[i] = g
+        self.allocations.append(allocation)
+        return tied
+
+    def _undo(self, member_type: _MemberType, tied: List[bool]) -> None:
+        allocation = self.allocations.pop()
+        self.tied = tied
+        xlogx = self.xlogx
+        weights = self.position_weights
+        total = sum(allocation)
+        for p in member_type.positions:
+            self.available[p] += total
+        self.prep_left += member_type.prep * total
+        self.leaders_left += member_type.leader * total
+        for g, count in enumerate(allocation):
+            if not count:
+                continue
+            self.room[g] += count
+            self.graduate_room[g] += member_type.graduated * count
+            counts = self.counts[g]
+            for p in member_type.positions:
+                c = counts[p]
+                self.entropy_sums[g] += weights[p] * (xlogx[c - count] - xlogx[c])
+                counts[p] = c - count
+            self.prep[g] -= member_type.prep * count
+            self.leaders[g] -= member_type.leader * count
+            for c in member_type.caps:
+                self.cap_counts[g][c] -= count
+            if member_type.individual:
+                i = self.individuals[g].pop()
+                del self.group_of[i]
+                if self.pair_weights is not None:
+                    get = self.pair_weights[i].get
+                    self.repeat[g] -= sum(get(j, 0.0) for j in self.individuals[g])
+
+    def _feasible(self) -> bool:
+        """Whether every group can still get a leader, if the rule applies."""
+        if not self.need_leader:
+            return True
+        leaderless = 0
+        for g, leaders in enumerate(self.leaders):
+            if not leaders:
+                if not self.room[g]:
+                    return False
+                leaderless += 1
+        return leaderless <= self.leaders_left
+
+    def _branch(self, t: int) -> bool:
+        """Search below the current node; False if the search was cut short."""
+        self.nodes += 1
+        if not self.nodes & 255:
+            if self.cancel_token is not None and self.cancel_token.cancelled:
+                self.stop_reason = "cancelled"
+                return False
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                self.stop_reason = "time_limit"
+                return False
+
+        if t == len(self.types):
+            total = self._bound()
+            if total > self.best_total + MIN_IMPROVEMENT:
+                self.best_total = total
+                self.best = self._division()
+            return True
+
+        member_type = self.types[t]
+        children = []
+        for allocation in self._allocations(member_type, len(member_type.members)):
+            tied = self._apply(member_type, allocation)
+            if self._feasible():
+                bound = self._bound()
+                if bound > self.best_total + MIN_IMPROVEMENT:
+                    children.append((bound, allocation))
+            self._undo(member_type, tied)
+
+        children.sort(reverse=True)
+        for bound, allocation in children:
+            if bound <= self.best_total + MIN_IMPROVEMENT:
+                break
+            tied = self._apply(member_type, allocation)
+            finished = self._branch(t + 1)
+            self._undo(member_type, tied)
+            if not finished:
+                return False
+        return True
+
+    def _division(self) -> List[List[int]]:
+        """Roster indices of each group for the allocations on the stack."""
+        division: List[List[int]] = [[] for _ in range(self.num_groups)]
+        for member_type, allocation in zip(self.types, self.allocations):
+            members = iter(member_type.members)
+            for g, count in enumerate(allocation):
+                division[g].extend(next(members) for _ in range(count))
+        return division
+
+    def satisfies_rules(self) -> bool:
+        """Whether the partition of ``state`` follows the rules of the search."""
+        state = self.state
+        if state.violations:
+            return False
+        return not self.need_leader or all(state.leaders)
+
+
+def divide_exact(
+    groups: List[Group],
+    target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """
+    Find the best-scoring division of the members of ``groups`` into as many
+    groups, following the placement rules described in the module docstring.
+
+    :param groups: Partition to start from; its score is the bound the
+        search has to beat when it follows the placement rules
+    :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token checked during the search; raises
+        OptimizationCancelled once it is cancelled
+    :param telemetry: Optional telemetry record filled in with the
+        "branch_and_bound" phase time, the number of search nodes, the stop
+        reason ("optimal" or "time_limit"), the final scores and the gap to
+        the best score any division left unsearched could have
+    :param time_limit: Wall-clock budget in seconds; defaults to
+        BRANCH_AND_BOUND_TIME_LIMIT
+    :param diversity: Diversity config the score is computed with
+    :param constraints: Optional constraints, all of which must hold
+    :param pairing: Optional repeat-pairing penalty, part of the score
+    :return: The optimal partition, or the best one found when the time
+        limit runs out; ``groups`` when the search finds nothing better
+    """
+    phase_start = time.perf_counter()
+    if time_limit is None:
+        time_limit = BRANCH_AND_BOUND_TIME_LIMIT
+    state = PartitionState(
+        groups,
+        target_size,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    search = _Search(state, constraints, phase_start + time_limit, cancel_token)
+    if search.satisfies_rules():
+        search.best_total = state.total
+    if len(groups) > 1:
+        search.run()
+    else:
+        search.upper_bound = search.best_total
+
+    seconds = time.perf_counter() - phase_start
+    if search.stop_reason == "cancelled":
+        if telemetry is not None:
+            telemetry.iterations += search.nodes
+            telemetry.stop_reason = "cancelled"
+            telemetry.add_phase("branch_and_bound", seconds)
+        cancel_token.raise_if_cancelled()
+
+    result = groups
+    if search.best is not None:
+        result = [
+            Group(members=[state.members[i] for i in members])
+            for members in search.best
+        ]
+    logger.info(
+        f"Branch and bound finished ({search.stop_reason}) after {search.nodes} "
+        f"nodes: score {state.total:.3f} -> {search.best_total:.3f}"
+    )
+    record_span(
+        "branch_and_bound",
+        phase_start,
+        seconds,
+        members=len(state.members),
+        types=len(search.types),
+        nodes=search.nodes,
+        stop_reason=search.stop_reason,
+    )
+    if telemetry is not None:
+        telemetry.roster_size = len(state.members)
+        telemetry.num_groups = len(result)
+        telemetry.iterations += search.nodes
+        telemetry.stop_reason = search.stop_reason
+        if search.best_total > float("-inf"):
+            telemetry.optimality_gap = max(0.0, search.upper_bound - search.best_total)
+        telemetry.add_phase("branch_and_bound", seconds)
+        telemetry.score_components = partition_score_components(
+            result, target_size, diversity, pairing
+        )
+        telemetry.constraint_violations = 0 if search.best else state.violations
+        telemetry.record_progress(result, target_size, diversity, pairing)
+    return result
@@ -0,0 +1,309 @@
+"""Constraints on which members may share a group.
+
+Organizers can require two members to be kept apart (``separate``) or placed
+in the same group (``together``), and can cap how many members with a given
+attribute value a group may have (e.g. at most two counselors). Constraints
+are stored in the member_pairs and group_caps tables and loaded into a
+ConstraintSet.
+
+Before an optimizer run the set is compiled against the roster. Pairs become
+per-member adjacency tuples of roster indices and caps become per-member
+tuples of the caps the member counts towards, so checking whether a swap
+breaks a constraint only looks at the few constraints of the two members
+involved instead of rescanning every group.
+
+A constraint the roster cannot satisfy (say a cap below the number of
+members with that value per group) is not an error: the engines minimize the
+number of violations and report what is left in telemetry.
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, Iterable, List, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from .diversity import DIVERSITY_ATTRIBUTES
+
+if TYPE_CHECKING:
+    from .group_divider import Group, GroupMember
+
+# Kinds of member pair constraints
+PAIR_KINDS = ("separate", "together")
+
+
+def attribute_value(member: "GroupMember", attribute: str) -> str:
+    """Normalized string form of a member attribute, as compared with caps."""
+    value = getattr(member, attribute)
+    if isinstance(value, Enum):
+        value = value.value
+    return str(value).lower()
+
+
+@dataclass(frozen=True)
+class AttributeCap:
+    """At most ``limit`` members of a group may have ``attribute == value``."""
+
+    attribute: str
+    value: str
+    limit: int
+
+    def __post_init__(self) -> None:
+        if self.attribute not in DIVERSITY_ATTRIBUTES:
+            raise ValueError(
+                f"Unknown attribute {self.attribute!r}; "
+                f"choose from {', '.join(DIVERSITY_ATTRIBUTES)}"
+            )
+        if self.limit < 0:
+            raise ValueError("A group cap must not be negative")
+
+    def matches(self, member: "GroupMember") -> bool:
+        return attribute_value(member, self.attribute) == self.value.lower()
+
+
+@dataclass(frozen=True)
+class ConstraintSet:
+    """Pair constraints by member id and per-group attribute caps."""
+
+    separate: Tuple[Tuple[int, int], ...] = ()
+    together: Tuple[Tuple[int, int], ...] = ()
+    caps: Tuple[AttributeCap, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.separate or self.together or self.caps)
+
+    def compile(self, members: Iterable["GroupMember"]) -> "CompiledConstraints":
+        return CompiledConstraints(self, members)
+
+
+def load_constraints(db: Session) -> ConstraintSet:
+    """Read the constraints stored in the database."""
+    from .models import GroupCap, MemberPair
+
+    pairs = db.query(MemberPair.kind, MemberPair.member_a_id, MemberPair.member_b_id)
+    separate, together = [], []
+    for kind, a, b in pairs.order_by(MemberPair.id):
+        (separate if kind == "separate" else together).append((a, b))
+    caps = tuple(
+        AttributeCap(attribute, value, limit)
+        for attribute, value, limit in db.query(
+            GroupCap.attribute, GroupCap.value, GroupCap.max_per_group
+        ).order_by(GroupCap.id)
+    )
+    return ConstraintSet(tuple(separate), tuple(together), caps)
+
+
+class CompiledConstraints:
+    """A ConstraintSet compiled against one roster.
+
+    Members are referred to by roster index. ``separate[i]`` and
+    ``together[i]`` hold the indices of the members ``i`` must be kept apart
+    from or placed with, and ``member_caps[i]`` the indices of the caps ``i``
+    counts towards. Pairs involving members not on the roster are dropped.
+
+    :param constraints: Constraints to compile
+    :param members: Roster, in the order that defines the indices
+    """
+
+    def __init__(self, constraints: ConstraintSet, members: Iterable["GroupMember"]):
+        members = list(members)
+        self.index = {m.id: i for i, m in enumerate(members)}
+        self.caps = constraints.caps
+        self.separate = self._adjacency(constraints.separate, len(members))
+        self.together = self._adjacency(constraints.together, len(members))
+        self.member_caps: List[Tuple[int, ...]] = [
+            tuple(c for c, cap in enumerate(self.caps) if cap.matches(m))
+            for m in members
+        ]
+        # Members with no constraint at all can be swapped without any check
+        self.constrained = [
+            bool(self.separate[i] or self.together[i] or self.member_caps[i])
+            for i in range(len(members))
+        ]
+
+    @classmethod
+    def from_adjacency(
+        cls,
+        ids: Sequence[int],
+        caps: Tuple[AttributeCap, ...],
+        separate: List[Tuple[int, ...]],
+        together: List[Tuple[int, ...]],
+        member_caps: List[Tuple[int, ...]],
+    ) -> "CompiledConstraints":
+        """Constraints already compiled to roster indices, e.g. read from a
+        shared roster (see app.shared_roster)."""
+        compiled = cls.__new__(cls)
+        compiled.index = {member_id: i for i, member_id in enumerate(ids)}
+        compiled.caps = caps
+        compiled.separate = separate
+        compiled.together = together
+        compiled.member_caps = member_caps
+        compiled.constrained = [
+            bool(separate[i] or together[i] or member_caps[i]) for i in range(len(ids))
+        ]
+        return compiled
+
+    def _adjacency(
+        self, pairs: Sequence[Tuple[int, int]], size: int
+    ) -> List[Tuple[int, ...]]:
+        neighbours: List[set] = [set() for _ in range(size)]
+        for a, b in pairs:
+            if a in self.index and b in self.index and a != b:
+                i, j = self.index[a], self.index[b]
+                neighbours[i].add(j)
+                neighbours[j].add(i)
+        return [tuple(sorted(n)) for n in neighbours]
+
+
+class ConstraintState:
+    """Violation count of a partition, updated incrementally on swaps,
+    single-member moves and rotations of three members.
+
+    Every separate pair sharing a group, every together pair split across
+    groups and every member over a cap counts as one violation.
+
+    :param compiled: Constraints compiled for the members of ``groups``
+    :param groups: Partition to start from
+    """
+
+    def __init__(self, compiled: CompiledConstraints, groups: Sequence["Group"]):
+        assignment = [0] * len(compiled.index)
+        for g, group in enumerate(groups):
+            for m in group.members:
+                assignment[compiled.index[m.id]] = g
+        self._count(compiled, assignment, len(groups))
+
+    @classmethod
+    def from_assignment(
+        cls, compiled: CompiledConstraints, assignment: Sequence[int], num_groups: int
+    ) -> "ConstraintState":
+        """State of the partition putting roster member ``i`` in group
+        ``assignment[i]``."""
+        state = cls.__new__(cls)
+        state._count(compiled, list(assignment), num_groups)
+        return state
+
+    def _count(
+        self, compiled: CompiledConstraints, assignment: List[int], num_groups: int
+    ) -> None:
+        self.compiled = compiled
+        self.assignment = assignment
+        self.cap_counts = [[0] * len(compiled.caps) for _ in range(num_groups)]
+        for i, g in enumerate(assignment):
+            counts = self.cap_counts[g]
+            for c in compiled.member_caps[i]:
+                counts[c] += 1
+
+        pair_violations = sum(
+            sum(assignment[k] == assignment[i] for k in compiled.separate[i])
+            + sum(assignment[k] != assignment[i] for k in compiled.together[i])
+            for i in range(len(assignment))
+        )
+        limits = [cap.limit for cap in compiled.caps]
+        self.violations = pair_violations // 2 + sum(
+            max(0, count - limit)
+            for counts in self.cap_counts
+            for count, limit in zip(counts, limits)
+        )
+
+    def _pair_delta(self, i: int, j: int, old: int, new: int) -> int:
+        """Change of ``i``'s pair violations moving from ``old`` to ``new``,
+        not counting its pair with ``j``."""
+        assignment = self.assignment
+        delta = 0
+        for k in self.compiled.separate[i]:
+            if k != j:
+                delta += (assignment[k] == new) - (assignment[k] == old)
+        for k in self.compiled.together[i]:
+            if k != j:
+                delta += (assignment[k] == old) - (assignment[k] == new)
+        return delta
+
+    def _cap_delta(self, g: int, remove: Tuple[int, ...], add: Tuple[int, ...]) -> int:
+        counts = self.cap_counts[g]
+        caps = self.compiled.caps
+        delta = 0
+        for c in remove:
+            if counts[c] > caps[c].limit:
+                delta -= 1
+            counts[c] -= 1
+        for c in add:
+            counts[c] += 1
+            if counts[c] > caps[c].limit:
+                delta += 1
+        for c in add:
+            counts[c] -= 1
+        for c in remove:
+            counts[c] += 1
+        return delta
+
+    def swap_delta(self, i: int, j: int) -> int:
+        """Change of the violation count if members ``i`` and ``j`` swap groups.
+
+        A pair constraint between ``i`` and ``j`` themselves is unaffected, as
+        they stay in different groups.
+        """
+        compiled = self.compiled
+        if not (compiled.constrained[i] or compiled.constrained[j]):
+            return 0
+        a, b = self.assignment[i], self.assignment[j]
+        caps_i, caps_j = compiled.member_caps[i], compiled.member_caps[j]
+        return (
+            self._pair_delta(i, j, a, b)
+            + self._pair_delta(j, i, b, a)
+            + self._cap_delta(a, caps_i, caps_j)
+            + self._cap_delta(b, caps_j, caps_i)
+        )
+
+    def apply_swap(self, i: int, j: int) -> None:
+        """Swap members ``i`` and ``j`` between their groups."""
+        self.violations += self.swap_delta(i, j)
+        a, b = self.assignment[i], self.assignment[j]
+        caps_i, caps_j = self.compiled.member_caps[i], self.compiled.member_caps[j]
+        for c in caps_i:
+            self.cap_counts[a][c] -= 1
+            self.cap_counts[b][c] += 1
+        for c in caps_j:
+            self.cap_counts[b][c] -= 1
+            self.cap_counts[a][c] += 1
+        self.assignment[i], self.assignment[j] = b, a
+
+    def move_delta(self, i: int, g: int) -> int:
+        """Change of the violation count if member ``i`` moves to group ``g``."""
+        compiled = self.compiled
+        if not compiled.constrained[i]:
+            return 0
+        a = self.assignment[i]
+        caps = compiled.member_caps[i]
+        return (
+            self._pair_delta(i, -1, a, g)
+            + self._cap_delta(a, caps, ())
+            + self._cap_delta(g, (), caps)
+        )
+
+    def apply_move(self, i: int, g: int) -> None:
+        """Move member ``i`` to group ``g``."""
+        self.violations += self.move_delta(i, g)
+        a = self.assignment[i]
+        for c in self.compiled.member_caps[i]:
+            self.cap_counts[a][c] -= 1
+            self.cap_counts[g][c] += 1
+        self.assignment[i] = g
+
+    def rotation_delta(self, i: int, j: int, k: int) -> int:
+        """Change of the violation count if ``i`` joins the group of ``j``,
+        ``j`` that of ``k`` and ``k`` that of ``i``."""
+        constrained = self.compiled.constrained
+        if not (constrained[i] or constrained[j] or constrained[k]):
+            return 0
+        # The rotation is swapping i with j, then j (now in i's group) with k
+        delta = self.swap_delta(i, j)
+        self.apply_swap(i, j)
+        delta += self.swap_delta(j, k)
+        self.apply_swap(i, j)
+        return delta
+
+    def apply_rotation(self, i: int, j: int, k: int) -> None:
+        """Rotate ``i``, ``j`` and ``k`` as described in rotation_delta."""
+        self.apply_swap(i, j)
+        self.apply_swap(j, k)
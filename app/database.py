@@ -13,6 +13,20 @@ def get_engine(db_path: Path = DEFAULT_DB_PATH):
     return create_engine(database_url, connect_args={"check_same_thread": False})
 
 
+def get_data_dir() -> Path:
+    """Directory for files the app writes next to its database (traces, profiles).
+
+    Uses DATA_DIR if set, otherwise the directory containing DB_PATH.
+    """
+    data_dir = os.getenv("DATA_DIR")
+    if data_dir:
+        return Path(data_dir)
+    db_path = os.getenv("DB_PATH")
+    if db_path:
+        return Path(db_path).parent
+    return Path("data")
+
+
 # These will be initialized when init_db is called
 engine = None
 SessionLocal = None
@@ -51,4 +65,10 @@ def init_db(db_path: Path = DEFAULT_DB_PATH):
 
     Base.metadata.create_all(bind=engine)
 
+    # create_all skips tables that already exist, so add indexes introduced
+    # after a database was created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
     print(f"Database initialized at: {db_path.absolute()}")
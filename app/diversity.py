@@ -0,0 +1,238 @@
+"""Configurable diversity attributes for the group entropy score.
+
+A DiversityConfig lists entropy terms. Each term is a set of member
+attributes with a weight: a term over several attributes scores their joint
+entropy (the historical score uses one joint term over gender, faith status and
+role), while one term per attribute scores them independently. The group
+entropy is the weighted sum of the terms.
+
+Before an optimizer run, the config is compiled against the roster into a
+DiversityKernel. The kernel holds an integer category code per member and
+term, so scoring a group only counts small integers, however many attributes
+the config has.
+"""
+
+import json
+import os
+from collections import Counter
+from dataclasses import dataclass
+from itertools import chain
+from math import log as ln
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .group_divider import GroupMember
+
+# GroupMember attributes that may be used for diversity
+DIVERSITY_ATTRIBUTES = (
+    "gender",
+    "faith_status",
+    "role",
+    "education_status",
+    "is_graduated",
+    "prep_attended",
+)
+
+
+@dataclass(frozen=True)
+class EntropyTerm:
+    """Joint entropy of ``attributes``, multiplied by ``weight``."""
+
+    attributes: Tuple[str, ...]
+    weight: float = 1.0
+
+    def __post_init__(self) -> None:
+        unknown = [a for a in self.attributes if a not in DIVERSITY_ATTRIBUTES]
+        if unknown or not self.attributes:
+            raise ValueError(
+                f"Unknown diversity attributes {unknown}; "
+                f"choose from {', '.join(DIVERSITY_ATTRIBUTES)}"
+            )
+
+
+@dataclass(frozen=True)
+class DiversityConfig:
+    """Entropy terms that make up the diversity part of the group score."""
+
+    terms: Tuple[EntropyTerm, ...]
+
+    @classmethod
+    def joint(cls, attributes: Sequence[str], weight: float = 1.0):
+        """One term scoring the joint entropy of all ``attributes``."""
+        return cls((EntropyTerm(tuple(attributes), weight),))
+
+    @classmethod
+    def independent(cls, weights: Dict[str, float]):
+        """One term per attribute, each with its own weight."""
+        return cls(
+            tuple(EntropyTerm((name,), weight) for name, weight in weights.items())
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DiversityConfig":
+        """Build a config from its JSON form.
+
+        Accepted forms::
+
+            {"mode": "joint", "attributes": ["gender", "role"], "weight": 1.0}
+            {"mode": "independent", "attributes": {"gender": 1.0, "role": 0.5}}
+            {"terms": [{"attributes": ["gender", "role"], "weight": 1.0}, ...]}
+
+        :param data: Parsed JSON
+        :return: The config
+        :raises ValueError: If the mode or an attribute is unknown
+        """
+        if "terms" in data:
+            return cls(
+                tuple(
+                    EntropyTerm(tuple(term["attributes"]), term.get("weight", 1.0))
+                    for term in data["terms"]
+                )
+            )
+
+        mode = data.get("mode", "joint")
+        attributes = data["attributes"]
+        if mode == "joint":
+            return cls.joint(list(attributes), data.get("weight", 1.0))
+        if mode == "independent":
+            if not isinstance(attributes, dict):
+                attributes = {name: 1.0 for name in attributes}
+            return cls.independent(attributes)
+        raise ValueError(f"Unknown diversity mode {mode!r}")
+
+    def entropy(self, members: Sequence["GroupMember"]) -> float:
+        """Weighted entropy of a group, computed directly from the members."""
+        total = len(members)
+        if not total:
+            return 0.0
+        diversity = 0.0
+        for term in self.terms:
+            counts = Counter(
+                tuple(getattr(m, name) for name in term.attributes) for m in members
+            )
+            entropy = 0.0
+            for count in counts.values():
+                p = count / total
+                entropy -= p * ln(p)
+            diversity += term.weight * entropy
+        return diversity
+
+    def compile(self, members: Iterable["GroupMember"]) -> "DiversityKernel":
+        return DiversityKernel(self, members)
+
+
+# The historical score: joint entropy of gender, faith status and role
+DEFAULT_DIVERSITY = DiversityConfig.joint(("gender", "faith_status", "role"))
+
+
+def load_diversity_config() -> DiversityConfig:
+    """Diversity config from DIVERSITY_CONFIG, or DEFAULT_DIVERSITY.
+
+    DIVERSITY_CONFIG holds either the JSON accepted by
+    DiversityConfig.from_dict or the path of a file containing it.
+    """
+    value = os.getenv("DIVERSITY_CONFIG")
+    if not value:
+        return DEFAULT_DIVERSITY
+    if not value.lstrip().startswith("{"):
+        value = Path(value).read_text()
+    return DiversityConfig.from_dict(json.loads(value))
+
+
+class DiversityKernel:
+    """A DiversityConfig compiled against one roster.
+
+    Every (term, category) pair gets a position in one flat code space:
+    ``positions[i]`` holds the positions of roster member ``i`` (one per term)
+    and ``position_weights[p]`` the weight of the term position ``p`` belongs
+    to. With ``xlogx[c] = c * ln(c)``, the weighted entropy of a group of size
+    ``n`` whose position counts are ``c`` is
+    ``total_weight * ln(n) - sum(position_weights[p] * xlogx[c[p]]) / n``,
+    so a group is scored with a single counting pass over small integers no
+    matter how many terms the config has.
+
+    :param config: Config to compile
+    :param members: Roster the kernel will score groups of
+    """
+
+    def __init__(self, config: DiversityConfig, members: Iterable["GroupMember"]):
+        members = list(members)
+        self.config = config
+        self.index = {m.id: i for i, m in enumerate(members)}
+        self.total_weight = sum(term.weight for term in config.terms)
+        self.position_weights: List[float] = []
+
+        term_positions = []
+        for term in config.terms:
+            categories: Dict[tuple, int] = {}
+            offset = len(self.position_weights)
+            term_positions.append(
+                [
+                    offset
+                    + categories.setdefault(
+                        tuple(getattr(m, name) for name in term.attributes),
+                        len(categories),
+                    )
+                    for m in members
+                ]
+            )
+            self.position_weights.extend([term.weight] * len(categories))
+
+        self.positions: List[Tuple[int, ...]] = list(zip(*term_positions))
+        self.xlogx = [0.0] + [c * ln(c) for c in range(1, len(members) + 1)]
+
+    @classmethod
+    def from_positions(
+        cls,
+        config: DiversityConfig,
+        ids: Sequence[int],
+        positions: List[Tuple[int, ...]],
+        position_weights: Sequence[float],
+    ) -> "DiversityKernel":
+        """Kernel whose positions are already computed, e.g. read from a
+        shared roster (see app.shared_roster)."""
+        kernel = cls.__new__(cls)
+        kernel.config = config
+        kernel.index = {member_id: i for i, member_id in enumerate(ids)}
+        kernel.total_weight = sum(term.weight for term in config.terms)
+        kernel.position_weights = list(position_weights)
+        kernel.positions = positions
+        kernel.xlogx = [0.0] + [c * ln(c) for c in range(1, len(ids) + 1)]
+        return kernel
+
+    @property
+    def num_positions(self) -> int:
+        return len(self.position_weights)
+
+    def counts(self, indices: Iterable[int]) -> List[int]:
+        """Position counts for the roster members at ``indices``."""
+        counts = [0] * self.num_positions
+        positions = self.positions
+        for i in indices:
+            for p in positions[i]:
+                counts[p] += 1
+        return counts
+
+    def entropy_from_counts(
+        self, counts: Iterable[tuple[int, int]], size: int
+    ) -> float:
+        """Weighted entropy of a group of ``size`` members.
+
+        :param counts: (position, count) pairs; zero counts may be omitted
+        :param size: Number of members in the group
+        """
+        if not size:
+            return 0.0
+        weights = self.position_weights
+        xlogx = self.xlogx
+        return self.total_weight * ln(size) - (
+            sum(weights[p] * xlogx[c] for p, c in counts) / size
+        )
+
+    def entropy(self, members: Sequence["GroupMember"]) -> float:
+        """Weighted entropy of a group of roster members."""
+        index = self.index
+        positions = self.positions
+        counts = Counter(chain.from_iterable(positions[index[m.id]] for m in members))
+        return self.entropy_from_counts(counts.items(), len(members))
@@ -0,0 +1,426 @@
+"""Registry of grouping engines.
+
+An engine takes the present members and a requested number of groups and
+returns a full partition. Every engine shares the keyword arguments of
+``divide_into_groups`` (including the ``diversity`` config the result is scored
+with, the ``constraints`` it must respect and the optional repeat ``pairing``
+penalty) so that routes, benchmarks and comparison harnesses can swap them
+freely.
+
+``greedy`` only balances gender after the placement heuristic and ``exact``
+finds the best gender balance reachable from the placement; ``unified``
+optimizes the full weighted partition score instead, including the
+repeat-pairing penalty. ``neighborhood`` adds single-member moves and
+three-member rotations to the unified swaps, ``tabu`` searches the swaps past
+local optima, ``tempering`` runs parallel tempering in worker processes and
+``branch_and_bound`` finds the optimum for small rosters.
+"""
+
+import os
+import time
+from typing import Callable, Dict, List
+
+from loguru import logger
+
+from .branch_and_bound import BRANCH_AND_BOUND_MAX_MEMBERS, divide_exact
+from .constraints import ConstraintSet
+from .diversity import DiversityConfig
+from .exact import EXACT_MAX_MEMBERS, balance_gender_exact
+from .group_divider import (
+    Group,
+    GroupMember,
+    balance_gender_in_groups,
+    divide_into_groups,
+)
+from .history import RepeatPairing
+from .partition import optimize_partition, tabu_partition
+from .single_flight import CancellationToken
+from .telemetry import OptimizerTelemetry
+from .tempering import parallel_tempering
+
+Engine = Callable[..., List[Group]]
+
+ENGINES: Dict[str, Engine] = {}
+
+# Engine used by /groups/generate
+DEFAULT_ENGINE = os.getenv("GROUPING_ENGINE", "greedy")
+
+
+def select_engine(roster_size: int) -> str:
+    """Engine for a roster of ``roster_size`` present members.
+
+    Rosters up to BRANCH_AND_BOUND_MAX_MEMBERS are divided exactly; larger
+    ones use DEFAULT_ENGINE.
+    """
+    if roster_size <= BRANCH_AND_BOUND_MAX_MEMBERS:
+        return "branch_and_bound"
+    return DEFAULT_ENGINE
+
+
+def register_engine(name: str) -> Callable[[Engine], Engine]:
+    """Decorator registering an engine under ``name``."""
+
+    def decorator(fn: Engine) -> Engine:
+        ENGINES[name] = fn
+        return fn
+
+    return decorator
+
+
+def get_engine(name: str) -> Engine:
+    """Look up an engine by name.
+
+    :param name: Registered engine name
+    :return: Engine callable
+    :raises ValueError: If no engine is registered under that name
+    """
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown engine {name!r}; available engines: {', '.join(ENGINES)}"
+        ) from None
+
+
+def run_engine(
+    name: str,
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """Run the engine registered under ``name``, recording it in telemetry."""
+    if telemetry is not None:
+        telemetry.engine = name
+    return get_engine(name)(
+        members,
+        num_groups,
+        target_size=target_size,
+        max_iterations=max_iterations,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+
+
+@register_engine("placement")
+def placement_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 0,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """Heuristic placement only, without any balancing pass.
+
+    Constraint violations left by the placement are still repaired.
+    """
+    return divide_into_groups(
+        members,
+        num_groups,
+        max_iterations=0,
+        target_size=target_size,
+        telemetry=telemetry,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+
+
+@register_engine("greedy")
+def greedy_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """Heuristic placement followed by greedy gender-balancing swaps."""
+    groups = placement_engine(
+        members,
+        num_groups,
+        target_size=target_size,
+        telemetry=telemetry,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    return balance_gender_in_groups(
+        groups,
+        max_iterations=max_iterations,
+        target_size=target_size,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+
+
+@register_engine("unified")
+def unified_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """Heuristic placement followed by swaps improving the full partition score."""
+    groups = placement_engine(
+        members,
+        num_groups,
+        target_size=target_size,
+        telemetry=telemetry,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    return optimize_partition(
+        groups,
+        max_iterations=max_iterations,
+        target_size=target_size,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+
+
+@register_engine("neighborhood")
+def neighborhood_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """The unified engine with single-member moves and three-member rotations
+    besides swaps, so group sizes can change."""
+    groups = placement_engine(
+        members,
+        num_groups,
+        target_size=target_size,
+        telemetry=telemetry,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    return optimize_partition(
+        groups,
+        max_iterations=max_iterations,
+        target_size=target_size,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+        neighborhood=True,
+    )
+
+
+@register_engine("tabu")
+def tabu_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """Heuristic placement followed by tabu search over the full partition
+    score."""
+    groups = placement_engine(
+        members,
+        num_groups,
+        target_size=target_size,
+        telemetry=telemetry,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    return tabu_partition(
+        groups,
+        max_iterations=max_iterations,
+        target_size=target_size,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+
+
+@register_engine("tempering")
+def tempering_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """Heuristic placement followed by parallel tempering, which uses the
+    whole time limit (TEMPERING_TIME_LIMIT when there is none)."""
+    groups = placement_engine(
+        members,
+        num_groups,
+        target_size=target_size,
+        telemetry=telemetry,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    return parallel_tempering(
+        groups,
+        max_iterations=max_iterations,
+        target_size=target_size,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+
+
+@register_engine("exact")
+def exact_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """Heuristic placement followed by provably optimal gender balancing.
+
+    Falls back to the greedy balancer when there are constraints (the exact
+    model cannot express them), when the roster is larger than
+    EXACT_MAX_MEMBERS and when the time limit runs out.
+    """
+    start = time.perf_counter()
+    groups = placement_engine(
+        members,
+        num_groups,
+        target_size=target_size,
+        telemetry=telemetry,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    if not constraints and len(members) <= EXACT_MAX_MEMBERS:
+        balanced = balance_gender_exact(
+            groups,
+            target_size=target_size,
+            cancel_token=cancel_token,
+            telemetry=telemetry,
+            time_limit=time_limit,
+            diversity=diversity,
+            pairing=pairing,
+        )
+        if balanced is not None:
+            return balanced
+        time_limit = max(0.0, time_limit - (time.perf_counter() - start))
+
+    logger.info("Using the greedy balancer instead of the exact one")
+    return balance_gender_in_groups(
+        groups,
+        max_iterations=max_iterations,
+        target_size=target_size,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+
+
+@register_engine("branch_and_bound")
+def branch_and_bound_engine(
+    members: List[GroupMember],
+    num_groups: int,
+    target_size: int = 7,
+    max_iterations: int = 10_000,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """The unified engine, followed by an exact search for the optimum when
+    there are at most BRANCH_AND_BOUND_MAX_MEMBERS members."""
+    start = time.perf_counter()
+    groups = unified_engine(
+        members,
+        num_groups,
+        target_size=target_size,
+        max_iterations=max_iterations,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    if sum(len(g.members) for g in groups) > BRANCH_AND_BOUND_MAX_MEMBERS:
+        return groups
+    if time_limit is not None:
+        time_limit = max(0.0, time_limit - (time.perf_counter() - start))
+    return divide_exact(
+        groups,
+        target_size=target_size,
+        cancel_token=cancel_token,
+        telemetry=telemetry,
+        time_limit=time_limit,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
@@ -0,0 +1,244 @@
+"""Provably optimal gender balancing for a fixed placement.
+
+balance_gender_in_groups only swaps non-graduates of the same role and prep
+status, so every group keeps the number of members it has of each such
+class and only the gender mix within the classes can change. Choosing how
+many men of each class go to each group is a transportation problem:
+
+    source --(men of class c)--> class c --(class c slots in g)--> group g
+    group g --(k-th man, cost f_g(k) - f_g(k - 1))--> sink
+
+where ``f_g`` is the group's imbalance ``|men / size - 0.5|`` as a function
+of its number of men. ``f_g`` is convex, so the unit arcs into the sink are
+used cheapest first and a minimum cost flow of all swappable men gives the
+minimum total imbalance that any sequence of such swaps can reach.
+
+Rosters at meeting scale give graphs with a few dozen nodes, solved by
+successive shortest paths (Bellman-Ford, as residual arcs have negative
+costs) in well under a second. The solver needs no third-party package.
+"""
+
+import os
+import time
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from .diversity import DiversityConfig
+from .group_divider import Group, GroupMember, partition_score_components
+from .history import RepeatPairing
+from .single_flight import CancellationToken
+from .telemetry import OptimizerTelemetry
+from .tracing import record_span
+
+# Larger rosters fall back to the heuristic balancer
+EXACT_MAX_MEMBERS = int(os.getenv("EXACT_MAX_MEMBERS", "400"))
+
+SwapClass = Tuple[str, bool]
+
+
+def _swap_class(member: GroupMember) -> SwapClass | None:
+    """Members that may swap with each other share a class; graduates have none."""
+    if member.is_graduated:
+        return None
+    return (member.role.value, member.prep_attended)
+
+
+class _FlowGraph:
+    """Residual graph for successive-shortest-path min cost flow."""
+
+    def __init__(self, num_nodes: int):
+        # Per node: [to, capacity, cost, index of the reverse edge]
+        self.edges: List[List[list]] = [[] for _ in range(num_nodes)]
+
+    def add_edge(self, u: int, v: int, capacity: int, cost: float) -> list:
+        edge = [v, capacity, cost, len(self.edges[v])]
+        self.edges[u].append(edge)
+        self.edges[v].append([u, 0, -cost, len(self.edges[u]) - 1])
+        return edge
+
+    def augment(self, source: int, sink: int) -> float | None:
+        """Push one unit along a cheapest path; None if the sink is unreachable."""
+        inf = float("inf")
+        distance = [inf] * len(self.edges)
+        previous: List[Tuple[int, int] | None] = [None] * len(self.edges)
+        distance[source] = 0.0
+        for _ in range(len(self.edges) - 1):
+            changed = False
+            for u, edges in enumerate(self.edges):
+                if distance[u] == inf:
+                    continue
+                for k, (v, capacity, cost, _) in enumerate(edges):
+                    if capacity > 0 and distance[u] + cost < distance[v] - 1e-12:
+                        distance[v] = distance[u] + cost
+                        previous[v] = (u, k)
+                        changed = True
+            if not changed:
+                break
+        if distance[sink] == inf:
+            return None
+
+        v = sink
+        while v != source:
+            u, k = previous[v]
+            edge = self.edges[u][k]
+            edge[1] -= 1
+            self.edges[v][edge[3]][1] += 1
+            v = u
+        return distance[sink]
+
+
+def _imbalance(men: int, size: int) -> float:
+    return abs(men / size - 0.5) if size else 0.0
+
+
+def balance_gender_exact(
+    groups: List[Group],
+    target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group] | None:
+    """
+    Rearrange same-class members so the total gender imbalance is minimal.
+
+    Group sizes and each group's role, prep and graduate composition are left
+    as they are; members stay in their group wherever the optimum allows.
+
+    :param groups: Placement to balance
+    :param target_size: Target size used to score the result in telemetry
+    :param cancel_token: Optional token checked between augmentations; raises
+        OptimizationCancelled once it is cancelled
+    :param telemetry: Optional telemetry record filled in with the "exact"
+        phase time, the number of augmentations and the final scores
+    :param time_limit: Optional wall-clock budget in seconds
+    :param diversity: Diversity config used to score the result in telemetry
+    :param pairing: Repeat-pairing penalty included in the telemetry scores
+    :return: The optimally balanced groups, or None if the time limit ran out
+    """
+    phase_start = time.perf_counter()
+    deadline = phase_start + time_limit if time_limit is not None else None
+
+    classes: Dict[SwapClass, int] = {}
+    men_per_class: Dict[SwapClass, int] = {}
+    slots: Dict[Tuple[int, SwapClass], int] = {}
+    fixed_men = [0] * len(groups)
+    for g, group in enumerate(groups):
+        for m in group.members:
+            swap_class = _swap_class(m)
+            if swap_class is None:
+                fixed_men[g] += m.gender == "M"
+                continue
+            classes.setdefault(swap_class, len(classes))
+            slots[g, swap_class] = slots.get((g, swap_class), 0) + 1
+            men_per_class[swap_class] = men_per_class.get(swap_class, 0) + (
+                m.gender == "M"
+            )
+
+    # Nodes: source, classes, groups, sink
+    source = 0
+    group_node = 1 + len(classes)
+    sink = group_node + len(groups)
+    graph = _FlowGraph(sink + 1)
+    for swap_class, c in classes.items():
+        graph.add_edge(source, 1 + c, men_per_class[swap_class], 0.0)
+    class_edges = {
+        (g, swap_class): graph.add_edge(
+            1 + classes[swap_class], group_node + g, count, 0.0
+        )
+        for (g, swap_class), count in slots.items()
+    }
+    for g, group in enumerate(groups):
+        size = len(group.members)
+        swappable = size - sum(1 for m in group.members if _swap_class(m) is None)
+        for k in range(1, swappable + 1):
+            men = fixed_men[g] + k
+            cost = _imbalance(men, size) - _imbalance(men - 1, size)
+            graph.add_edge(group_node + g, sink, 1, cost)
+
+    augmentations = 0
+    for _ in range(sum(men_per_class.values())):
+        if cancel_token is not None and cancel_token.cancelled:
+            if telemetry is not None:
+                telemetry.stop_reason = "cancelled"
+                telemetry.add_phase("exact", time.perf_counter() - phase_start)
+            cancel_token.raise_if_cancelled()
+        if deadline is not None and time.perf_counter() > deadline:
+            logger.info("Exact gender balancing ran out of time")
+            if telemetry is not None:
+                telemetry.add_phase("exact", time.perf_counter() - phase_start)
+            return None
+        graph.augment(source, sink)
+        augmentations += 1
+
+    # Men of each class per group, read off the class -> group arcs
+    target_men = {key: slots[key] - edge[1] for key, edge in class_edges.items()}
+    balanced = _assign(groups, target_men)
+
+    record_span(
+        "balance_gender_exact",
+        phase_start,
+        time.perf_counter() - phase_start,
+        members=sum(len(g.members) for g in groups),
+        augmentations=augmentations,
+    )
+    if telemetry is not None:
+        telemetry.roster_size = sum(len(g.members) for g in balanced)
+        telemetry.num_groups = len(balanced)
+        telemetry.iterations += augmentations
+        telemetry.stop_reason = "optimal"
+        telemetry.optimality_gap = 0.0
+        telemetry.add_phase("exact", time.perf_counter() - phase_start)
+        telemetry.score_components = partition_score_components(
+            balanced, target_size, diversity, pairing
+        )
+        telemetry.record_progress(balanced, target_size, diversity, pairing)
+    return balanced
+
+
+def _assign(
+    groups: List[Group], target_men: Dict[Tuple[int, SwapClass], int]
+) -> List[Group]:
+    """Groups with ``target_men[g, c]`` men among their class ``c`` members.
+
+    Members already on the right side of their group's quota stay where they
+    are; the others trade places with members of the same class, keeping the
+    order of every group's member list.
+    """
+    new_members = [list(group.members) for group in groups]
+    vacated: List[Dict[SwapClass, List[int]]] = [{} for _ in groups]
+    movers: Dict[Tuple[SwapClass, bool], List[GroupMember]] = {}
+    needed: List[Tuple[int, SwapClass, bool, int]] = []
+
+    for g, group in enumerate(groups):
+        positions: Dict[Tuple[SwapClass, bool], List[int]] = {}
+        for pos, m in enumerate(group.members):
+            swap_class = _swap_class(m)
+            if swap_class is not None:
+                positions.setdefault((swap_class, m.gender == "M"), []).append(pos)
+
+        for swap_class in {c for c, _ in positions}:
+            men = positions.get((swap_class, True), [])
+            women = positions.get((swap_class, False), [])
+            wanted_men = target_men[g, swap_class]
+            for is_man, current, wanted in (
+                (True, men, wanted_men),
+                (False, women, len(men) + len(women) - wanted_men),
+            ):
+                leaving = current[wanted:]
+                movers.setdefault((swap_class, is_man), []).extend(
+                    group.members[pos] for pos in leaving
+                )
+                vacated[g].setdefault(swap_class, []).extend(leaving)
+                if wanted > len(current):
+                    needed.append((g, swap_class, is_man, wanted - len(current)))
+
+    for g, swap_class, is_man, count in needed:
+        pool = movers[swap_class, is_man]
+        free = vacated[g][swap_class]
+        for member in pool[:count]:
+            new_members[g][free.pop()] = member
+        del pool[:count]
+    return [Group(members=members) for members in new_members]
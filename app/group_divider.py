@@ -1,11 +1,22 @@
 from dataclasses import dataclass
-from typing import List, Dict, Set
+from typing import TYPE_CHECKING, List, Dict, Set
 from enum import Enum
 import random
-from math import log as ln, exp
+import sys
+import time
 from collections import Counter
+from heapq import nsmallest
 from loguru import logger
 
+from .constraints import ConstraintSet, ConstraintState
+from .diversity import DEFAULT_DIVERSITY, DiversityConfig, DiversityKernel
+from .single_flight import CancellationToken
+from .telemetry import OptimizerTelemetry
+from .tracing import record_span
+
+if TYPE_CHECKING:
+    from .history import RepeatPairing
+
 
 class MemberRole(str, Enum):
     FACILITATOR = "facilitator"
@@ -19,17 +30,36 @@ class MemberRole(str, Enum):
         :param role: Role string from database
         :return: Corresponding MemberRole enum value
         """
-        role_map = {
-            "facilitator": cls.FACILITATOR,
-            "counselor": cls.COUNSELOR,
-            "none": cls.REGULAR,
-            "regular": cls.REGULAR,
-        }
-        return role_map.get(role.lower(), cls.REGULAR)
+        return _DB_ROLES.get(role) or _DB_ROLES.get(role.lower(), cls.REGULAR)
+
+
+_DB_ROLES = {
+    "facilitator": MemberRole.FACILITATOR,
+    "counselor": MemberRole.COUNSELOR,
+    "none": MemberRole.REGULAR,
+    "regular": MemberRole.REGULAR,
+}
 
 
-@dataclass(frozen=True)
+# Penalty terms subtracted from the entropy in Group.calculate_diversity_score
+PENALTY_COMPONENTS = (
+    "oversize_penalty",
+    "size_balance_penalty",
+    "prep_penalty",
+    "leader_density_penalty",
+)
+
+
+@dataclass(frozen=True, slots=True, eq=False)
 class GroupMember:
+    """A present member as seen by the grouping engine.
+
+    Members are identified by their database id: equality and hashing only
+    look at ``id``, which keeps the member sets and swap comparisons of the
+    optimizer cheap. Categorical strings are interned so that a large roster
+    shares one string object per category value.
+    """
+
     id: int
     surname: str
     given_name: str
@@ -41,6 +71,21 @@ class GroupMember:
     is_present: bool
     prep_attended: bool
 
+    def __post_init__(self) -> None:
+        set_field = object.__setattr__
+        set_field(self, "surname", sys.intern(self.surname))
+        set_field(self, "gender", sys.intern(self.gender))
+        set_field(self, "faith_status", sys.intern(self.faith_status))
+        set_field(self, "education_status", sys.intern(self.education_status))
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is GroupMember:
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
     @property
     def name(self) -> str:
         return f"{self.surname}{self.given_name}"
@@ -72,11 +117,14 @@ class Group:
         return sum(1 for m in self.members if m.prep_attended)
 
     def calculate_diversity_score(
-        self, all_groups: List["Group"] | None = None, target_size: int = 7
+        self,
+        all_groups: List["Group"] | None = None,
+        target_size: int = 7,
+        kernel: DiversityKernel | None = None,
     ) -> float:
         """
-        Calculate Shannon Diversity Index for gender, faith_status, and role combined,
-        with penalties for:
+        Calculate Shannon Diversity Index for gender, faith_status, and role combined
+        (or the attributes of a compiled diversity config), with penalties for:
         1. Oversized groups (>target_size+1 members)
         2. Size imbalance between groups (if all_groups is provided)
         3. Prep attendance imbalance between groups
@@ -84,54 +132,65 @@ class Group:
 
         :param all_groups: Optional list of all groups to calculate size balance penalty
         :param target_size: Target size for each group (default: 7)
+        :param kernel: Optional diversity config compiled for the roster; the
+            default is the joint entropy of gender, faith status and role
         :return: Diversity score with penalties applied
         """
+        components = self.diversity_components(all_groups, target_size, kernel=kernel)
+        diversity = components["entropy"]
+        for name in PENALTY_COMPONENTS:
+            diversity -= components[name]
+        return diversity
+
+    def diversity_components(
+        self,
+        all_groups: List["Group"] | None = None,
+        target_size: int = 7,
+        averages: tuple[float, float, float] | None = None,
+        kernel: DiversityKernel | None = None,
+    ) -> Dict[str, float]:
+        """
+        Break the diversity score down into its entropy term and penalties.
+
+        :param all_groups: Optional list of all groups to calculate balance penalties
+        :param target_size: Target size for each group (default: 7)
+        :param averages: Optional precomputed partition_averages(all_groups), so
+            scoring every group of a partition does not rescan all groups
+        :param kernel: Optional diversity config compiled for the roster
+        :return: Mapping of component name to value; penalties are non-negative
+        """
+        components = {"entropy": 0.0, **{name: 0.0 for name in PENALTY_COMPONENTS}}
         if not self.members:
-            return 0.0
+            return components
 
         # Calculate base diversity score
-        characteristics = [
-            f"{m.gender}_{m.faith_status}_{m.role.value}" for m in self.members
-        ]
-        counts = Counter(characteristics)
-        total = len(characteristics)
-        diversity = 0.0
-
-        for count in counts.values():
-            p = count / total
-            diversity -= p * ln(p)
+        if kernel is not None:
+            components["entropy"] = kernel.entropy(self.members)
+        else:
+            components["entropy"] = DEFAULT_DIVERSITY.entropy(self.members)
 
         # Apply size penalty for groups larger than target_size + 1
         # The penalty grows quadratically with size to discourage overly large groups
         if len(self.members) > target_size + 1:
-            size_penalty = ((len(self.members) - (target_size + 1)) ** 2) * 0.5
-            diversity -= size_penalty
+            components["oversize_penalty"] = (
+                (len(self.members) - (target_size + 1)) ** 2
+            ) * 0.5
 
         # Apply size balance penalty if all groups are provided
         if all_groups:
-            group_sizes = [len(g.members) for g in all_groups]
-            avg_size = sum(group_sizes) / len(group_sizes)
+            avg_size, avg_prep, ideal_leader_ratio = averages or partition_averages(
+                all_groups
+            )
             size_deviation = abs(len(self.members) - avg_size)
             # Quadratic penalty for deviating from average size
-            balance_penalty = (size_deviation**2) * 0.3
-            diversity -= balance_penalty
+            components["size_balance_penalty"] = (size_deviation**2) * 0.3
 
             # Apply prep attendance balance penalty
-            prep_counts = [g.prep_attended_count for g in all_groups]
-            avg_prep = sum(prep_counts) / len(prep_counts)
             prep_deviation = abs(self.prep_attended_count - avg_prep)
             # Quadratic penalty for deviating from average prep attendance
-            prep_penalty = (prep_deviation**2) * 0.4
-            diversity -= prep_penalty
+            components["prep_penalty"] = (prep_deviation**2) * 0.4
 
             # Apply leader density penalty
-            # Calculate the ideal leader ratio (total leaders / total members)
-            total_leaders = sum(g.leader_count for g in all_groups)
-            total_members = sum(len(g.members) for g in all_groups)
-            ideal_leader_ratio = (
-                total_leaders / total_members if total_members > 0 else 0
-            )
-
             # Calculate this group's leader ratio
             group_leader_ratio = (
                 self.leader_count / len(self.members) if self.members else 0
@@ -140,35 +199,150 @@ class Group:
             # Apply quadratic penalty for deviating from ideal ratio
             # Multiply by group size to penalize more for larger groups with bad ratios
             leader_ratio_deviation = abs(group_leader_ratio - ideal_leader_ratio)
-            leader_density_penalty = (
+            components["leader_density_penalty"] = (
                 (leader_ratio_deviation**2) * len(self.members) * 0.6
             )
-            diversity -= leader_density_penalty
 
-        return diversity
+        return components
 
     def add_member(self, member: GroupMember) -> "Group":
         return Group(members=self.members + [member])
 
 
+def partition_averages(groups: List[Group]) -> tuple[float, float, float]:
+    """
+    Partition-wide reference values used by the balance penalties.
+
+    :param groups: List of all groups
+    :return: Average group size, average prep attendees per group and the ideal
+        leader ratio (total leaders / total members)
+    """
+    group_sizes = [len(g.members) for g in groups]
+    avg_size = sum(group_sizes) / len(group_sizes)
+
+    prep_counts = [g.prep_attended_count for g in groups]
+    avg_prep = sum(prep_counts) / len(prep_counts)
+
+    total_leaders = sum(g.leader_count for g in groups)
+    total_members = sum(group_sizes)
+    ideal_leader_ratio = total_leaders / total_members if total_members > 0 else 0
+    return avg_size, avg_prep, ideal_leader_ratio
+
+
+def partition_score_components(
+    groups: List[Group],
+    target_size: int = 7,
+    diversity: DiversityConfig | None = None,
+    pairing: "RepeatPairing | None" = None,
+) -> Dict[str, float]:
+    """
+    Sum the diversity score components over a whole partition.
+
+    :param groups: List of groups making up the partition
+    :param target_size: Target size for each group (default: 7)
+    :param diversity: Diversity config; defaults to DEFAULT_DIVERSITY
+    :param pairing: Optional repeat-pairing penalty, reported as
+        repeat_pairing_penalty and subtracted from the total
+    :return: Summed components plus the total score and the gender imbalance
+    """
+    totals = {"entropy": 0.0, **{name: 0.0 for name in PENALTY_COMPONENTS}}
+    averages = partition_averages(groups) if groups else None
+    kernel = (diversity or DEFAULT_DIVERSITY).compile(
+        m for g in groups for m in g.members
+    )
+    for group in groups:
+        components = group.diversity_components(
+            groups, target_size, averages, kernel=kernel
+        )
+        for name, value in components.items():
+            totals[name] += value
+    totals["repeat_pairing_penalty"] = pairing.penalty(groups) if pairing else 0.0
+    totals["total"] = (
+        totals["entropy"]
+        - sum(totals[name] for name in PENALTY_COMPONENTS)
+        - totals["repeat_pairing_penalty"]
+    )
+    totals["gender_imbalance"] = sum(
+        abs(sum(1 for m in g.members if m.gender == "M") / len(g.members) - 0.5)
+        for g in groups
+        if g.members
+    )
+    return totals
+
+
+def gender_imbalance_bound(groups: List[Group]) -> float:
+    """
+    Lower bound on the total gender imbalance balance_gender_in_groups can
+    reach, computed from per-group counts.
+
+    The balancer keeps group sizes and never moves graduates, so each group
+    ends up with between its graduate men and that plus its other members
+    as men, and the other men are spread over those places. The imbalance of
+    a group is convex in its number of men, so the best spread takes the
+    cheapest added men over all groups. Ignoring that swaps also need the
+    same role and prep status makes this a bound rather than the optimum.
+
+    :param groups: Partition to bound
+    :return: Smallest total imbalance over all such spreads
+    """
+    bound = 0.0
+    steps = []
+    movable_men = 0
+    for group in groups:
+        size = len(group.members)
+        if not size:
+            continue
+        fixed = sum(1 for m in group.members if m.is_graduated and m.gender == "M")
+        movable = sum(1 for m in group.members if not m.is_graduated)
+        movable_men += sum(
+            1 for m in group.members if not m.is_graduated and m.gender == "M"
+        )
+        imbalances = [abs(men / size - 0.5) for men in range(size + 1)]
+        bound += imbalances[fixed]
+        steps.extend(
+            imbalances[men] - imbalances[men - 1]
+            for men in range(fixed + 1, fixed + movable + 1)
+        )
+    return bound + sum(nsmallest(movable_men, steps))
+
+
 def balance_gender_in_groups(
     groups: List[Group],
     max_iterations: int = 1000,
     temperature: float = 0.1,
     target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: "RepeatPairing | None" = None,
 ) -> List[Group]:
     """
     More efficient gender balancing algorithm that:
     1. Targets the most imbalanced groups for swaps
     2. Only attempts swaps between compatible members
-    3. Uses early stopping when no improvements are found
+    3. Uses early stopping when no improvements are found, or as soon as
+       the imbalance reaches gender_imbalance_bound
 
     :param groups: List of groups to balance
     :param max_iterations: Maximum number of iterations
     :param temperature: Unused parameter, kept for backward compatibility
     :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token checked every iteration; raises
+        OptimizationCancelled once it is cancelled
+    :param telemetry: Optional telemetry record filled in with iteration
+        counts, the stop reason, the "balancing" phase time, final scores and
+        the gap between the final imbalance and its lower bound
+    :param time_limit: Optional wall-clock budget in seconds
+    :param diversity: Diversity config used to score the result in telemetry
+    :param constraints: Optional constraints; swaps adding a violation are
+        skipped
+    :param pairing: Optional repeat-pairing penalty included in the scores
+        reported to telemetry
     :return: List of balanced groups
     """
+    phase_start = time.perf_counter()
 
     def get_gender_ratio(group: Group) -> float:
         """Calculate male/female ratio for a group. Returns male percentage."""
@@ -203,22 +377,55 @@ def balance_gender_in_groups(
 
     # Create a deep copy of groups to work with
     balanced_groups = [Group(members=list(group.members)) for group in groups]
+    constraint_state = None
+    if constraints:
+        constraint_state = ConstraintState(
+            constraints.compile(m for g in groups for m in g.members),
+            balanced_groups,
+        )
+        member_index = constraint_state.compiled.index
 
     # Keep track of best solution
     best_groups = balanced_groups
     best_imbalance = calculate_total_imbalance(balanced_groups)
+    lower_bound = gender_imbalance_bound(balanced_groups)
+    if telemetry is not None:
+        telemetry.record_progress(best_groups, target_size, diversity, pairing)
 
     # Counter for iterations without improvement
     stagnant_iterations = 0
     MAX_STAGNANT_ITERATIONS = 100  # Early stopping if no improvements
+    iterations_run = 0
+    accepted_moves = 0
+    stop_reason = "max_iterations"
+    deadline = phase_start + time_limit if time_limit is not None else None
 
     for iteration in range(max_iterations):
+        if cancel_token is not None and cancel_token.cancelled:
+            if telemetry is not None:
+                telemetry.iterations += iterations_run
+                telemetry.stop_reason = "cancelled"
+                telemetry.add_phase("balancing", time.perf_counter() - phase_start)
+            cancel_token.raise_if_cancelled()
+
+        if best_imbalance <= lower_bound + 1e-9:
+            logger.info(f"Stopping after {iteration} iterations - imbalance is optimal")
+            stop_reason = "optimal"
+            break
+
         if stagnant_iterations >= MAX_STAGNANT_ITERATIONS:
             logger.info(
                 f"Early stopping after {iteration} iterations - no recent improvements"
             )
+            stop_reason = "stagnation"
             break
 
+        if deadline is not None and time.perf_counter() > deadline:
+            stop_reason = "time_limit"
+            break
+
+        iterations_run += 1
+
         # Sort groups by imbalance to focus on the most problematic ones
         group_imbalances = [
             (i, get_group_imbalance(g)) for i, g in enumerate(balanced_groups)
@@ -233,6 +440,8 @@ def balance_gender_in_groups(
 
             g1_idx = group_imbalances[i][0]
             for j in range(i + 1, len(group_imbalances)):
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
                 g2_idx = group_imbalances[j][0]
 
                 # Find all possible swaps between these groups
@@ -245,6 +454,11 @@ def balance_gender_in_groups(
 
                 # Try each possible swap
                 for m1, m2 in swappable_pairs:
+                    if constraint_state is not None:
+                        a, b = member_index[m1.id], member_index[m2.id]
+                        if constraint_state.swap_delta(a, b) > 0:
+                            continue
+
                     # Create temporary groups with the swap
                     temp_groups = [
                         Group(members=list(g.members)) for g in balanced_groups
@@ -265,14 +479,21 @@ def balance_gender_in_groups(
 
                     # Accept if better
                     if new_imbalance < best_imbalance:
+                        if constraint_state is not None:
+                            constraint_state.apply_swap(a, b)
                         best_imbalance = new_imbalance
                         best_groups = temp_groups
                         balanced_groups = temp_groups
                         made_swap = True
+                        accepted_moves += 1
                         stagnant_iterations = 0
                         logger.debug(
                             f"Found better solution with imbalance {best_imbalance}"
                         )
+                        if telemetry is not None:
+                            telemetry.record_progress(
+                                best_groups, target_size, diversity, pairing
+                            )
                         break
 
                 if made_swap:
@@ -282,6 +503,25 @@ def balance_gender_in_groups(
             stagnant_iterations += 1
 
     logger.info(f"Gender balancing complete. Final imbalance: {best_imbalance}")
+    record_span(
+        "balance_gender_in_groups",
+        phase_start,
+        time.perf_counter() - phase_start,
+        iterations=iterations_run,
+        accepted_moves=accepted_moves,
+        stop_reason=stop_reason,
+    )
+    if telemetry is not None:
+        telemetry.roster_size = sum(len(g.members) for g in best_groups)
+        telemetry.num_groups = len(best_groups)
+        telemetry.iterations += iterations_run
+        telemetry.accepted_moves += accepted_moves
+        telemetry.stop_reason = stop_reason
+        telemetry.optimality_gap = max(0.0, best_imbalance - lower_bound)
+        telemetry.add_phase("balancing", time.perf_counter() - phase_start)
+        telemetry.score_components = partition_score_components(
+            best_groups, target_size, diversity, pairing
+        )
     return best_groups
 
 
@@ -290,6 +530,12 @@ def divide_into_groups(
     num_groups: int,
     max_iterations: int = 1000,
     target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: "RepeatPairing | None" = None,
 ) -> List[Group]:
     """
     Divide members into groups using a deterministic approach.
@@ -306,8 +552,19 @@ def divide_into_groups(
     :param num_groups: Initial suggestion for number of groups (will be adjusted)
     :param max_iterations: Number of iterations for gender balancing (if > 0)
     :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token passed through to gender balancing
+    :param telemetry: Optional telemetry record; the "placement" phase is timed
+        here and balancing statistics are added by balance_gender_in_groups
+    :param time_limit: Optional wall-clock budget in seconds for gender balancing
+    :param diversity: Diversity config used to score the result in telemetry
+    :param constraints: Optional constraints; balancing never adds a violation
+        and violations left by the placement are repaired afterwards
+    :param pairing: Optional repeat-pairing penalty included in the scores
+        reported to telemetry
     :return: List of groups
     """
+    phase_start = time.perf_counter()
+
     # Filter for present members only
     present_members = [m for m in members if m.is_present]
     total_present = len(present_members)
@@ -566,10 +823,48 @@ def divide_into_groups(
                 assigned_members.add(student)
                 distributed_students.add(student)
 
+    record_span(
+        "divide_into_groups.placement",
+        phase_start,
+        time.perf_counter() - phase_start,
+        members=total_present,
+        num_groups=num_groups,
+    )
+    if telemetry is not None:
+        telemetry.roster_size = total_present
+        telemetry.num_groups = num_groups
+        telemetry.add_phase("placement", time.perf_counter() - phase_start)
+        telemetry.stop_reason = "placement_only"
+        telemetry.score_components = partition_score_components(
+            groups, target_size, diversity, pairing
+        )
+        telemetry.record_progress(groups, target_size, diversity, pairing)
+
     # Apply gender balancing if max_iterations > 0
     if max_iterations > 0:
         groups = balance_gender_in_groups(
-            groups, max_iterations=max_iterations, target_size=target_size
+            groups,
+            max_iterations=max_iterations,
+            target_size=target_size,
+            cancel_token=cancel_token,
+            telemetry=telemetry,
+            time_limit=time_limit,
+            diversity=diversity,
+            constraints=constraints,
+            pairing=pairing,
+        )
+
+    if constraints:
+        from .partition import repair_partition
+
+        groups = repair_partition(
+            groups,
+            constraints,
+            target_size=target_size,
+            cancel_token=cancel_token,
+            telemetry=telemetry,
+            diversity=diversity,
+            pairing=pairing,
         )
 
     return groups
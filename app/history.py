@@ -0,0 +1,179 @@
+"""Finalized group divisions and how often members have shared a group.
+
+A division is stored when it is finalized, as one group_history row per
+(date, group number, member). Co-membership counts scan the rows of the
+requested weeks in primary key order, so each group's members arrive
+together, and count the pairs of every group in Python, which is two to three
+times faster than a self-join with GROUP BY in SQLite. Counts are sparse:
+only pairs that have met appear.
+
+The same scan feeds the optional repeat-pairing penalty. RepeatPairing
+holds decayed pair weights, where a pair that shared a group ``w`` weeks ago
+contributes ``decay ** w``. The optimizer subtracts ``weight`` times the
+weights of the pairs placed together again. The penalty is configured with
+REPEAT_PENALTY_WEIGHT (0, the default, disables it), REPEAT_PENALTY_DECAY and
+REPEAT_PENALTY_WEEKS.
+"""
+
+import os
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from itertools import combinations, groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import Select, delete, insert, select
+from sqlalchemy.orm import Session
+
+from .group_divider import Group, GroupMember
+from .models import GroupHistory
+
+# Weight of the repeat-pairing penalty; 0 disables it
+REPEAT_PENALTY_WEIGHT = float(os.getenv("REPEAT_PENALTY_WEIGHT", "0"))
+# Factor applied per week of age to a past pairing
+REPEAT_PENALTY_DECAY = float(os.getenv("REPEAT_PENALTY_DECAY", "0.5"))
+# Number of weeks of history the penalty looks at
+REPEAT_PENALTY_WEEKS = int(os.getenv("REPEAT_PENALTY_WEEKS", "12"))
+
+# (smaller member id, larger member id) -> number of shared groups
+CoMembership = Dict[Tuple[int, int], int]
+
+
+def record_division(db: Session, day: date, groups: Iterable[Group]) -> int:
+    """Store the division finalized for ``day``, replacing an earlier one.
+
+    :param db: Database session; the caller commits
+    :param day: Meeting date
+    :param groups: Groups in the order they were announced; group numbers
+        start at 1
+    :return: Number of rows written
+    """
+    rows = [
+        {"date": day, "group_no": group_no, "member_id": m.id}
+        for group_no, group in enumerate(groups, 1)
+        for m in group.members
+    ]
+    db.execute(delete(GroupHistory).where(GroupHistory.date == day))
+    if rows:
+        db.execute(insert(GroupHistory), rows)
+    return len(rows)
+
+
+def load_division(db: Session, day: date) -> List[List[int]]:
+    """Member ids of each group finalized for ``day``, by group number."""
+    groups: Dict[int, List[int]] = {}
+    rows = db.execute(
+        select(GroupHistory.group_no, GroupHistory.member_id)
+        .where(GroupHistory.date == day)
+        .order_by(GroupHistory.group_no)
+    )
+    for group_no, member_id in rows:
+        groups.setdefault(group_no, []).append(member_id)
+    return list(groups.values())
+
+
+def history_window(weeks: int, end: date | None = None) -> Tuple[date, date]:
+    """First and last date of the ``weeks`` weeks up to and including ``end``."""
+    end = end or date.today()
+    return end - timedelta(weeks=weeks) + timedelta(days=1), end
+
+
+def history_query(since: date, until: date) -> Select:
+    """(date, group_no, member_id) rows between ``since`` and ``until``, in
+    primary key order so each group's rows are adjacent."""
+    return (
+        select(GroupHistory.date, GroupHistory.group_no, GroupHistory.member_id)
+        .where(GroupHistory.date.between(since, until))
+        .order_by(GroupHistory.date, GroupHistory.group_no, GroupHistory.member_id)
+    )
+
+
+def _groups_in_window(
+    db: Session, since: date, until: date
+) -> Iterator[Tuple[date, List[int]]]:
+    """(date, sorted member ids) of every stored group in the window."""
+    rows = db.execute(history_query(since, until))
+    for (day, _), group in groupby(rows, key=itemgetter(0, 1)):
+        yield day, [member_id for _, _, member_id in group]
+
+
+def co_membership(
+    db: Session, weeks: int = 12, end: date | None = None
+) -> CoMembership:
+    """How often each pair of members shared a group in the last ``weeks`` weeks.
+
+    :param db: Database session
+    :param weeks: Length of the window
+    :param end: Last day of the window (default today)
+    :return: Sparse counts keyed by (smaller id, larger id)
+    """
+    counts: Counter = Counter()
+    for _, members in _groups_in_window(db, *history_window(weeks, end)):
+        counts.update(combinations(members, 2))
+    return dict(counts)
+
+
+class RepeatPairing:
+    """Penalty for placing members together who recently shared a group.
+
+    :param pairs: Decayed weight per (smaller id, larger id) pair
+    :param weight: Multiplier turning pair weights into score
+    """
+
+    def __init__(self, pairs: Dict[Tuple[int, int], float], weight: float = 1.0):
+        self.pairs = pairs
+        self.weight = weight
+
+    def penalty(self, groups: Iterable[Group]) -> float:
+        """Penalty of a partition: ``weight`` times the weights of every pair
+        sharing a group."""
+        pairs = self.pairs
+        return self.weight * sum(
+            pairs.get(pair, 0.0)
+            for group in groups
+            for pair in combinations(sorted(m.id for m in group.members), 2)
+        )
+
+    def compile(self, members: Iterable[GroupMember]) -> List[Dict[int, float]]:
+        """Penalty per pair as sparse adjacency by roster index.
+
+        :param members: Roster, in the order that defines the indices
+        :return: For each member, the roster indices it has met mapped to the
+            penalty of placing the two together; pairs with absent members are
+            dropped
+        """
+        index = {m.id: i for i, m in enumerate(members)}
+        adjacency: List[Dict[int, float]] = [{} for _ in index]
+        for (a, b), pair_weight in self.pairs.items():
+            if a in index and b in index:
+                i, j = index[a], index[b]
+                adjacency[i][j] = adjacency[j][i] = self.weight * pair_weight
+        return adjacency
+
+
+def load_repeat_pairing(
+    db: Session,
+    end: date | None = None,
+    weeks: int = REPEAT_PENALTY_WEEKS,
+    decay: float = REPEAT_PENALTY_DECAY,
+    weight: float = REPEAT_PENALTY_WEIGHT,
+) -> RepeatPairing | None:
+    """Load the repeat-pairing penalty from the stored divisions.
+
+    :param db: Database session
+    :param end: Last day of history to use; pass the day before the meeting
+        so that a division already finalized for it is not counted
+    :param weeks: Length of the history window
+    :param decay: Factor applied per week between a pairing and ``end``
+    :param weight: Penalty multiplier
+    :return: The penalty, or None if ``weight`` disables it
+    """
+    if weight <= 0:
+        return None
+    since, until = history_window(weeks, end)
+    pairs: Dict[Tuple[int, int], float] = defaultdict(float)
+    for day, members in _groups_in_window(db, since, until):
+        pair_weight = decay ** ((until - day).days // 7)
+        for pair in combinations(members, 2):
+            pairs[pair] += pair_weight
+    return RepeatPairing(dict(pairs), weight)
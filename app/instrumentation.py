@@ -0,0 +1,318 @@
+"""Per-request latency, SQL and template-rendering instrumentation."""
+
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.templating import Jinja2Templates
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .tracing import span
+
+# Upper bounds (in milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# Requests issuing more statements than this are logged as possible N+1 queries
+SQL_QUERY_WARN_THRESHOLD = int(os.getenv("SQL_QUERY_WARN_THRESHOLD", "20"))
+
+# Time waits for SQLite locks (see LockTimingConnection). Off by default: it
+# starts write transactions with BEGIN IMMEDIATE and adds statements around
+# every BEGIN and COMMIT; the load test turns it on
+SQLITE_LOCK_TIMING = os.getenv("SQLITE_LOCK_TIMING", "") in ("1", "true", "yes")
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+
+@dataclass
+class RequestStats:
+    """Timings accumulated while handling a single request."""
+
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    template_seconds: float = 0.0
+    optimizer_seconds: float = 0.0
+    lock_waits: int = 0
+    lock_wait_seconds: float = 0.0
+    lock_errors: int = 0
+    statements: Dict[str, int] = field(default_factory=dict)
+
+    def server_timing(self, total_seconds: float) -> str:
+        """Format the stats as a Server-Timing header value."""
+        return ", ".join(
+            [
+                f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} queries"',
+                f"tpl;dur={self.template_seconds * 1000:.1f}",
+                f"opt;dur={self.optimizer_seconds * 1000:.1f}",
+                f"total;dur={total_seconds * 1000:.1f}",
+            ]
+        )
+
+
+_current_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def current_stats() -> RequestStats | None:
+    """Stats of the request being handled, or None outside a request."""
+    return _current_stats.get()
+
+
+@dataclass
+class RouteMetrics:
+    """Aggregated metrics for one route."""
+
+    requests: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    bucket_counts: List[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    )
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    max_sql_count: int = 0
+    template_seconds: float = 0.0
+    optimizer_seconds: float = 0.0
+    lock_waits: int = 0
+    lock_wait_seconds: float = 0.0
+    max_lock_wait_seconds: float = 0.0
+    lock_errors: int = 0
+
+    def observe(self, seconds: float, stats: RequestStats, status: int) -> None:
+        self.requests += 1
+        self.errors += status >= 500
+        self.total_seconds += seconds
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+        self.sql_count += stats.sql_count
+        self.sql_seconds += stats.sql_seconds
+        self.max_sql_count = max(self.max_sql_count, stats.sql_count)
+        self.template_seconds += stats.template_seconds
+        self.optimizer_seconds += stats.optimizer_seconds
+        self.lock_waits += stats.lock_waits
+        self.lock_wait_seconds += stats.lock_wait_seconds
+        self.max_lock_wait_seconds = max(
+            self.max_lock_wait_seconds, stats.lock_wait_seconds
+        )
+        self.lock_errors += stats.lock_errors
+
+    def quantile_ms(self, q: float) -> float | None:
+        """Estimate a latency quantile as the upper bound of its bucket."""
+        if not self.requests:
+            return None
+        rank = q * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + [None], self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_dict(self) -> dict:
+        n = max(self.requests, 1)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_ms": self.total_seconds / n * 1000,
+            "p50_ms": self.quantile_ms(0.5),
+            "p95_ms": self.quantile_ms(0.95),
+            "p99_ms": self.quantile_ms(0.99),
+            "histogram": {
+                f"le_{bound}": count
+                for bound, count in zip(
+                    LATENCY_BUCKETS_MS + ["inf"], self.bucket_counts
+                )
+            },
+            "sql_queries_per_request": self.sql_count / n,
+            "max_sql_queries": self.max_sql_count,
+            "sql_ms_per_request": self.sql_seconds / n * 1000,
+            "template_ms_per_request": self.template_seconds / n * 1000,
+            "optimizer_ms_per_request": self.optimizer_seconds / n * 1000,
+            "suspected_n_plus_one": self.max_sql_count > SQL_QUERY_WARN_THRESHOLD,
+            "lock_waits": self.lock_waits,
+            "lock_wait_ms": self.lock_wait_seconds * 1000,
+            "max_lock_wait_ms": self.max_lock_wait_seconds * 1000,
+            "lock_errors": self.lock_errors,
+        }
+
+
+class RequestMetrics:
+    """Thread-safe registry of per-route metrics."""
+
+    def __init__(self) -> None:
+        self._routes: Dict[str, RouteMetrics] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self, route: str, seconds: float, stats: RequestStats, status: int
+    ) -> None:
+        with self._lock:
+            self._routes.setdefault(route, RouteMetrics()).observe(
+                seconds, stats, status
+            )
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {route: m.to_dict() for route, m in sorted(self._routes.items())}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+request_metrics = RequestMetrics()
+
+
+class TimedJinja2Templates(Jinja2Templates):
+    """Jinja2Templates that adds rendering time to the current request's stats."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        name = next((a for a in args if isinstance(a, str)), kwargs.get("name"))
+        start = time.perf_counter()
+        try:
+            with span("template.render", template=name):
+                return super().TemplateResponse(*args, **kwargs)
+        finally:
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.template_seconds += time.perf_counter() - start
+
+
+def add_optimizer_time(seconds: float) -> None:
+    """Attribute optimizer wall time to the current request, if any."""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.optimizer_seconds += seconds
+
+
+class LockTimingConnection(sqlite3.Connection):
+    """sqlite3 connection that adds the time it spent waiting on SQLITE_BUSY
+    to the current request's stats.
+
+    Locks are taken where they can be timed on their own: the write lock by
+    BEGIN IMMEDIATE before a transaction's first write, the exclusive lock
+    by COMMIT. Each is first tried without a busy timeout, so only attempts
+    that found the lock held by another connection are counted as waits.
+
+    Used for engines created while SQLITE_LOCK_TIMING is on.
+    """
+
+    _busy_timeout_ms: int | None = None
+
+    def begin_write(self) -> None:
+        """Start a transaction holding the write lock."""
+        self._take_lock(lambda: self.execute("BEGIN IMMEDIATE"))
+
+    def commit(self) -> None:
+        if self.in_transaction:
+            self._take_lock(super().commit)
+
+    def _take_lock(self, acquire) -> None:
+        if self._busy_timeout_ms is None:
+            self._busy_timeout_ms = self.execute("PRAGMA busy_timeout").fetchone()[0]
+        self.execute("PRAGMA busy_timeout = 0")
+        try:
+            acquire()
+            return
+        except sqlite3.OperationalError as e:
+            if "database is locked" not in str(e):
+                raise
+        finally:
+            self.execute(f"PRAGMA busy_timeout = {self._busy_timeout_ms}")
+
+        # A failed BEGIN or COMMIT leaves the transaction as it was, so the
+        # lock is taken again, this time waiting up to the busy timeout
+        start = time.perf_counter()
+        try:
+            acquire()
+        finally:
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.lock_waits += 1
+                stats.lock_wait_seconds += time.perf_counter() - start
+
+
+@event.listens_for(Engine, "do_connect")
+def _do_connect(dialect, conn_rec, cargs, cparams):
+    if SQLITE_LOCK_TIMING and dialect.name == "sqlite":
+        cparams.setdefault("factory", LockTimingConnection)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+    # Without this, sqlite3 would begin the transaction itself and the wait
+    # for the write lock would be hidden inside the first write
+    dbapi_connection = cursor.connection
+    if (
+        isinstance(dbapi_connection, LockTimingConnection)
+        and dbapi_connection.isolation_level is not None
+        and not dbapi_connection.in_transaction
+        and statement.lstrip().upper().startswith(_WRITE_STATEMENTS)
+    ):
+        dbapi_connection.begin_write()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+        # Keyed by the first line so repeated N+1 statements group together
+        key = statement.strip().splitlines()[0][:120]
+        stats.statements[key] = stats.statements.get(key, 0) + 1
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute does not run for failed statements
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+    if "database is locked" in str(context.original_exception):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.lock_errors += 1
+
+
+def route_name(request: Request) -> str:
+    """Route template (e.g. /members/{member_id}/prep) rather than the raw path,
+    so that metrics are not split per member id."""
+    route = request.scope.get("route")
+    path = getattr(route, "path", None) or request.url.path
+    return f"{request.method} {path}"
+
+
+def install(app: FastAPI) -> None:
+    """Register the instrumentation middleware on ``app``."""
+
+    @app.middleware("http")
+    async def instrument_request(request: Request, call_next):
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_stats.reset(token)
+            request_metrics.observe(route_name(request), elapsed, stats, status)
+
+        if stats.sql_count > SQL_QUERY_WARN_THRESHOLD:
+            top_statement, repeats = max(stats.statements.items(), key=lambda x: x[1])
+            logger.warning(
+                f"{route_name(request)} issued {stats.sql_count} SQL statements "
+                f"(possible N+1; {repeats}x {top_statement!r})"
+            )
+        response.headers["Server-Timing"] = stats.server_timing(elapsed)
+        return response
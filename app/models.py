@@ -1,6 +1,18 @@
-from datetime import date
+from datetime import date, datetime
 from typing import Optional
-from sqlalchemy import Boolean, Column, Date, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -36,6 +48,8 @@ class Attendance(Base):
     """Record of attendance for a member on a specific date."""
 
     __tablename__ = "attendance"
+    # Roster queries look up one day's attendance and join it to members
+    __table_args__ = (Index("ix_attendance_date_member", "date", "member_id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     member_id: Mapped[int] = mapped_column(ForeignKey("members.id"))
@@ -45,3 +59,63 @@ class Attendance(Base):
 
     # Relationship to member
     member: Mapped[Member] = relationship(back_populates="attendance_records")
+
+
+class OptimizerRun(Base):
+    """Telemetry for one run of the group optimizer."""
+
+    __tablename__ = "optimizer_runs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    engine: Mapped[str] = mapped_column(String(30))
+    roster_size: Mapped[int] = mapped_column(Integer)
+    num_groups: Mapped[int] = mapped_column(Integer)
+    iterations: Mapped[int] = mapped_column(Integer, default=0)
+    accepted_moves: Mapped[int] = mapped_column(Integer, default=0)
+    stop_reason: Mapped[Optional[str]] = mapped_column(String(30))
+    total_seconds: Mapped[float] = mapped_column(Float)
+    phase_seconds: Mapped[str] = mapped_column(Text)  # JSON object
+    score_components: Mapped[str] = mapped_column(Text)  # JSON object
+
+
+class MemberPair(Base):
+    """Two members the optimizer must keep apart or place together."""
+
+    __tablename__ = "member_pairs"
+    # One constraint per pair; member_a_id is always the smaller id
+    __table_args__ = (UniqueConstraint("member_a_id", "member_b_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(10))  # separate, together
+    member_a_id: Mapped[int] = mapped_column(ForeignKey("members.id"))
+    member_b_id: Mapped[int] = mapped_column(ForeignKey("members.id"))
+    notes: Mapped[Optional[str]] = mapped_column(Text)
+
+
+class GroupCap(Base):
+    """Upper bound on members with an attribute value in any one group."""
+
+    __tablename__ = "group_caps"
+    __table_args__ = (UniqueConstraint("attribute", "value"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    attribute: Mapped[str] = mapped_column(String(30))
+    value: Mapped[str] = mapped_column(String(30))
+    max_per_group: Mapped[int] = mapped_column(Integer)
+
+
+class GroupHistory(Base):
+    """One member's group in a finalized division."""
+
+    __tablename__ = "group_history"
+    # The primary key doubles as the (date, group) index used by
+    # co-membership queries; without a rowid each row is stored only once
+    __table_args__ = (
+        Index("ix_group_history_member_date", "member_id", "date"),
+        {"sqlite_with_rowid": False},
+    )
+
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
+    group_no: Mapped[int] = mapped_column(Integer, primary_key=True)
+    member_id: Mapped[int] = mapped_column(ForeignKey("members.id"), primary_key=True)
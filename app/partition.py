@@ -0,0 +1,1024 @@
+"""Local search over the full partition score.
+
+The greedy balancer only looks at gender, and rescoring a whole partition for
+every candidate move would make optimizing the real objective far slower.
+PartitionState keeps, per group, the size, prep and leader counts and the
+kernel position counts together with the group's score. Every component of
+Group.diversity_components depends on those values and on partition-wide
+averages that no swap changes, so the score change of swapping two members
+only needs the two groups involved and the positions of the two members.
+
+The swaps respect the placement rules the score does not express: graduates
+only trade places with graduates, so graduate groups stay graduate-only, and a
+group that has a leader (facilitator or counselor) keeps at least one. With a
+ConstraintSet, fewer constraint violations always beat a better score: swaps
+that add violations are rejected and swaps that remove one are taken even if
+they lower the score.
+
+Swaps keep every group's size. The ``neighborhood`` search also moves single
+members between groups, within the size bounds of PartitionState.can_move,
+and rotates three members of three groups when no swap or move helps; their
+score changes are computed the same way, from the groups involved only.
+
+tabu_partition does not stop at the first local optimum: every iteration
+applies the best swap among sampled candidates even if it lowers the score,
+while members that just moved are tabu for a few iterations so the search
+does not undo its own steps. A tabu swap is still taken if it reaches a
+partition better than any seen so far (the aspiration criterion).
+
+The optional repeat-pairing penalty is kept per group as well. Its pair
+weights are compiled into one sparse dict per member, so its part of a swap's
+score change is a lookup per member of the two groups.
+"""
+
+import random
+import time
+from itertools import repeat
+from math import log as ln
+from typing import Dict, List, Sequence, Tuple
+
+from loguru import logger
+
+from .constraints import CompiledConstraints, ConstraintSet, ConstraintState
+from .diversity import DEFAULT_DIVERSITY, DiversityConfig, DiversityKernel
+from .group_divider import PENALTY_COMPONENTS, Group, MemberRole
+from .history import RepeatPairing
+from .single_flight import CancellationToken
+from .telemetry import OptimizerTelemetry
+from .tracing import record_span
+
+# Stop after this many consecutive sweeps without an improving swap
+MAX_STAGNANT_SWEEPS = 3
+
+# Score changes below this are treated as rounding noise
+MIN_IMPROVEMENT = 1e-9
+
+# Iterations a member that moved stays tabu, at most a quarter of the roster
+TABU_TENURE = 10
+
+# Members sampled per tabu iteration, each compared with one other group
+TABU_CANDIDATES = 24
+
+# Stop tabu search after this many iterations without a new best partition
+TABU_MAX_STAGNANT_ITERATIONS = 500
+
+_LEADER_ROLES = (MemberRole.FACILITATOR, MemberRole.COUNSELOR)
+
+# Default values for dict.get when mapped over a group's members
+_ZEROS = repeat(0.0)
+
+
+class PartitionState:
+    """A partition with incrementally maintained per-group scores.
+
+    Members are referred to by their roster index ``i`` (the order of the
+    members in ``groups``) and groups by their position in ``groups``.
+
+    :param groups: Partition to start from
+    :param target_size: Target size used by the oversize penalty
+    :param kernel: Diversity config compiled for the members of ``groups``;
+        compiled from ``diversity`` when omitted
+    :param diversity: Diversity config, defaults to DEFAULT_DIVERSITY
+    :param constraints: Optional constraints whose violations are tracked in
+        ``constraint_state``
+    :param pairing: Optional repeat-pairing penalty subtracted from the score
+    """
+
+    def __init__(
+        self,
+        groups: List[Group],
+        target_size: int = 7,
+        kernel: DiversityKernel | None = None,
+        diversity: DiversityConfig | None = None,
+        constraints: ConstraintSet | None = None,
+        pairing: RepeatPairing | None = None,
+    ):
+        members = [m for g in groups for m in g.members]
+        kernel = kernel or (diversity or DEFAULT_DIVERSITY).compile(members)
+        index = kernel.index
+        self._start(
+            members,
+            kernel,
+            target_size,
+            [kernel.positions[index[m.id]] for m in members],
+            [int(m.prep_attended) for m in members],
+            [int(m.role in _LEADER_ROLES) for m in members],
+            [int(m.gender == "M") for m in members],
+            [int(m.is_graduated) for m in members],
+            [g for g, group in enumerate(groups) for _ in group.members],
+            len(groups),
+            pairing.compile(members) if pairing else None,
+            (
+                ConstraintState(constraints.compile(members), groups)
+                if constraints
+                else None
+            ),
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        ids: Sequence[int],
+        kernel: DiversityKernel,
+        target_size: int,
+        is_prep: Sequence[int],
+        is_leader: Sequence[int],
+        is_male: Sequence[int],
+        is_graduated: Sequence[int],
+        assignment: Sequence[int],
+        num_groups: int,
+        pair_weights: List[Dict[int, float]] | None = None,
+        constraints: CompiledConstraints | None = None,
+    ) -> "PartitionState":
+        """State built from per-member columns instead of GroupMember objects,
+        as worker processes do from a shared roster (see app.shared_roster).
+
+        ``members`` then holds the member ids, so to_groups is not available;
+        workers report ``assignment`` back instead.
+
+        :param assignment: Group of each roster member
+        """
+        state = cls.__new__(cls)
+        state._start(
+            list(ids),
+            kernel,
+            target_size,
+            kernel.positions,
+            is_prep,
+            is_leader,
+            is_male,
+            is_graduated,
+            assignment,
+            num_groups,
+            pair_weights,
+            (
+                ConstraintState.from_assignment(constraints, assignment, num_groups)
+                if constraints
+                else None
+            ),
+        )
+        return state
+
+    def _start(
+        self,
+        members: list,
+        kernel: DiversityKernel,
+        target_size: int,
+        positions: List[Tuple[int, ...]],
+        is_prep: Sequence[int],
+        is_leader: Sequence[int],
+        is_male: Sequence[int],
+        is_graduated: Sequence[int],
+        assignment: Sequence[int],
+        num_groups: int,
+        pair_weights: List[Dict[int, float]] | None,
+        constraint_state: ConstraintState | None,
+    ) -> None:
+        self.members = members
+        self.kernel = kernel
+        self.target_size = target_size
+        self.positions = positions
+        self.is_prep = is_prep
+        self.is_leader = is_leader
+        self.is_male = is_male
+        self.is_graduated = is_graduated
+        # Size bounds single-member moves keep groups within
+        self.min_size = max(2, target_size - 2)
+        self.max_size = target_size + 1
+
+        self.assignment = list(assignment)
+        self.group_members: List[List[int]] = [[] for _ in range(num_groups)]
+        for i, g in enumerate(self.assignment):
+            self.group_members[g].append(i)
+
+        total = len(members)
+        self.avg_size = total / max(num_groups, 1)
+        self.avg_prep = sum(is_prep) / max(num_groups, 1)
+        self.ideal_leader_ratio = sum(is_leader) / total if total else 0
+
+        self.log = [0.0] + [ln(n) for n in range(1, total + 1)]
+        self.sizes = [len(members) for members in self.group_members]
+        self.prep = [sum(is_prep[i] for i in ms) for ms in self.group_members]
+        self.leaders = [sum(is_leader[i] for i in ms) for ms in self.group_members]
+        self.males = [sum(is_male[i] for i in ms) for ms in self.group_members]
+        # No move changes these
+        self.graduates = [sum(is_graduated[i] for i in ms) for ms in self.group_members]
+        self.counts = []
+        for ms in self.group_members:
+            counts = [0] * kernel.num_positions
+            for i in ms:
+                for p in positions[i]:
+                    counts[p] += 1
+            self.counts.append(counts)
+        weights = kernel.position_weights
+        xlogx = kernel.xlogx
+        # sum(w_p * xlogx[c_p]) per group; the entropy is W ln n - this / n
+        self.entropy_sums = [
+            sum(weights[p] * xlogx[c] for p, c in enumerate(counts) if c)
+            for counts in self.counts
+        ]
+        self.scores = [
+            self._score(self.sizes[g], self.prep[g], self.leaders[g], s)
+            for g, s in enumerate(self.entropy_sums)
+        ]
+        # Repeat-pairing penalty of each group, kept apart from the scores
+        self.pair_weights = pair_weights
+        self.repeat = [0.0] * num_groups
+        if pair_weights is not None:
+            self.repeat = [
+                sum(pair_weights[i].get(k, 0.0) for i in ms for k in ms) / 2
+                for ms in self.group_members
+            ]
+        self.total = sum(self.scores) - sum(self.repeat)
+        self.constraint_state = constraint_state
+
+    @property
+    def violations(self) -> int:
+        """Number of constraint violations of the partition."""
+        return self.constraint_state.violations if self.constraint_state else 0
+
+    def _components(
+        self, size: int, prep: int, leaders: int, entropy_sum: float
+    ) -> Dict[str, float]:
+        components = {"entropy": 0.0, **{name: 0.0 for name in PENALTY_COMPONENTS}}
+        if not size:
+            return components
+        components["entropy"] = (
+            self.kernel.total_weight * self.log[size] - entropy_sum / size
+        )
+        oversize = size - (self.target_size + 1)
+        if oversize > 0:
+            components["oversize_penalty"] = oversize * oversize * 0.5
+        components["size_balance_penalty"] = (size - self.avg_size) ** 2 * 0.3
+        components["prep_penalty"] = (prep - self.avg_prep) ** 2 * 0.4
+        components["leader_density_penalty"] = (
+            (leaders / size - self.ideal_leader_ratio) ** 2 * size * 0.6
+        )
+        return components
+
+    def _score(self, size: int, prep: int, leaders: int, entropy_sum: float) -> float:
+        if not size:
+            return 0.0
+        oversize = size - (self.target_size + 1)
+        ratio = leaders / size - self.ideal_leader_ratio
+        return (
+            self.kernel.total_weight * self.log[size]
+            - entropy_sum / size
+            - (oversize * oversize * 0.5 if oversize > 0 else 0.0)
+            - (size - self.avg_size) ** 2 * 0.3
+            - (prep - self.avg_prep) ** 2 * 0.4
+            - ratio * ratio * size * 0.6
+        )
+
+    def _entropy_sum_after(self, g: int, remove: tuple, add: tuple) -> float:
+        """Group ``g``'s entropy sum with ``remove`` and ``add`` positions swapped."""
+        counts = self.counts[g]
+        weights = self.kernel.position_weights
+        xlogx = self.kernel.xlogx
+        total = self.entropy_sums[g]
+        for p in remove:
+            c = counts[p]
+            total += weights[p] * (xlogx[c - 1] - xlogx[c])
+            counts[p] = c - 1
+        for p in add:
+            c = counts[p]
+            total += weights[p] * (xlogx[c + 1] - xlogx[c])
+            counts[p] = c + 1
+        for p in add:
+            counts[p] -= 1
+        for p in remove:
+            counts[p] += 1
+        return total
+
+    def can_swap(self, i: int, j: int) -> bool:
+        """Whether members ``i`` and ``j`` of different groups may trade places."""
+        if self.is_graduated[i] != self.is_graduated[j]:
+            return False
+        leader_change = self.is_leader[j] - self.is_leader[i]
+        if leader_change == 0:
+            return True
+        # The group losing a leader must keep at least one
+        losing = self.assignment[i] if leader_change < 0 else self.assignment[j]
+        return self.leaders[losing] > 1
+
+    def _repeat_changes(self, i: int, j: int) -> Tuple[float, float]:
+        """Change of the repeat-pairing penalty of the groups of ``i`` and
+        ``j`` if they swap."""
+        weights_i, weights_j = self.pair_weights[i], self.pair_weights[j]
+        if not (weights_i or weights_j):
+            return 0.0, 0.0
+        get_i, get_j = weights_i.get, weights_j.get
+        group_a = self.group_members[self.assignment[i]]
+        group_b = self.group_members[self.assignment[j]]
+        # Summing over whole groups counts the i-j pair once on each side
+        pair = get_i(j, 0.0)
+        change_a = sum(map(get_j, group_a, _ZEROS)) - sum(map(get_i, group_a, _ZEROS))
+        change_b = sum(map(get_i, group_b, _ZEROS)) - sum(map(get_j, group_b, _ZEROS))
+        return change_a - pair, change_b - pair
+
+    def swap_delta(self, i: int, j: int) -> float:
+        """Change of the total score if members ``i`` and ``j`` swap groups."""
+        a, b = self.assignment[i], self.assignment[j]
+        prep_change = self.is_prep[j] - self.is_prep[i]
+        leader_change = self.is_leader[j] - self.is_leader[i]
+        pos_i, pos_j = self.positions[i], self.positions[j]
+        new_a = self._score(
+            self.sizes[a],
+            self.prep[a] + prep_change,
+            self.leaders[a] + leader_change,
+            self._entropy_sum_after(a, pos_i, pos_j),
+        )
+        new_b = self._score(
+            self.sizes[b],
+            self.prep[b] - prep_change,
+            self.leaders[b] - leader_change,
+            self._entropy_sum_after(b, pos_j, pos_i),
+        )
+        delta = new_a + new_b - self.scores[a] - self.scores[b]
+        if self.pair_weights is not None:
+            delta -= sum(self._repeat_changes(i, j))
+        return delta
+
+    def apply_swap(self, i: int, j: int) -> None:
+        """Swap members ``i`` and ``j`` between their groups."""
+        if self.constraint_state is not None:
+            self.constraint_state.apply_swap(i, j)
+        a, b = self.assignment[i], self.assignment[j]
+        self._apply_transfers(((a, i, j), (b, j, i)))
+
+    def _group_score_after(self, g: int, out: int | None, into: int | None) -> float:
+        """Score of group ``g`` with member ``out`` leaving and ``into``
+        joining; either may be None."""
+        size, prep, leaders = self.sizes[g], self.prep[g], self.leaders[g]
+        remove = add = ()
+        if out is not None:
+            size -= 1
+            prep -= self.is_prep[out]
+            leaders -= self.is_leader[out]
+            remove = self.positions[out]
+        if into is not None:
+            size += 1
+            prep += self.is_prep[into]
+            leaders += self.is_leader[into]
+            add = self.positions[into]
+        return self._score(size, prep, leaders, self._entropy_sum_after(g, remove, add))
+
+    def _repeat_change(self, g: int, out: int | None, into: int | None) -> float:
+        """Change of group ``g``'s repeat-pairing penalty with member ``out``
+        leaving and ``into`` joining; either may be None."""
+        group = self.group_members[g]
+        change = 0.0
+        if into is not None:
+            get = self.pair_weights[into].get
+            change += sum(map(get, group, _ZEROS))
+            if out is not None:
+                change -= get(out, 0.0)
+        if out is not None:
+            change -= sum(map(self.pair_weights[out].get, group, _ZEROS))
+        return change
+
+    def _transfers_delta(self, transfers: Tuple[tuple, ...]) -> float:
+        """Change of the total score for (group, out, into) transfers."""
+        delta = 0.0
+        for g, out, into in transfers:
+            delta += self._group_score_after(g, out, into) - self.scores[g]
+            if self.pair_weights is not None:
+                delta -= self._repeat_change(g, out, into)
+        return delta
+
+    def _apply_transfers(self, transfers: Tuple[tuple, ...]) -> None:
+        """Apply (group, out, into) transfers that together keep every member
+        in exactly one group."""
+        if self.pair_weights is not None:
+            changes = [self._repeat_change(*transfer) for transfer in transfers]
+            for (g, _, _), change in zip(transfers, changes):
+                self.repeat[g] += change
+                self.total -= change
+        for g, out, into in transfers:
+            members = self.group_members[g]
+            old = self.scores[g]
+            self.entropy_sums[g] = self._entropy_sum_after(
+                g,
+                self.positions[out] if out is not None else (),
+                self.positions[into] if into is not None else (),
+            )
+            counts = self.counts[g]
+            if out is not None:
+                for p in self.positions[out]:
+                    counts[p] -= 1
+                self.prep[g] -= self.is_prep[out]
+                self.leaders[g] -= self.is_leader[out]
+                self.males[g] -= self.is_male[out]
+            if into is not None:
+                for p in self.positions[into]:
+                    counts[p] += 1
+                self.prep[g] += self.is_prep[into]
+                self.leaders[g] += self.is_leader[into]
+                self.males[g] += self.is_male[into]
+                self.assignment[into] = g
+            if out is None:
+                members.append(into)
+                self.sizes[g] += 1
+            elif into is None:
+                members.remove(out)
+                self.sizes[g] -= 1
+            else:
+                members[members.index(out)] = into
+            self.scores[g] = self._score(
+                self.sizes[g], self.prep[g], self.leaders[g], self.entropy_sums[g]
+            )
+            self.total += self.scores[g] - old
+
+    def can_move(self, i: int, g: int) -> bool:
+        """Whether member ``i`` may move on its own to group ``g``.
+
+        Both groups must stay within min_size and max_size unless the move
+        narrows a size difference of two or more. Only non-graduates move,
+        into groups that have a non-graduate, so the number of graduates of
+        every group stays as it is, and a group keeps its last leader.
+        """
+        a = self.assignment[i]
+        if a == g or self.is_graduated[i]:
+            return False
+        size_a, size_b = self.sizes[a], self.sizes[g]
+        if size_a - size_b < 2 and (size_a <= self.min_size or size_b >= self.max_size):
+            return False
+        if size_b == self.graduates[g]:
+            return False
+        return not (self.is_leader[i] and self.leaders[a] == 1)
+
+    def move_delta(self, i: int, g: int) -> float:
+        """Change of the total score if member ``i`` moves to group ``g``."""
+        return self._transfers_delta(((self.assignment[i], i, None), (g, None, i)))
+
+    def apply_move(self, i: int, g: int) -> None:
+        """Move member ``i`` to group ``g``."""
+        if self.constraint_state is not None:
+            self.constraint_state.apply_move(i, g)
+        self._apply_transfers(((self.assignment[i], i, None), (g, None, i)))
+
+    def can_rotate(self, i: int, j: int, k: int) -> bool:
+        """Whether ``i`` may join the group of ``j``, ``j`` that of ``k`` and
+        ``k`` that of ``i``; the three must be in different groups and all
+        be graduates or all not, and no group may lose its last leader."""
+        assignment = self.assignment
+        a, b, c = assignment[i], assignment[j], assignment[k]
+        if a == b or b == c or a == c:
+            return False
+        graduated = self.is_graduated
+        if not graduated[i] == graduated[j] == graduated[k]:
+            return False
+        is_leader, leaders = self.is_leader, self.leaders
+        return not (
+            (is_leader[i] > is_leader[k] and leaders[a] == 1)
+            or (is_leader[j] > is_leader[i] and leaders[b] == 1)
+            or (is_leader[k] > is_leader[j] and leaders[c] == 1)
+        )
+
+    def _rotation(self, i: int, j: int, k: int) -> Tuple[tuple, ...]:
+        assignment = self.assignment
+        return (
+            (assignment[i], i, k),
+            (assignment[j], j, i),
+            (assignment[k], k, j),
+        )
+
+    def rotation_delta(self, i: int, j: int, k: int) -> float:
+        """Change of the total score for the rotation of can_rotate."""
+        return self._transfers_delta(self._rotation(i, j, k))
+
+    def apply_rotation(self, i: int, j: int, k: int) -> None:
+        """Apply the rotation of can_rotate."""
+        if self.constraint_state is not None:
+            self.constraint_state.apply_rotation(i, j, k)
+        self._apply_transfers(self._rotation(i, j, k))
+
+    def gender_imbalance(self) -> float:
+        return sum(
+            abs(males / size - 0.5)
+            for males, size in zip(self.males, self.sizes)
+            if size
+        )
+
+    def components(self) -> Dict[str, float]:
+        """Summed score components, in the form of partition_score_components."""
+        totals = {"entropy": 0.0, **{name: 0.0 for name in PENALTY_COMPONENTS}}
+        for g, size in enumerate(self.sizes):
+            components = self._components(
+                size, self.prep[g], self.leaders[g], self.entropy_sums[g]
+            )
+            for name, value in components.items():
+                totals[name] += value
+        totals["repeat_pairing_penalty"] = sum(self.repeat)
+        totals["total"] = (
+            totals["entropy"]
+            - sum(totals[name] for name in PENALTY_COMPONENTS)
+            - totals["repeat_pairing_penalty"]
+        )
+        totals["gender_imbalance"] = self.gender_imbalance()
+        return totals
+
+    def to_groups(self) -> List[Group]:
+        return [
+            Group(members=[self.members[i] for i in members])
+            for members in self.group_members
+        ]
+
+
+def score_improvements(
+    before: Dict[str, float], after: Dict[str, float]
+) -> Dict[str, float]:
+    """How much each component improved; positive is better for every component.
+
+    :param before: Components of the starting partition
+    :param after: Components of the final partition
+    :return: Gain of the entropy and total, reduction of each penalty and of
+        the gender imbalance
+    """
+    improvements = {
+        "entropy": after["entropy"] - before["entropy"],
+        "total": after["total"] - before["total"],
+    }
+    for name in (*PENALTY_COMPONENTS, "repeat_pairing_penalty", "gender_imbalance"):
+        improvements[name] = before[name] - after[name]
+    return improvements
+
+
+def _best_rotation(
+    state: PartitionState, i: int, best: Tuple[int, float]
+) -> Tuple[Tuple[int, float], tuple | None]:
+    """Best rotation of member ``i`` with one member each of two random
+    other groups that beats ``best``, in both directions."""
+    constraint_state = state.constraint_state
+    own = state.assignment[i]
+    b, c = random.sample(range(len(state.group_members) - 1), 2)
+    b, c = (b + 1 if b >= own else b), (c + 1 if c >= own else c)
+    best_rotation = None
+    for j in state.group_members[b]:
+        for k in state.group_members[c]:
+            for rotation in ((i, j, k), (i, k, j)):
+                if not state.can_rotate(*rotation):
+                    continue
+                removed = (
+                    -constraint_state.rotation_delta(*rotation)
+                    if constraint_state
+                    else 0
+                )
+                if removed < best[0]:
+                    continue
+                key = (removed, state.rotation_delta(*rotation))
+                if key > best:
+                    best, best_rotation = key, rotation
+    return best, best_rotation
+
+
+def _local_search(
+    state: PartitionState,
+    max_sweeps: int,
+    deadline: float | None,
+    cancel_token: CancellationToken | None,
+    repair_only: bool = False,
+    telemetry: OptimizerTelemetry | None = None,
+    neighborhood: bool = False,
+) -> Tuple[int, int, str]:
+    """Apply improving swaps to ``state`` until no sweep finds one.
+
+    Each sweep visits the members in random order. Every member is compared
+    against the members of one random other group, plus the groups of the
+    members it must be placed with, and the best swap is applied: fewer
+    constraint violations first, then a higher score. With ``repair_only``
+    only swaps that remove a violation are taken.
+
+    With ``neighborhood`` a member may also move on its own to one of those
+    groups (see PartitionState.can_move), and a sweep that finds no improving
+    swap or move goes over the members again trying rotations with one
+    member each of two random other groups.
+
+    :return: Sweeps run, moves applied and the stop reason
+    """
+    num_groups = len(state.group_members)
+    constraint_state = state.constraint_state
+    together = constraint_state.compiled.together if constraint_state else None
+    rotations = neighborhood and num_groups >= 3 and not repair_only
+    order = list(range(len(state.members)))
+    sweeps = 0
+    accepted_moves = 0
+    stagnant_sweeps = 0
+    if num_groups < 2 or (repair_only and not state.violations):
+        return sweeps, accepted_moves, "stagnation"
+
+    while sweeps < max_sweeps:
+        if cancel_token is not None and cancel_token.cancelled:
+            return sweeps, accepted_moves, "cancelled"
+
+        if stagnant_sweeps >= MAX_STAGNANT_SWEEPS:
+            return sweeps, accepted_moves, "stagnation"
+
+        if deadline is not None and time.perf_counter() > deadline:
+            return sweeps, accepted_moves, "time_limit"
+
+        sweeps += 1
+        improved = False
+        random.shuffle(order)
+        for count, i in enumerate(order):
+            if (
+                deadline is not None
+                and not count & 63
+                and time.perf_counter() > deadline
+            ):
+                break
+            own = state.assignment[i]
+            other = random.randrange(num_groups - 1)
+            candidates = {other + 1 if other >= own else other}
+            if together is not None:
+                candidates.update(state.assignment[k] for k in together[i])
+                candidates.discard(own)
+
+            # (violations removed, score gain) of the best move so far
+            best = (1, float("-inf")) if repair_only else (0, MIN_IMPROVEMENT)
+            best_move = None
+            for group in candidates:
+                for j in state.group_members[group]:
+                    if not state.can_swap(i, j):
+                        continue
+                    removed = (
+                        -constraint_state.swap_delta(i, j) if constraint_state else 0
+                    )
+                    if removed < best[0]:
+                        continue
+                    key = (removed, state.swap_delta(i, j))
+                    if key > best:
+                        best, best_move = key, (state.apply_swap, (i, j))
+                if neighborhood and state.can_move(i, group):
+                    removed = (
+                        -constraint_state.move_delta(i, group)
+                        if constraint_state
+                        else 0
+                    )
+                    key = (removed, state.move_delta(i, group))
+                    if key > best:
+                        best, best_move = key, (state.apply_move, (i, group))
+
+            if best_move is not None:
+                apply, args = best_move
+                apply(*args)
+                accepted_moves += 1
+                improved = True
+                if telemetry is not None:
+                    telemetry.record_score(state.total, state.gender_imbalance())
+                if repair_only and not state.violations:
+                    return sweeps, accepted_moves, "repaired"
+
+        if rotations and not improved:
+            for count, i in enumerate(order):
+                if (
+                    deadline is not None
+                    and not count & 7
+                    and time.perf_counter() > deadline
+                ):
+                    break
+                _, rotation = _best_rotation(state, i, (0, MIN_IMPROVEMENT))
+                if rotation is not None:
+                    state.apply_rotation(*rotation)
+                    accepted_moves += 1
+                    improved = True
+                    if telemetry is not None:
+                        telemetry.record_score(state.total, state.gender_imbalance())
+
+        stagnant_sweeps = 0 if improved else stagnant_sweeps + 1
+
+    return sweeps, accepted_moves, "max_iterations"
+
+
+def improve_state(
+    state: PartitionState,
+    max_sweeps: int = 1000,
+    deadline: float | None = None,
+    cancel_token: CancellationToken | None = None,
+    neighborhood: bool = False,
+) -> str:
+    """Run the local search of optimize_partition on ``state`` in place, for
+    workers that build their states from a shared roster.
+
+    :param deadline: Optional time.perf_counter() value to stop at
+    :param cancel_token: Optional token checked every sweep; the search stops
+        with reason "cancelled" instead of raising
+    :return: The stop reason
+    """
+    _, _, stop_reason = _local_search(
+        state, max_sweeps, deadline, cancel_token, neighborhood=neighborhood
+    )
+    return stop_reason
+
+
+def _finish(
+    state: PartitionState,
+    phase: str,
+    phase_start: float,
+    initial: Dict[str, float],
+    iterations: int,
+    accepted_moves: int,
+    stop_reason: str,
+    cancel_token: CancellationToken | None,
+    telemetry: OptimizerTelemetry | None,
+) -> List[Group]:
+    """Record a search phase in tracing and telemetry and return its result."""
+    seconds = time.perf_counter() - phase_start
+    if stop_reason == "cancelled":
+        if telemetry is not None:
+            telemetry.iterations += iterations
+            telemetry.stop_reason = stop_reason
+            telemetry.add_phase(phase, seconds)
+        cancel_token.raise_if_cancelled()
+
+    final = state.components()
+    logger.info(
+        f"Partition {phase} complete. Score {initial['total']:.3f} -> "
+        f"{final['total']:.3f} in {iterations} iterations, "
+        f"{state.violations} constraint violations left"
+    )
+    record_span(
+        f"partition.{phase}",
+        phase_start,
+        seconds,
+        iterations=iterations,
+        accepted_moves=accepted_moves,
+        stop_reason=stop_reason,
+        violations=state.violations,
+    )
+    if telemetry is not None:
+        telemetry.roster_size = len(state.members)
+        telemetry.num_groups = len(state.group_members)
+        telemetry.iterations += iterations
+        telemetry.accepted_moves += accepted_moves
+        telemetry.add_phase(phase, seconds)
+        telemetry.score_components = final
+        telemetry.constraint_violations = state.violations
+        if phase != "repair":
+            # A repair keeps the stop reason of the engine it follows
+            telemetry.stop_reason = stop_reason
+            telemetry.score_improvements = score_improvements(initial, final)
+    return state.to_groups()
+
+
+def optimize_partition(
+    groups: List[Group],
+    max_iterations: int = 1000,
+    target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+    neighborhood: bool = False,
+) -> List[Group]:
+    """
+    Improve a partition by swaps that raise the full partition score.
+
+    The search stops after MAX_STAGNANT_SWEEPS sweeps over the members without
+    an improving swap; see _local_search.
+
+    :param groups: Partition to improve, typically the heuristic placement
+    :param max_iterations: Maximum number of sweeps
+    :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token checked every sweep; raises
+        OptimizationCancelled once it is cancelled
+    :param telemetry: Optional telemetry record filled in with iteration
+        counts, the stop reason, the "optimization" phase time, final scores,
+        the improvement of each score component and remaining violations
+    :param time_limit: Optional wall-clock budget in seconds
+    :param diversity: Diversity config the score is computed with
+    :param constraints: Optional constraints, minimized before the score
+    :param pairing: Optional repeat-pairing penalty, part of the score
+    :param neighborhood: Also move single members between groups and rotate
+        members of three groups, which lets group sizes change
+    :return: The improved partition
+    """
+    phase_start = time.perf_counter()
+    state = PartitionState(
+        groups,
+        target_size,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    initial = state.components()
+    if telemetry is not None:
+        telemetry.record_score(state.total, initial["gender_imbalance"])
+    deadline = phase_start + time_limit if time_limit is not None else None
+    sweeps, accepted_moves, stop_reason = _local_search(
+        state,
+        max_iterations,
+        deadline,
+        cancel_token,
+        telemetry=telemetry,
+        neighborhood=neighborhood,
+    )
+    return _finish(
+        state,
+        "optimization",
+        phase_start,
+        initial,
+        sweeps,
+        accepted_moves,
+        stop_reason,
+        cancel_token,
+        telemetry,
+    )
+
+
+def _tabu_candidate(
+    state: PartitionState,
+    tabu_until: List[int],
+    iteration: int,
+    best: Tuple[int, float],
+) -> Tuple[int, int] | None:
+    """Best allowed swap of TABU_CANDIDATES sampled members, each compared
+    with the members of one random other group.
+
+    :param best: (violations, -total) of the best partition so far; tabu
+        swaps are allowed if they reach a better one
+    """
+    num_groups = len(state.group_members)
+    constraint_state = state.constraint_state
+    best_key = None
+    best_swap = None
+    sample = min(TABU_CANDIDATES, len(state.members))
+    for i in random.sample(range(len(state.members)), sample):
+        own = state.assignment[i]
+        other = random.randrange(num_groups - 1)
+        i_tabu = tabu_until[i] > iteration
+        for j in state.group_members[other + 1 if other >= own else other]:
+            if not state.can_swap(i, j):
+                continue
+            added = constraint_state.swap_delta(i, j) if constraint_state else 0
+            key = (-added, state.swap_delta(i, j))
+            if best_key is not None and key <= best_key:
+                continue
+            if (i_tabu or tabu_until[j] > iteration) and (
+                state.violations + added,
+                -(state.total + key[1]) + MIN_IMPROVEMENT,
+            ) >= best:
+                continue
+            best_key, best_swap = key, (i, j)
+    return best_swap
+
+
+def tabu_partition(
+    groups: List[Group],
+    max_iterations: int = 10_000,
+    target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """
+    Improve a partition by tabu search over swaps.
+
+    The search stops after TABU_MAX_STAGNANT_ITERATIONS iterations without a
+    new best partition. Swaps are their own inverse, so the best partition is
+    restored by undoing the swaps applied after it rather than copied on
+    every improvement.
+
+    :param groups: Partition to improve, typically the heuristic placement
+    :param max_iterations: Maximum number of iterations (one swap each)
+    :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token checked every iteration; raises
+        OptimizationCancelled once it is cancelled
+    :param telemetry: Optional telemetry record filled in with iteration
+        counts, the stop reason, the "tabu" phase time, final scores, the
+        improvement of each score component and remaining violations
+    :param time_limit: Optional wall-clock budget in seconds
+    :param diversity: Diversity config the score is computed with
+    :param constraints: Optional constraints, minimized before the score
+    :param pairing: Optional repeat-pairing penalty, part of the score
+    :return: The best partition found
+    """
+    phase_start = time.perf_counter()
+    state = PartitionState(
+        groups,
+        target_size,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    initial = state.components()
+    if telemetry is not None:
+        telemetry.record_score(state.total, initial["gender_imbalance"])
+    deadline = phase_start + time_limit if time_limit is not None else None
+    tenure = min(TABU_TENURE, len(state.members) // 4)
+    tabu_until = [0] * len(state.members)
+    best = (state.violations, -state.total)
+    best_iteration = 0
+    # Swaps applied since the best partition was found
+    since_best: List[Tuple[int, int]] = []
+
+    iteration = 0
+    accepted_moves = 0
+    stop_reason = "max_iterations"
+    while iteration < max_iterations:
+        if cancel_token is not None and cancel_token.cancelled:
+            stop_reason = "cancelled"
+            break
+        if (
+            len(state.group_members) < 2
+            or iteration - best_iteration >= TABU_MAX_STAGNANT_ITERATIONS
+        ):
+            stop_reason = "stagnation"
+            break
+        if deadline is not None and time.perf_counter() > deadline:
+            stop_reason = "time_limit"
+            break
+
+        iteration += 1
+        swap = _tabu_candidate(state, tabu_until, iteration, best)
+        if swap is None:
+            continue
+        i, j = swap
+        state.apply_swap(i, j)
+        accepted_moves += 1
+        tabu_until[i] = tabu_until[j] = iteration + tenure
+        if (state.violations, -state.total + MIN_IMPROVEMENT) < best:
+            best = (state.violations, -state.total)
+            best_iteration = iteration
+            since_best.clear()
+            if telemetry is not None:
+                telemetry.record_score(state.total, state.gender_imbalance())
+        else:
+            since_best.append(swap)
+
+    for i, j in reversed(since_best):
+        state.apply_swap(i, j)
+    return _finish(
+        state,
+        "tabu",
+        phase_start,
+        initial,
+        iteration,
+        accepted_moves,
+        stop_reason,
+        cancel_token,
+        telemetry,
+    )
+
+
+def repair_partition(
+    groups: List[Group],
+    constraints: ConstraintSet,
+    max_iterations: int = 100,
+    target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    diversity: DiversityConfig | None = None,
+    pairing: RepeatPairing | None = None,
+) -> List[Group]:
+    """
+    Remove constraint violations from a partition with as little score loss
+    as possible.
+
+    Only swaps that remove a violation are applied, so a partition produced
+    by another engine is otherwise left as it is.
+
+    :param groups: Partition to repair
+    :param constraints: Constraints to satisfy
+    :param max_iterations: Maximum number of sweeps
+    :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token checked every sweep
+    :param telemetry: Optional telemetry record; the "repair" phase is timed
+        and the remaining violations recorded
+    :param diversity: Diversity config the score is computed with
+    :param pairing: Optional repeat-pairing penalty, part of the score
+    :return: The repaired partition; violations the swaps cannot remove
+        are left in place
+    """
+    phase_start = time.perf_counter()
+    state = PartitionState(
+        groups,
+        target_size,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    if not state.violations:
+        if telemetry is not None:
+            telemetry.constraint_violations = 0
+        return groups
+    initial = state.components()
+    sweeps, accepted_moves, stop_reason = _local_search(
+        state, max_iterations, None, cancel_token, repair_only=True
+    )
+    return _finish(
+        state,
+        "repair",
+        phase_start,
+        initial,
+        sweeps,
+        accepted_moves,
+        stop_reason,
+        cancel_token,
+        telemetry,
+    )
@@ -0,0 +1,352 @@
+"""On-demand profiling of individual requests.
+
+Disabled unless ENABLE_PROFILING is set. When enabled, a request carrying an
+``X-Profile`` header or a ``profile`` query parameter is run under a profiler:
+
+- ``cprofile`` (or ``1``): deterministic cProfile of the request handler and of
+  optimizer work it hands to worker threads, saved as a ``.prof`` file that
+  ``python -m pstats`` or snakeviz can open. Only one request at a time can be
+  profiled this way; others get a 409 response.
+- ``sample``: a sampling profiler over all threads, saved as collapsed stacks
+  (``.folded``) ready for flamegraph.pl or speedscope.
+- ``memory``: a tracemalloc report of the optimizer run (peak, allocations by
+  call site, memory retained after the run and GC activity), saved as ``.json``.
+
+Profiles are written to ``profiles/`` in the data directory and listed at
+``/debug/profiles``.
+"""
+
+import cProfile
+import gc
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from loguru import logger
+
+from .database import get_data_dir
+
+PROFILING_ENABLED = os.getenv("ENABLE_PROFILING", "").lower() in ("1", "true", "yes")
+
+# Seconds between stack samples in "sample" mode
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+PROFILE_MODES = ("cprofile", "sample", "memory")
+
+# Samples whose innermost frame is in one of these modules are idle threads
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+# Before Python 3.12 a cProfile only sees the thread it was enabled in, so
+# worker threads need profiles of their own. From 3.12 on it sees every
+# thread, and enabling a second one while it runs raises ValueError.
+_CPROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+# Held by the request being profiled with cProfile
+_cprofile_lock = threading.Lock()
+
+
+def profiles_dir() -> Path:
+    return get_data_dir() / "profiles"
+
+
+class StackSampler(threading.Thread):
+    """Background thread counting collapsed stacks of all other threads."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        super().__init__(daemon=True, name="stack-sampler")
+        self.interval = interval
+        self.counts: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in _IDLE_MODULES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} "
+                        f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+@dataclass
+class MemoryReport:
+    """Memory used by one tracked block of code.
+
+    tracemalloc only sees blocks that are alive when a snapshot is taken, so
+    ``allocations`` lists what each call site still held when the block
+    finished (before garbage collection), and ``retained`` what survived a full
+    collection afterwards. Short-lived churn shows up as GC collections.
+    """
+
+    peak_bytes: int = 0
+    allocated_bytes: int = 0
+    retained_bytes: int = 0
+    gc_collections: List[int] = field(default_factory=list)
+    allocations: List[dict] = field(default_factory=list)
+    retained: List[dict] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# Keep tracemalloc's own bookkeeping out of the reports
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _top_sites(after, before, top: int) -> List[dict]:
+    stats = after.filter_traces(_SNAPSHOT_FILTERS).compare_to(
+        before.filter_traces(_SNAPSHOT_FILTERS), "lineno"
+    )
+    stats = [s for s in stats if s.size_diff > 0]
+    stats.sort(key=lambda s: s.size_diff, reverse=True)
+    return [
+        {
+            "site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+            "size_bytes": s.size_diff,
+            "count": s.count_diff,
+        }
+        for s in stats[:top]
+    ]
+
+
+class MemoryTracker:
+    """Context manager filling a MemoryReport for the enclosed block.
+
+    tracemalloc is process wide, so allocations made by other threads while the
+    block runs are included.
+
+    :param top: Number of call sites to list in the report
+    """
+
+    def __init__(self, top: int = 15) -> None:
+        self.top = top
+        self.report = MemoryReport()
+
+    def __enter__(self) -> "MemoryTracker":
+        gc.collect()
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+        self._start_bytes, _ = tracemalloc.get_traced_memory()
+        self._gc_before = [s["collections"] for s in gc.get_stats()]
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        end = tracemalloc.take_snapshot()
+        gc_after = [s["collections"] for s in gc.get_stats()]
+        gc.collect()
+        retained_bytes, _ = tracemalloc.get_traced_memory()
+        retained = tracemalloc.take_snapshot()
+        if self._started:
+            tracemalloc.stop()
+
+        self.report = MemoryReport(
+            peak_bytes=peak - self._start_bytes,
+            allocated_bytes=current - self._start_bytes,
+            retained_bytes=retained_bytes - self._start_bytes,
+            gc_collections=[a - b for a, b in zip(gc_after, self._gc_before)],
+            allocations=_top_sites(end, self._before, self.top),
+            retained=_top_sites(retained, self._before, self.top),
+        )
+        del self._before
+
+
+class RequestProfile:
+    """Profiler state for one request."""
+
+    def __init__(self, mode: str, name: str) -> None:
+        self.mode = mode
+        self.name = name
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._sampler: StackSampler | None = None
+        self._main: cProfile.Profile | None = None
+        self.memory_reports: List[MemoryReport] = []
+
+    def start(self) -> None:
+        if self.mode == "sample":
+            self._sampler = StackSampler()
+            self._sampler.start()
+        elif self.mode == "cprofile":
+            self._main = cProfile.Profile()
+            self._main.enable()
+
+    def stop(self) -> None:
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._main is not None:
+            self._main.disable()
+            self.add(self._main)
+
+    def add(self, profile: cProfile.Profile) -> None:
+        """Merge a finished per-thread cProfile into this request's profile."""
+        with self._lock:
+            self._profiles.append(profile)
+
+    def save(self, directory: Path) -> Path:
+        """Write the profile to ``directory`` and return the file path."""
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", self.name).strip("-") or "root"
+        stem = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{slug}"
+
+        if self.mode == "sample":
+            path = directory / f"{stem}.folded"
+            lines = [
+                f"{stack} {count}" for stack, count in self._sampler.counts.items()
+            ]
+            path.write_text("\n".join(lines) + "\n")
+        elif self.mode == "memory":
+            path = directory / f"{stem}.json"
+            reports = [report.to_dict() for report in self.memory_reports]
+            path.write_text(json.dumps({"name": self.name, "runs": reports}, indent=2))
+        else:
+            path = directory / f"{stem}.prof"
+            stats = pstats.Stats(self._profiles[0])
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(str(path))
+
+        logger.info(f"Saved {self.mode} profile of {self.name} to {path}")
+        return path
+
+
+_active_profile: ContextVar[RequestProfile | None] = ContextVar(
+    "active_profile", default=None
+)
+
+
+@contextmanager
+def profile_thread():
+    """Profile the enclosed block if the current request is being profiled.
+
+    Before Python 3.12 cProfile only sees the thread it was enabled in, so
+    work that a profiled request hands to a worker thread wraps itself in this
+    context manager; from 3.12 on the request's profile already covers it. In
+    memory mode the block gets its own MemoryReport.
+    """
+    profile = _active_profile.get()
+    if profile is None or profile.mode == "sample":
+        yield
+        return
+    if profile.mode == "cprofile" and not _CPROFILE_PER_THREAD:
+        yield
+        return
+
+    if profile.mode == "memory":
+        tracker = MemoryTracker()
+        try:
+            with tracker:
+                yield
+        finally:
+            profile.memory_reports.append(tracker.report)
+        return
+
+    thread_profile = cProfile.Profile()
+    thread_profile.enable()
+    try:
+        yield
+    finally:
+        thread_profile.disable()
+        profile.add(thread_profile)
+
+
+def requested_mode(request: Request) -> str | None:
+    """Profiling mode asked for by a request, or None."""
+    if not PROFILING_ENABLED:
+        return None
+    value = request.headers.get("X-Profile") or request.query_params.get("profile")
+    if not value:
+        return None
+    value = value.lower()
+    if value in ("1", "true", "yes"):
+        return "cprofile"
+    return value if value in PROFILE_MODES else None
+
+
+def list_profiles() -> List[dict]:
+    """Captured profiles, newest first."""
+    directory = profiles_dir()
+    if not directory.exists():
+        return []
+    files = [
+        p for p in directory.iterdir() if p.suffix in (".prof", ".folded", ".json")
+    ]
+    files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    return [
+        {
+            "name": p.name,
+            "format": p.suffix.lstrip("."),
+            "bytes": p.stat().st_size,
+            "created_at": datetime.fromtimestamp(p.stat().st_mtime).isoformat(),
+        }
+        for p in files
+    ]
+
+
+def install(app: FastAPI) -> None:
+    """Register the profiling middleware on ``app``."""
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        mode = requested_mode(request)
+        if mode is None:
+            return await call_next(request)
+        if mode == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            return JSONResponse(
+                {"detail": "Another request is being profiled"}, status_code=409
+            )
+
+        profile = RequestProfile(mode, f"{request.method} {request.url.path}")
+        token = _active_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            profile.start()
+            try:
+                response = await call_next(request)
+            finally:
+                profile.stop()
+        finally:
+            _active_profile.reset(token)
+            if mode == "cprofile":
+                _cprofile_lock.release()
+
+        path = profile.save(profiles_dir())
+        response.headers["X-Profile-File"] = path.name
+        logger.info(
+            f"Profiled {profile.name} in {time.perf_counter() - start:.3f}s ({mode})"
+        )
+        return response
@@ -0,0 +1,90 @@
+"""Loading the roster of present members for the grouping engine.
+
+The optimizer only needs a handful of member columns, so instead of loading
+full Member ORM objects (including notes) and copying their fields, today's
+roster is fetched as plain row tuples from one join of members with their
+present attendance, and GroupMembers are built from those rows directly.
+"""
+
+from datetime import date
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from .group_divider import GroupMember, MemberRole
+from .models import Attendance, Member
+
+# Columns selected for each present member, in GroupMember order
+ROSTER_COLUMNS = (
+    Member.id,
+    Member.surname,
+    Member.given_name,
+    Member.role,
+    Member.gender,
+    Member.faith_status,
+    Member.education_status,
+    Member.prep_attended,
+)
+
+RosterRow = Tuple[int, str, str, str, str, str, str, bool]
+
+
+def present_roster_query(day: date) -> Select:
+    """Active members marked present on ``day``, ordered by id."""
+    return (
+        select(*ROSTER_COLUMNS)
+        .join(Attendance, Attendance.member_id == Member.id)
+        .where(
+            Attendance.date == day,
+            Attendance.present == True,
+            Member.active == True,
+        )
+        .distinct()
+        .order_by(Member.id)
+    )
+
+
+def members_from_rows(rows: Iterable[RosterRow]) -> List[GroupMember]:
+    """Build GroupMembers from roster rows in one pass.
+
+    :param rows: Tuples with the values of ROSTER_COLUMNS
+    :return: One present GroupMember per row
+    """
+    from_db_role = MemberRole.from_db_role
+    return [
+        GroupMember(
+            member_id,
+            surname,
+            given_name,
+            from_db_role(role),
+            gender,
+            faith_status,
+            education_status,
+            education_status == "graduated",
+            True,
+            bool(prep_attended),
+        )
+        for (
+            member_id,
+            surname,
+            given_name,
+            role,
+            gender,
+            faith_status,
+            education_status,
+            prep_attended,
+        ) in rows
+    ]
+
+
+def load_present_roster(db: Session, day: date | None = None) -> List[GroupMember]:
+    """Load the members present on ``day`` (default today) as GroupMembers.
+
+    :param db: Database session; rows bypass its identity map
+    :param day: Attendance date
+    :return: Present active members ordered by id
+    """
+    # Rows unpack like tuples, so the Result is iterated as is
+    result = db.execute(present_roster_query(day or date.today()))
+    return members_from_rows(result)
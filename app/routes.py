@@ -1,27 +1,88 @@
-from datetime import date
+from datetime import date, timedelta
 from typing import Annotated
-from fastapi import Depends, Form, Request, responses
+from fastapi import Depends, Form, HTTPException, Request, responses
 from sqlalchemy.orm import Session
 from pypinyin import lazy_pinyin, Style
 from sqlalchemy import or_
 from loguru import logger
 import json
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 
 from . import app, templates
 from .database import get_db
-from .models import Member, Attendance
+from .models import (
+    Member,
+    Attendance,
+    GroupCap,
+    GroupHistory,
+    MemberPair,
+    OptimizerRun,
+)
 from app.group_divider import (
     divide_into_groups,
     GroupMember,
     MemberRole,
     balance_gender_in_groups,
 )
-from app.models import Member as DBMember
+from app.constraints import (
+    PAIR_KINDS,
+    AttributeCap,
+    ConstraintSet,
+    load_constraints,
+)
+from app.alternatives import Alternative, find_alternatives
+from app.diversity import load_diversity_config
+from app.history import (
+    REPEAT_PENALTY_DECAY,
+    REPEAT_PENALTY_WEEKS,
+    REPEAT_PENALTY_WEIGHT,
+    RepeatPairing,
+    co_membership,
+    history_window,
+    load_division,
+    load_repeat_pairing,
+    record_division,
+)
+from app.engines import run_engine, select_engine
+from app.instrumentation import add_optimizer_time, request_metrics
+from app import profiling
+from app.roster import load_present_roster
+from app.tracing import span
+from app.telemetry import OptimizerTelemetry, telemetry_store
+from app.single_flight import (
+    CancellationToken,
+    OptimizationCancelled,
+    SingleFlight,
+    roster_fingerprint,
+)
 
 # Global variable to store the current groups
 current_groups = None
 
+# Divisions offered by the last /groups/alternatives request, and the
+# sequence number and generation of the run that found them
+current_alternatives = []
+alternatives_run = (0, -1)
+
+# Most alternatives one request may ask for
+MAX_ALTERNATIVES = 10
+
+# Coalesces identical /groups/generate and /groups/alternatives requests and
+# tracks which result is newest
+optimization_flights = SingleFlight()
+
+
+def _clear_alternatives() -> None:
+    global current_alternatives
+    current_alternatives = []
+
+
+# Alternatives of an older roster must not be selected
+optimization_flights.on_invalidate(_clear_alternatives)
+
+# Attributes the group entropy diversifies, from DIVERSITY_CONFIG
+diversity_config = load_diversity_config()
+
 
 def get_pinyin(text: str) -> str:
     """Get pinyin for Chinese text.
@@ -58,23 +119,12 @@ async def home(request: Request, db: Session = Depends(get_db)):
 
     try:
         if present_members:
-            # Convert DB members to GroupMember class - ONLY for present members
-            group_members = [
-                GroupMember(
-                    id=m.id,
-                    surname=m.surname,
-                    given_name=m.given_name,
-                    role=MemberRole.from_db_role(m.role),
-                    gender=m.gender,
-                    faith_status=m.faith_status,
-                    education_status=m.education_status,
-                    is_graduated=m.education_status == "graduated",
-                    is_present=True,
-                    prep_attended=m.prep_attended,
-                )
-                for m in members
-                if m.id in present_members
-            ]
+            # Load only the columns the optimizer needs for present members;
+            # the ORM members above are only rendered
+            with span("group_member_conversion") as conversion:
+                group_members = load_present_roster(db, today)
+                if conversion is not None:
+                    conversion.attributes["members"] = len(group_members)
 
             if len(group_members) >= 4:
                 # Calculate initial number of groups based on present members
@@ -94,12 +144,26 @@ async def home(request: Request, db: Session = Depends(get_db)):
                     num_groups = min(initial_num_groups, leader_count)
 
                     # Divide into groups - initial proposal without gender balancing
+                    seq = optimization_flights.next_seq()
+                    generation = optimization_flights.generation
+                    telemetry = OptimizerTelemetry(engine="placement")
+                    # Same rules and scoring as /groups/generate
                     groups = divide_into_groups(
-                        group_members, num_groups, max_iterations=0
+                        group_members,
+                        num_groups,
+                        max_iterations=0,
+                        telemetry=telemetry,
+                        diversity=diversity_config,
+                        constraints=load_constraints(db),
+                        pairing=load_repeat_pairing(db, today - timedelta(days=1)),
                     )
+                    # Timed for Server-Timing, but not kept as a run: every
+                    # page view would add one to /debug/metrics and the table
+                    add_optimizer_time(telemetry.total_seconds)
 
-                    # Store the current groups globally
-                    current_groups = groups
+                    # Store the current groups globally unless a newer run exists
+                    if optimization_flights.publish(seq, generation):
+                        current_groups = groups
 
     except ValueError as e:
         logger.warning(f"Could not create initial groups: {e}")
@@ -153,6 +217,7 @@ async def add_member(
     )
     db.add(member)
     db.commit()
+    optimization_flights.invalidate()
 
     members = db.query(Member).filter(Member.active == True).all()
     today = date.today()
@@ -198,6 +263,7 @@ async def update_member(
     member.role = role
     member.education_status = education_status
     db.commit()
+    optimization_flights.invalidate()
 
     members = db.query(Member).filter(Member.active == True).all()
     today = date.today()
@@ -232,6 +298,7 @@ async def toggle_member_active(
     member = db.query(Member).filter(Member.id == member_id).first()
     member.active = not member.active
     db.commit()
+    optimization_flights.invalidate()
 
     members = db.query(Member).filter(Member.active == True).all()
     today = date.today()
@@ -299,6 +366,7 @@ async def record_attendance(
         db.add(attendance)
 
     db.commit()
+    optimization_flights.invalidate()
     return responses.Response(
         status_code=204
     )  # No content needed as checkbox handles its own state
@@ -311,11 +379,18 @@ async def delete_member(
     db: Session = Depends(get_db),
 ):
     """Permanently delete a member from the database."""
-    # First delete all attendance records
+    # First delete all attendance records, group history and constraints of
+    # the member; SQLite may give the member's id to the next member added,
+    # whose repeat pairing would otherwise count the old member's groups
     db.query(Attendance).filter(Attendance.member_id == member_id).delete()
+    db.query(GroupHistory).filter(GroupHistory.member_id == member_id).delete()
+    db.query(MemberPair).filter(
+        or_(MemberPair.member_a_id == member_id, MemberPair.member_b_id == member_id)
+    ).delete()
     # Then delete the member
     db.query(Member).filter(Member.id == member_id).delete()
     db.commit()
+    optimization_flights.invalidate()
 
     # Return updated inactive members list
     members = db.query(Member).filter(Member.active == False).all()
@@ -334,43 +409,15 @@ async def divide_groups(request: Request):
     global current_groups
     try:
         db = next(get_db())
-        members = db.query(DBMember).all()
-
-        # Get today's attendance records
-        today = date.today()
-        attendance_records = (
-            db.query(Attendance)
-            .filter(
-                Attendance.date == today,
-                Attendance.present == True,  # Only get members marked as present
-            )
-            .all()
-        )
+        # Load only the columns the optimizer needs for present members
+        with span("group_member_conversion") as conversion:
+            group_members = load_present_roster(db)
+            if conversion is not None:
+                conversion.attributes["members"] = len(group_members)
 
-        # Get set of present member IDs
-        present_members = {record.member_id for record in attendance_records}
-
-        if not present_members:
+        if not group_members:
             raise ValueError("No members are marked as present today.")
 
-        # Convert DB members to our GroupMember class - ONLY for present members
-        group_members = [
-            GroupMember(
-                id=m.id,
-                surname=m.surname,
-                given_name=m.given_name,
-                role=MemberRole.from_db_role(m.role),
-                gender=m.gender,
-                faith_status=m.faith_status,
-                education_status=m.education_status,
-                is_graduated=m.education_status == "graduated",
-                is_present=True,  # All members in this list are present
-                prep_attended=m.prep_attended,
-            )
-            for m in members
-            if m.active and m.id in present_members  # Only include present members
-        ]
-
         if len(group_members) < 4:
             raise ValueError(
                 "Not enough present members to form groups (minimum 4 required)"
@@ -395,10 +442,22 @@ async def divide_groups(request: Request):
         num_groups = min(initial_num_groups, leader_count)
 
         # Divide into groups
-        groups = divide_into_groups(group_members, num_groups)
+        seq = optimization_flights.next_seq()
+        generation = optimization_flights.generation
+        telemetry = OptimizerTelemetry()
+        groups = divide_into_groups(
+            group_members,
+            num_groups,
+            telemetry=telemetry,
+            diversity=diversity_config,
+            constraints=load_constraints(db),
+            pairing=load_repeat_pairing(db, date.today() - timedelta(days=1)),
+        )
+        telemetry_store.record(telemetry)
 
-        # Store the current groups globally
-        current_groups = groups
+        # Store the current groups globally unless a newer run exists
+        if optimization_flights.publish(seq, generation):
+            current_groups = groups
 
         return request.app.state.templates.TemplateResponse(
             "partials/group_divisions.html", {"request": request, "groups": groups}
@@ -411,6 +470,118 @@ async def divide_groups(request: Request):
         )
 
 
+def _pair_dict(pair: MemberPair) -> dict:
+    return {
+        "id": pair.id,
+        "kind": pair.kind,
+        "member_a_id": pair.member_a_id,
+        "member_b_id": pair.member_b_id,
+        "notes": pair.notes,
+    }
+
+
+def _cap_dict(cap: GroupCap) -> dict:
+    return {
+        "id": cap.id,
+        "attribute": cap.attribute,
+        "value": cap.value,
+        "max_per_group": cap.max_per_group,
+    }
+
+
+@app.get("/constraints")
+async def list_constraints(request: Request, db: Session = Depends(get_db)):
+    """Member pair constraints and per-group caps used when dividing groups."""
+    return {
+        "pairs": [_pair_dict(p) for p in db.query(MemberPair).order_by(MemberPair.id)],
+        "caps": [_cap_dict(c) for c in db.query(GroupCap).order_by(GroupCap.id)],
+    }
+
+
+@app.post("/constraints/pairs")
+async def add_pair_constraint(
+    request: Request,
+    kind: Annotated[str, Form()],
+    member_a_id: Annotated[int, Form()],
+    member_b_id: Annotated[int, Form()],
+    notes: Annotated[str, Form()] = "",
+    db: Session = Depends(get_db),
+):
+    """Require two members to be kept apart or placed together."""
+    if kind not in PAIR_KINDS:
+        raise HTTPException(
+            status_code=400, detail=f"kind must be one of {', '.join(PAIR_KINDS)}"
+        )
+    if member_a_id == member_b_id:
+        raise HTTPException(status_code=400, detail="A pair needs two members")
+    a, b = sorted((member_a_id, member_b_id))
+    if db.query(Member).filter(Member.id.in_((a, b))).count() != 2:
+        raise HTTPException(status_code=404, detail="Member not found")
+    if db.query(MemberPair).filter_by(member_a_id=a, member_b_id=b).first():
+        raise HTTPException(
+            status_code=400, detail="These members already have a constraint"
+        )
+
+    pair = MemberPair(kind=kind, member_a_id=a, member_b_id=b, notes=notes)
+    db.add(pair)
+    db.commit()
+    optimization_flights.invalidate()
+    return _pair_dict(pair)
+
+
+@app.delete("/constraints/pairs/{pair_id}")
+async def delete_pair_constraint(
+    request: Request, pair_id: int, db: Session = Depends(get_db)
+):
+    """Remove a member pair constraint."""
+    pair = db.get(MemberPair, pair_id)
+    if pair is None:
+        raise HTTPException(status_code=404, detail="Constraint not found")
+    db.delete(pair)
+    db.commit()
+    optimization_flights.invalidate()
+    return {"deleted": pair_id}
+
+
+@app.post("/constraints/caps")
+async def set_group_cap(
+    request: Request,
+    attribute: Annotated[str, Form()],
+    value: Annotated[str, Form()],
+    max_per_group: Annotated[int, Form()],
+    db: Session = Depends(get_db),
+):
+    """Cap the members with ``attribute == value`` in any group, replacing an
+    existing cap on the same value."""
+    try:
+        AttributeCap(attribute, value, max_per_group)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cap = db.query(GroupCap).filter_by(attribute=attribute, value=value).first()
+    if cap is None:
+        cap = GroupCap(attribute=attribute, value=value)
+        db.add(cap)
+    cap.max_per_group = max_per_group
+    db.commit()
+    optimization_flights.invalidate()
+    return _cap_dict(cap)
+
+
+@app.delete("/constraints/caps/{cap_id}")
+async def delete_group_cap(
+    request: Request, cap_id: int, db: Session = Depends(get_db)
+):
+    """Remove a per-group cap."""
+    cap = db.get(GroupCap, cap_id)
+    if cap is None:
+        raise HTTPException(status_code=404, detail="Cap not found")
+    db.delete(cap)
+    db.commit()
+    optimization_flights.invalidate()
+    return {"deleted": cap_id}
+
+
 @app.get("/debug/members")
 async def debug_members(request: Request, db: Session = Depends(get_db)):
     """Debug endpoint to show all members in database."""
@@ -427,6 +598,46 @@ async def debug_members(request: Request, db: Session = Depends(get_db)):
     }
 
 
+@app.get("/debug/metrics")
+async def debug_metrics(
+    request: Request, limit: int = 50, db: Session = Depends(get_db)
+):
+    """Debug endpoint with recent optimizer run telemetry."""
+    return {
+        "summary": telemetry_store.summary(),
+        "recent_runs": [run.to_dict() for run in telemetry_store.recent(limit)],
+        "persisted_runs": db.query(OptimizerRun).count(),
+    }
+
+
+@app.get("/debug/request-metrics")
+async def debug_request_metrics(request: Request):
+    """Debug endpoint with per-route latency histograms and SQL counts."""
+    return request_metrics.snapshot()
+
+
+@app.get("/debug/profiles")
+async def debug_profiles(request: Request):
+    """Debug endpoint listing request profiles captured with ENABLE_PROFILING."""
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return {
+        "directory": str(profiling.profiles_dir()),
+        "profiles": profiling.list_profiles(),
+    }
+
+
+@app.get("/debug/profiles/{name}")
+async def download_profile(request: Request, name: str):
+    """Download a captured profile."""
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    path = profiling.profiles_dir() / name
+    if path.name != name or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name)
+
+
 @app.post("/members/search")
 async def search_members(
     request: Request, query: Annotated[str, Form()], db: Session = Depends(get_db)
@@ -509,6 +720,7 @@ async def select_all_attendance(
             )
             db.add(attendance)
     db.commit()
+    optimization_flights.invalidate()
 
     # Get updated data for table only
     members = db.query(Member).filter_by(active=True).all()
@@ -553,6 +765,7 @@ async def unselect_all_attendance(
             )
             db.add(attendance)
     db.commit()
+    optimization_flights.invalidate()
 
     return templates.TemplateResponse(
         "partials/member_table_body.html",
@@ -577,36 +790,22 @@ async def generate_groups(
     """Generate groups based on current attendance and target size, with gender balancing."""
     global current_groups
     today = date.today()
-    members = db.query(Member).filter_by(active=True).all()
-    attendance_records = db.query(Attendance).filter_by(date=today).all()
-
-    # Get present member IDs for group division
-    present_members = {
-        record.member_id for record in attendance_records if record.present
-    }
     groups = None
+    error = "Not enough members or leaders for groups"
 
     try:
-        if present_members:
-            logger.info(f"Generating groups for {len(present_members)} present members")
-            # Convert DB members to GroupMember class - ONLY for present members
-            group_members = [
-                GroupMember(
-                    id=m.id,
-                    surname=m.surname,
-                    given_name=m.given_name,
-                    role=MemberRole.from_db_role(m.role),
-                    gender=m.gender,
-                    faith_status=m.faith_status,
-                    education_status=m.education_status,
-                    is_graduated=m.education_status == "graduated",
-                    is_present=True,
-                    prep_attended=m.prep_attended,
-                )
-                for m in members
-                if m.id in present_members
-            ]
-
+        # Load only the columns the optimizer needs for present members
+        with span("group_member_conversion") as conversion:
+            group_members = load_present_roster(db, today)
+            if conversion is not None:
+                conversion.attributes["members"] = len(group_members)
+        constraints = load_constraints(db)
+        # Pairings finalized before today; one finalized today is being redone
+        last_meeting = today - timedelta(days=1)
+        pairing = load_repeat_pairing(db, last_meeting)
+
+        if group_members:
+            logger.info(f"Generating groups for {len(group_members)} present members")
             if len(group_members) >= 4:
                 # Calculate initial number of groups based on target size
                 present_count = len(group_members)
@@ -615,27 +814,44 @@ async def generate_groups(
                     f"Will create {num_groups} groups with target size {target_size}"
                 )
 
-                # Stage 1: Initial group division without gender balancing
-                logger.info("Stage 1: Initial group division")
-                initial_groups = divide_into_groups(
+                engine = select_engine(present_count)
+
+                # Identical concurrent requests (e.g. a double-click) share one run
+                key = roster_fingerprint(
                     group_members,
-                    num_groups,
-                    max_iterations=0,
-                    target_size=target_size,  # Pass target_size parameter
+                    num_groups=num_groups,
+                    target_size=target_size,
+                    engine=engine,
+                    diversity=diversity_config,
+                    constraints=constraints,
+                    repeat_pairing=(
+                        REPEAT_PENALTY_WEIGHT,
+                        REPEAT_PENALTY_DECAY,
+                        REPEAT_PENALTY_WEEKS,
+                        last_meeting,
+                    ),
                 )
-
-                # Stage 2: Apply gender balancing using Metropolis-Hastings
-                logger.info("Stage 2: Starting gender balancing")
-                groups = balance_gender_in_groups(
-                    initial_groups,
-                    max_iterations=10_000,
-                    target_size=target_size,  # Pass target_size parameter
+                groups, flight = await optimization_flights.run(
+                    key,
+                    lambda token: _optimize_groups(
+                        engine,
+                        group_members,
+                        num_groups,
+                        target_size,
+                        token,
+                        constraints,
+                        pairing,
+                    ),
+                    is_disconnected=request.is_disconnected,
                 )
-                logger.info("Gender balancing complete")
 
-                # Store the current groups globally
-                current_groups = groups
+                # Store the current groups globally unless a newer run exists
+                if optimization_flights.publish(flight.seq, flight.generation):
+                    current_groups = groups
 
+    except OptimizationCancelled as e:
+        logger.info(f"Group generation cancelled: {e}")
+        error = "Group generation was cancelled because attendance changed"
     except ValueError as e:
         logger.warning(f"Could not create groups: {e}")
     except Exception as e:
@@ -646,11 +862,200 @@ async def generate_groups(
         {
             "request": request,
             "groups": groups,
-            "error": None if groups else "Not enough members or leaders for groups",
+            "error": None if groups else error,
         },
     )
 
 
+def _optimize_groups(
+    engine: str,
+    group_members: list[GroupMember],
+    num_groups: int,
+    target_size: int,
+    cancel_token: CancellationToken,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+):
+    """Run the optimization for /groups/generate in a worker thread."""
+    telemetry = OptimizerTelemetry()
+    try:
+        logger.info(f"Running {engine} engine")
+        with (
+            span("optimizer", engine=engine, members=len(group_members)),
+            profiling.profile_thread(),
+        ):
+            groups = run_engine(
+                engine,
+                group_members,
+                num_groups,
+                target_size=target_size,
+                max_iterations=10_000,
+                cancel_token=cancel_token,
+                telemetry=telemetry,
+                diversity=diversity_config,
+                constraints=constraints,
+                pairing=pairing,
+            )
+        logger.info("Group optimization complete")
+        return groups
+    finally:
+        telemetry_store.record(telemetry)
+
+
+@app.post("/groups/alternatives")
+async def generate_alternatives(
+    request: Request,
+    target_size: int = Form(7),
+    k: int = Form(3),
+    db: Session = Depends(get_db),
+):
+    """The ``k`` best distinct divisions of today's present members found in
+    one optimization run, with their score breakdowns; pick one with
+    /groups/alternatives/{index}/select."""
+    global current_alternatives, alternatives_run
+    if not 1 <= k <= MAX_ALTERNATIVES:
+        raise HTTPException(
+            status_code=400, detail=f"k must be between 1 and {MAX_ALTERNATIVES}"
+        )
+    today = date.today()
+    group_members = load_present_roster(db, today)
+    if len(group_members) < 4:
+        raise HTTPException(
+            status_code=400, detail="Not enough members or leaders for groups"
+        )
+    constraints = load_constraints(db)
+    last_meeting = today - timedelta(days=1)
+    pairing = load_repeat_pairing(db, last_meeting)
+    num_groups = max(1, (len(group_members) + target_size - 1) // target_size)
+
+    # Identical concurrent requests share one run, and a roster change
+    # cancels it like a /groups/generate run
+    key = roster_fingerprint(
+        group_members,
+        num_groups=num_groups,
+        target_size=target_size,
+        engine="alternatives",
+        k=k,
+        diversity=diversity_config,
+        constraints=constraints,
+        repeat_pairing=(
+            REPEAT_PENALTY_WEIGHT,
+            REPEAT_PENALTY_DECAY,
+            REPEAT_PENALTY_WEEKS,
+            last_meeting,
+        ),
+    )
+    try:
+        alternatives, flight = await optimization_flights.run(
+            key,
+            lambda token: _find_alternatives(
+                group_members,
+                num_groups,
+                target_size,
+                k,
+                token,
+                constraints,
+                pairing,
+            ),
+            is_disconnected=request.is_disconnected,
+        )
+    except OptimizationCancelled as e:
+        logger.info(f"Alternatives cancelled: {e}")
+        raise HTTPException(
+            status_code=409,
+            detail="Alternatives were cancelled because attendance changed",
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Keep them unless the roster changed while they were computed
+    if flight.generation == optimization_flights.generation:
+        current_alternatives = [alternative.groups for alternative in alternatives]
+        alternatives_run = (flight.seq, flight.generation)
+    return {
+        "alternatives": [
+            {
+                "index": index,
+                "groups": [
+                    [
+                        {"id": m.id, "name": f"{m.surname}{m.given_name}"}
+                        for m in group.members
+                    ]
+                    for group in alternative.groups
+                ],
+                "score_components": alternative.score_components,
+                "constraint_violations": alternative.constraint_violations,
+            }
+            for index, alternative in enumerate(alternatives)
+        ]
+    }
+
+
+def _find_alternatives(
+    group_members: list[GroupMember],
+    num_groups: int,
+    target_size: int,
+    k: int,
+    cancel_token: CancellationToken,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+) -> list[Alternative]:
+    """Place members and search for alternatives in a worker thread."""
+    telemetry = OptimizerTelemetry(engine="alternatives")
+    try:
+        with span("optimizer", engine="alternatives", members=len(group_members)):
+            placement = divide_into_groups(
+                group_members,
+                num_groups,
+                max_iterations=0,
+                target_size=target_size,
+                telemetry=telemetry,
+                diversity=diversity_config,
+                constraints=constraints,
+                pairing=pairing,
+            )
+            return find_alternatives(
+                placement,
+                k,
+                target_size=target_size,
+                cancel_token=cancel_token,
+                telemetry=telemetry,
+                diversity=diversity_config,
+                constraints=constraints,
+                pairing=pairing,
+            )
+    finally:
+        telemetry_store.record(telemetry)
+
+
+@app.post("/groups/alternatives/{index}/select")
+async def select_alternative(request: Request, index: int):
+    """Make an alternative of the last /groups/alternatives request the
+    current groups, as if /groups/generate had produced it.
+
+    Answers 409 if the roster or constraints changed since the alternatives
+    were computed, or newer groups were generated."""
+    global current_groups
+    seq, generation = alternatives_run
+    if generation != optimization_flights.generation:
+        raise HTTPException(
+            status_code=409,
+            detail="Attendance or constraints changed; generate alternatives again",
+        )
+    if not 0 <= index < len(current_alternatives):
+        raise HTTPException(status_code=404, detail="Alternative not found")
+    if not optimization_flights.publish(seq, generation):
+        raise HTTPException(
+            status_code=409,
+            detail="Newer groups were generated; generate alternatives again",
+        )
+    current_groups = current_alternatives[index]
+    return templates.TemplateResponse(
+        "partials/group_divisions.html",
+        {"request": request, "groups": current_groups, "error": None},
+    )
+
+
 @app.post("/members/{member_id}/prep")
 async def update_prep_attendance(
     request: Request,
@@ -662,6 +1067,7 @@ async def update_prep_attendance(
     member = db.query(Member).filter(Member.id == member_id).first()
     member.prep_attended = prep_attended
     db.commit()
+    optimization_flights.invalidate()
     return responses.Response(
         status_code=204
     )  # No content needed as checkbox handles its own state
@@ -677,6 +1083,7 @@ async def select_all_prep(
     for member in members:
         member.prep_attended = True
     db.commit()
+    optimization_flights.invalidate()
 
     today = date.today()
     attendance_records = db.query(Attendance).filter_by(date=today).all()
@@ -706,6 +1113,7 @@ async def unselect_all_prep(
     for member in members:
         member.prep_attended = False
     db.commit()
+    optimization_flights.invalidate()
 
     today = date.today()
     attendance_records = db.query(Attendance).filter_by(date=today).all()
@@ -725,6 +1133,47 @@ async def unselect_all_prep(
     )
 
 
+@app.post("/groups/finalize")
+async def finalize_groups(
+    request: Request,
+    meeting_date: Annotated[date | None, Form()] = None,
+    db: Session = Depends(get_db),
+):
+    """Store the current groups as the division of ``meeting_date`` (default
+    today), replacing one finalized earlier that day."""
+    if not current_groups:
+        raise HTTPException(status_code=400, detail="No groups to finalize")
+    day = meeting_date or date.today()
+    rows = record_division(db, day, current_groups)
+    db.commit()
+    # Runs in flight were penalized against the old history
+    optimization_flights.invalidate()
+    return {"date": day.isoformat(), "groups": len(current_groups), "members": rows}
+
+
+@app.get("/groups/history/co-membership")
+async def get_co_membership(
+    request: Request,
+    weeks: int = 12,
+    end: date | None = None,
+    db: Session = Depends(get_db),
+):
+    """How often pairs of members shared a group, as sparse [a, b, count] rows."""
+    since, until = history_window(weeks, end)
+    pairs = co_membership(db, weeks, until)
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "pairs": [[a, b, count] for (a, b), count in sorted(pairs.items())],
+    }
+
+
+@app.get("/groups/history/{day}")
+async def get_group_history(request: Request, day: date, db: Session = Depends(get_db)):
+    """Member ids of each group finalized on ``day``."""
+    return {"date": day.isoformat(), "groups": load_division(db, day)}
+
+
 @app.get("/groups/markdown", response_class=PlainTextResponse)
 async def get_groups_markdown(request: Request, db: Session = Depends(get_db)):
     """Generate markdown text for the current group divisions."""
@@ -1,12 +1,12 @@
 def sdi(data):
-    """ Given a hash { 'species': count } , returns the SDI
+    """Given a hash { 'species': count } , returns the SDI
     >>> sdi({'a': 10, 'b': 20, 'c': 30,})
     1.0114042647073518"""
 
     from math import log as ln
 
     def p(n, N):
-        """ Relative abundance """
+        """Relative abundance"""
         if n is 0:
             return 0
         else:
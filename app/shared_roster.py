@@ -0,0 +1,312 @@
+"""Rosters shared with worker processes through shared memory.
+
+Process-based optimizers would otherwise pickle the GroupMember list, the
+diversity config, the constraints and the repeat-pairing penalty into every
+task. SharedRoster instead compiles them once into integer-coded columns in
+one ``multiprocessing.shared_memory`` block:
+
+* member ids, the prep, leader, gender and graduate flags, the diversity
+  kernel positions of every member and the starting assignment;
+* the kernel position weights;
+* the repeat-pairing weights and the separate, together and cap memberships
+  of the constraints as compressed sparse rows (an offsets column and a
+  column of roster indices, plus a weights column for the pairing).
+
+Its ``handle`` is a small picklable RosterHandle holding the block's name and
+column layout. A worker passes it to attach(), which maps the block without
+copying it and caches the mapping for later tasks on the same roster, and
+builds PartitionStates from it with AttachedRoster.state(). Tasks then only
+carry the handle and an assignment vector, and results only an assignment
+vector and scores, whatever the size of the roster.
+"""
+
+import atexit
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Sequence, Tuple
+
+from .constraints import AttributeCap, CompiledConstraints, ConstraintSet
+from .diversity import DEFAULT_DIVERSITY, DiversityConfig, DiversityKernel
+from .group_divider import Group, GroupMember
+from .history import RepeatPairing
+from .partition import PartitionState
+
+# Rosters a worker process keeps attached at once
+ATTACHED_ROSTER_CACHE_SIZE = 4
+
+# Column name, array typecode, byte offset and number of items
+Column = Tuple[str, str, int, int]
+
+
+@dataclass(frozen=True)
+class RosterHandle:
+    """Everything a worker needs to attach to a SharedRoster."""
+
+    name: str
+    num_members: int
+    num_groups: int
+    num_terms: int
+    target_size: int
+    diversity: DiversityConfig
+    # None when the roster has no constraints
+    caps: Tuple[AttributeCap, ...] | None
+    has_pairing: bool
+    columns: Tuple[Column, ...]
+
+
+def _csr(rows: Sequence[Sequence[int]]) -> Tuple[array, array]:
+    """Offsets and values columns of a list of rows."""
+    offsets = array("i", [0])
+    values = array("i")
+    for row in rows:
+        values.extend(row)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def _rows(offsets: memoryview, values: memoryview) -> List[Tuple[int, ...]]:
+    return [tuple(values[offsets[i] : offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+
+class SharedRoster:
+    """A partition's roster compiled into a shared memory block.
+
+    The creating process owns the block: close() (or leaving the ``with``
+    block) unlinks it, after which workers can no longer attach.
+
+    :param groups: Partition whose members form the roster, in order; it is
+        also the starting assignment
+    :param target_size: Target size for each group
+    :param diversity: Diversity config, defaults to DEFAULT_DIVERSITY
+    :param constraints: Optional constraints
+    :param pairing: Optional repeat-pairing penalty
+    """
+
+    def __init__(
+        self,
+        groups: List[Group],
+        target_size: int = 7,
+        diversity: DiversityConfig | None = None,
+        constraints: ConstraintSet | None = None,
+        pairing: RepeatPairing | None = None,
+    ):
+        diversity = diversity or DEFAULT_DIVERSITY
+        self.members: List[GroupMember] = [m for g in groups for m in g.members]
+        self.num_groups = len(groups)
+        kernel = diversity.compile(self.members)
+        state = PartitionState(
+            groups,
+            target_size,
+            kernel=kernel,
+            constraints=constraints,
+            pairing=pairing,
+        )
+        columns: Dict[str, array] = {
+            "ids": array("q", [m.id for m in self.members]),
+            "is_prep": array("b", state.is_prep),
+            "is_leader": array("b", state.is_leader),
+            "is_male": array("b", state.is_male),
+            "is_graduated": array("b", state.is_graduated),
+            "positions": array("i", [p for ps in state.positions for p in ps]),
+            "position_weights": array("d", kernel.position_weights),
+            "assignment": array("i", state.assignment),
+        }
+        if state.pair_weights is not None:
+            columns["pair_offsets"], columns["pair_members"] = _csr(
+                [list(weights) for weights in state.pair_weights]
+            )
+            columns["pair_weights"] = array(
+                "d", [w for weights in state.pair_weights for w in weights.values()]
+            )
+        if state.constraint_state is not None:
+            compiled = state.constraint_state.compiled
+            for name in ("separate", "together", "member_caps"):
+                columns[f"{name}_offsets"], columns[name] = _csr(
+                    getattr(compiled, name)
+                )
+
+        layout = []
+        size = 0
+        for name, column in columns.items():
+            # Align every column to 8 bytes, the largest item size
+            size += -size % 8
+            layout.append((name, column.typecode, size, len(column)))
+            size += len(column) * column.itemsize
+        self._shm = SharedMemory(create=True, size=max(size, 1))
+        for (name, _, offset, _), column in zip(layout, columns.values()):
+            data = column.tobytes()
+            self._shm.buf[offset : offset + len(data)] = data
+
+        self.handle = RosterHandle(
+            name=self._shm.name,
+            num_members=len(self.members),
+            num_groups=len(groups),
+            num_terms=len(diversity.terms),
+            target_size=target_size,
+            diversity=diversity,
+            caps=constraints.caps if constraints else None,
+            has_pairing=state.pair_weights is not None,
+            columns=tuple(layout),
+        )
+
+    def to_groups(self, assignment: Sequence[int]) -> List[Group]:
+        """Partition putting roster member ``i`` in group ``assignment[i]``."""
+        groups = [Group(members=[]) for _ in range(self.num_groups)]
+        for member, g in zip(self.members, assignment):
+            groups[g].members.append(member)
+        return groups
+
+    def close(self) -> None:
+        """Release and unlink the shared memory block."""
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedRoster":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AttachedRoster:
+    """A worker's view of a SharedRoster.
+
+    ``columns`` maps each column name to a memoryview over the shared block;
+    nothing is copied until state() decodes the columns it needs once.
+
+    :param handle: Handle of the SharedRoster to attach to
+    """
+
+    def __init__(self, handle: RosterHandle):
+        self.handle = handle
+        self._shm = SharedMemory(name=handle.name)
+        self.columns: Dict[str, memoryview] = {}
+        for name, typecode, offset, length in handle.columns:
+            itemsize = array(typecode).itemsize
+            self.columns[name] = self._shm.buf[
+                offset : offset + length * itemsize
+            ].cast(typecode)
+        self._template: PartitionState | None = None
+
+    def _build_template(self) -> PartitionState:
+        handle = self.handle
+        columns = self.columns
+        ids = columns["ids"]
+        terms = handle.num_terms
+        positions = columns["positions"]
+        kernel = DiversityKernel.from_positions(
+            handle.diversity,
+            ids,
+            [
+                tuple(positions[i * terms : (i + 1) * terms])
+                for i in range(handle.num_members)
+            ],
+            columns["position_weights"],
+        )
+        pair_weights = None
+        if handle.has_pairing:
+            offsets = columns["pair_offsets"]
+            members, weights = columns["pair_members"], columns["pair_weights"]
+            pair_weights = [
+                dict(
+                    zip(
+                        members[offsets[i] : offsets[i + 1]],
+                        weights[offsets[i] : offsets[i + 1]],
+                    )
+                )
+                for i in range(handle.num_members)
+            ]
+        constraints = None
+        if handle.caps is not None:
+            constraints = CompiledConstraints.from_adjacency(
+                ids,
+                handle.caps,
+                *(
+                    _rows(columns[f"{name}_offsets"], columns[name])
+                    for name in ("separate", "together", "member_caps")
+                ),
+            )
+        return PartitionState.from_columns(
+            ids,
+            kernel,
+            handle.target_size,
+            columns["is_prep"],
+            columns["is_leader"],
+            columns["is_male"],
+            columns["is_graduated"],
+            columns["assignment"],
+            handle.num_groups,
+            pair_weights=pair_weights,
+            constraints=constraints,
+        )
+
+    def state(self, assignment: Sequence[int] | None = None) -> PartitionState:
+        """PartitionState of the roster with the given assignment, or the
+        starting one.
+
+        The kernel, pairing and constraint tables are decoded on the first
+        call and shared by every state built afterwards.
+        """
+        if self._template is None:
+            self._template = self._build_template()
+        template = self._template
+        if assignment is None:
+            assignment = self.columns["assignment"]
+        return PartitionState.from_columns(
+            template.members,
+            template.kernel,
+            self.handle.target_size,
+            template.is_prep,
+            template.is_leader,
+            template.is_male,
+            template.is_graduated,
+            assignment,
+            self.handle.num_groups,
+            pair_weights=template.pair_weights,
+            constraints=(
+                template.constraint_state.compiled
+                if template.constraint_state
+                else None
+            ),
+        )
+
+    def close(self) -> None:
+        self._template = None
+        for column in self.columns.values():
+            column.release()
+        self.columns.clear()
+        self._shm.close()
+
+
+# Rosters attached by this process, most recently used last
+_ATTACHED: "OrderedDict[str, AttachedRoster]" = OrderedDict()
+
+
+def attach(handle: RosterHandle) -> AttachedRoster:
+    """Attach to a shared roster, reusing this process's earlier attachment.
+
+    At most ATTACHED_ROSTER_CACHE_SIZE rosters stay attached; the least
+    recently used one is closed to make room.
+    """
+    roster = _ATTACHED.get(handle.name)
+    if roster is not None and roster.handle == handle:
+        _ATTACHED.move_to_end(handle.name)
+        return roster
+    if roster is not None:
+        roster.close()
+    roster = _ATTACHED[handle.name] = AttachedRoster(handle)
+    while len(_ATTACHED) > ATTACHED_ROSTER_CACHE_SIZE:
+        _, evicted = _ATTACHED.popitem(last=False)
+        evicted.close()
+    return roster
+
+
+@atexit.register
+def _detach_all() -> None:
+    """Close the cached attachments while their columns can still be
+    released; SharedMemory.__del__ at interpreter exit cannot."""
+    while _ATTACHED:
+        _, roster = _ATTACHED.popitem()
+        roster.close()
@@ -0,0 +1,179 @@
+"""Single-flight deduplication and cooperative cancellation of optimizer runs."""
+
+import asyncio
+import hashlib
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List
+
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+
+class OptimizationCancelled(Exception):
+    """Raised inside an optimizer run when its cancellation token is triggered."""
+
+
+class CancellationToken:
+    """Thread-safe flag that optimizer loops poll to stop cooperatively."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self.reason: str | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Request cancellation. The first reason given is kept."""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        """Raise OptimizationCancelled if cancellation was requested."""
+        if self._event.is_set():
+            raise OptimizationCancelled(self.reason)
+
+
+def roster_fingerprint(members: Iterable[Any], **params: Any) -> str:
+    """Fingerprint a roster and run parameters.
+
+    Two requests with the same fingerprint would run an identical optimization,
+    so they can share one computation.
+
+    :param members: GroupMember objects taking part in the run
+    :param params: Run parameters such as target_size or engine
+    :return: Hex digest identifying the run
+    """
+    rows = sorted(
+        (
+            m.id,
+            m.role.value,
+            m.gender,
+            m.faith_status,
+            m.education_status,
+            m.prep_attended,
+        )
+        for m in members
+    )
+    payload = repr((rows, sorted(params.items())))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Flight:
+    """One in-flight optimization shared by every request with the same key."""
+
+    key: str
+    seq: int
+    generation: int
+    token: CancellationToken = field(default_factory=CancellationToken)
+    task: asyncio.Task | None = None
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Coalesce identical optimizer requests and guard against stale results.
+
+    Every attendance or roster change bumps the generation and cancels whatever
+    is still running. Each flight gets a monotonically increasing sequence
+    number; a result is only published if it was computed for the current
+    generation and is newer than the last published result.
+    """
+
+    def __init__(self, poll_interval: float = 0.1) -> None:
+        self.poll_interval = poll_interval
+        self.generation = 0
+        self.published_seq = 0
+        self._flights: Dict[str, Flight] = {}
+        self._seq = itertools.count(1)
+        self._on_invalidate: List[Callable[[], None]] = []
+
+    def next_seq(self) -> int:
+        """Reserve a sequence number for a result computed outside a flight."""
+        return next(self._seq)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def on_invalidate(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` on every invalidation, e.g. to drop results kept
+        outside of the published groups."""
+        self._on_invalidate.append(callback)
+
+    def invalidate(self, reason: str = "attendance changed") -> None:
+        """Start a new generation and cancel all in-flight runs."""
+        self.generation += 1
+        for flight in self._flights.values():
+            flight.token.cancel(reason)
+        self._flights.clear()
+        for callback in self._on_invalidate:
+            callback()
+
+    def publish(self, seq: int, generation: int) -> bool:
+        """Check whether a result may replace the currently published one.
+
+        A run may publish again, e.g. when one of its alternatives is picked
+        after another, as long as no newer run has published since.
+
+        :param seq: Sequence number of the run that produced the result
+        :param generation: Generation the run was started in
+        :return: True if the caller should store the result
+        """
+        if generation != self.generation or seq < self.published_seq:
+            logger.info(f"Discarding stale optimization result (run {seq})")
+            return False
+        self.published_seq = seq
+        return True
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[CancellationToken], Any],
+        is_disconnected: Callable[[], Any] | None = None,
+    ) -> tuple[Any, Flight]:
+        """Run ``fn`` in a worker thread, sharing it with identical requests.
+
+        :param key: Fingerprint of the run, see roster_fingerprint
+        :param fn: Blocking callable taking a CancellationToken
+        :param is_disconnected: Optional coroutine function reporting whether
+            the client went away; the run is cancelled once all waiters leave
+        :return: The result of ``fn`` and the flight that produced it
+        :raises OptimizationCancelled: If the run was cancelled
+        """
+        flight = self._flights.get(key)
+        if flight is None or flight.token.cancelled:
+            flight = Flight(key=key, seq=next(self._seq), generation=self.generation)
+            flight.task = asyncio.ensure_future(run_in_threadpool(fn, flight.token))
+            flight.task.add_done_callback(lambda task, f=flight: self._done(task, f))
+            self._flights[key] = flight
+        else:
+            logger.info(f"Joining in-flight optimization run {flight.seq}")
+
+        flight.waiters += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({flight.task}, timeout=self.poll_interval)
+                if done:
+                    return flight.task.result(), flight
+                if is_disconnected is not None and await is_disconnected():
+                    raise OptimizationCancelled("client disconnected")
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.token.cancel("client disconnected")
+                self._forget(flight)
+
+    def _done(self, task: asyncio.Task, flight: Flight) -> None:
+        # Retrieve the outcome so abandoned, cancelled runs are not reported
+        # as unhandled task exceptions.
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Optimization run {flight.seq} ended: {task.exception()!r}")
+        self._forget(flight)
+
+    def _forget(self, flight: Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
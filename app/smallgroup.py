@@ -22,9 +22,7 @@ class SmallGroup(object):
         assert criteria in ["gender", "faith_status", "role"]
         sdis = dict()
         for group, members in self.groups.items():
-            genders = Counter(
-                eval("[m.{0} for m in members]".format(criteria))
-            )
+            genders = Counter(eval("[m.{0} for m in members]".format(criteria)))
             sdis[group] = sdi(genders)
 
         return sdis
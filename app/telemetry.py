@@ -0,0 +1,229 @@
+"""Structured telemetry for optimizer runs."""
+
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from . import database
+from .instrumentation import add_optimizer_time
+
+# Number of recent runs kept in memory for /debug/metrics
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "200"))
+
+
+@dataclass
+class OptimizerTelemetry:
+    """Measurements collected during a single optimizer run."""
+
+    engine: str = "greedy"
+    roster_size: int = 0
+    num_groups: int = 0
+    iterations: int = 0
+    accepted_moves: int = 0
+    stop_reason: str | None = None
+    phase_seconds: Dict[str, float] = field(default_factory=dict)
+    score_components: Dict[str, float] = field(default_factory=dict)
+    # Per-component gain over the starting partition, for engines that
+    # optimize the full score; positive means better (less penalty)
+    score_improvements: Dict[str, float] = field(default_factory=dict)
+    # Constraint violations left in the result (see app.constraints)
+    constraint_violations: int = 0
+    # How far the result is from a proven bound on the engine's objective
+    # (gender imbalance for the balancers, partition score for
+    # branch_and_bound); 0 means provably optimal, None means no bound
+    optimality_gap: float | None = None
+    started_at: datetime = field(default_factory=datetime.now)
+    # Opt-in (elapsed seconds, total score, gender imbalance) samples of the
+    # incumbent partition; too costly to collect in production runs
+    trace_enabled: bool = False
+    trace: List[Tuple[float, float, float]] = field(default_factory=list)
+    _clock_start: float = field(default_factory=time.perf_counter, repr=False)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a phase of the run, accumulating if it is entered repeatedly."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+
+    def record_progress(
+        self, groups, target_size: int = 7, diversity=None, pairing=None
+    ) -> None:
+        """Sample the score of a new incumbent partition if tracing is enabled.
+
+        :param groups: The engine's current best partition
+        :param target_size: Target size used to score the partition
+        :param diversity: DiversityConfig used to score the partition
+        :param pairing: RepeatPairing penalty included in the score
+        """
+        if not self.trace_enabled:
+            return
+
+        from .group_divider import partition_score_components
+
+        scores = partition_score_components(groups, target_size, diversity, pairing)
+        self.record_score(scores["total"], scores["gender_imbalance"])
+
+    def record_score(self, total: float, gender_imbalance: float) -> None:
+        """Sample an already computed incumbent score if tracing is enabled."""
+        if self.trace_enabled:
+            self.trace.append(
+                (time.perf_counter() - self._clock_start, total, gender_imbalance)
+            )
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.phase_seconds.values())
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        del data["_clock_start"]
+        data["started_at"] = self.started_at.isoformat()
+        data["total_seconds"] = self.total_seconds
+        return data
+
+
+class TelemetryStore:
+    """Bounded in-memory ring buffer of runs, mirrored to SQLite when available.
+
+    Runs are written to SQLite by a background thread, so that recording one
+    from an async route does not wait on the database; runs recorded while
+    the writer is busy are inserted together in one transaction.
+    """
+
+    def __init__(self, maxlen: int = TELEMETRY_BUFFER_SIZE) -> None:
+        self._runs: deque[OptimizerTelemetry] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._pending: queue.Queue = queue.Queue()
+        self._writer: threading.Thread | None = None
+
+    def record(self, telemetry: OptimizerTelemetry) -> None:
+        """Store a finished run. Safe to call from worker threads."""
+        with self._lock:
+            self._runs.append(telemetry)
+        add_optimizer_time(telemetry.total_seconds)
+        logger.info(
+            f"Optimizer run ({telemetry.engine}): {telemetry.roster_size} members, "
+            f"{telemetry.iterations} iterations, stop={telemetry.stop_reason}, "
+            f"{telemetry.total_seconds:.3f}s"
+        )
+        # Written to the database current now, even if init_db switches it
+        # before the writer gets to this run
+        if database.SessionLocal is not None:
+            self._pending.put((database.SessionLocal, telemetry))
+            self._start_writer()
+
+    def flush(self) -> None:
+        """Wait until every recorded run has been written to SQLite."""
+        self._pending.join()
+
+    def recent(self, limit: int | None = None) -> List[OptimizerTelemetry]:
+        with self._lock:
+            runs = list(self._runs)
+        return runs[-limit:] if limit else runs
+
+    def clear(self) -> None:
+        with self._lock:
+            self._runs.clear()
+
+    def summary(self) -> Dict[str, dict]:
+        """Per-engine run counts and wall-time percentiles from the buffer."""
+        by_engine: Dict[str, List[OptimizerTelemetry]] = {}
+        for run in self.recent():
+            by_engine.setdefault(run.engine, []).append(run)
+
+        summary = {}
+        for engine, runs in by_engine.items():
+            times = sorted(r.total_seconds for r in runs)
+            summary[engine] = {
+                "runs": len(runs),
+                "p50_seconds": percentile(times, 0.5),
+                "p95_seconds": percentile(times, 0.95),
+                "max_seconds": times[-1],
+                "mean_final_score": sum(
+                    r.score_components.get("total", 0.0) for r in runs
+                )
+                / len(runs),
+            }
+        return summary
+
+    def _start_writer(self) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_pending, daemon=True, name="telemetry-writer"
+                )
+                self._writer.start()
+
+    def _write_pending(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            by_database: Dict[object, List[OptimizerTelemetry]] = {}
+            for session_factory, telemetry in batch:
+                by_database.setdefault(session_factory, []).append(telemetry)
+            try:
+                for session_factory, runs in by_database.items():
+                    self._persist(session_factory, runs)
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _persist(self, session_factory, runs: List[OptimizerTelemetry]) -> None:
+        from .models import OptimizerRun
+
+        db = session_factory()
+        try:
+            db.add_all(
+                OptimizerRun(
+                    started_at=telemetry.started_at,
+                    engine=telemetry.engine,
+                    roster_size=telemetry.roster_size,
+                    num_groups=telemetry.num_groups,
+                    iterations=telemetry.iterations,
+                    accepted_moves=telemetry.accepted_moves,
+                    stop_reason=telemetry.stop_reason,
+                    total_seconds=telemetry.total_seconds,
+                    phase_seconds=json.dumps(telemetry.phase_seconds),
+                    score_components=json.dumps(telemetry.score_components),
+                )
+                for telemetry in runs
+            )
+            db.commit()
+        except Exception:
+            logger.exception("Could not persist optimizer telemetry")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# Process-wide store used by the routes
+telemetry_store = TelemetryStore()
@@ -0,0 +1,339 @@
+"""Parallel tempering over the full partition score.
+
+A single chain of improving swaps gets stuck on rosters where the good
+partitions are far apart, such as the imbalanced profile. Parallel tempering
+runs several replicas of the partition at once, each a Metropolis chain at
+its own temperature: hot replicas accept most worsening moves and wander,
+cold ones only climb. Every TEMPERING_EXCHANGE_STEPS proposals, replicas at
+neighbouring temperatures exchange states with the Metropolis probability
+``min(1, exp((s_hot - s_cold) * (1 / T_cold - 1 / T_hot)))``, so partitions
+found by the hot replicas drift down to the cold ones to be refined.
+
+Each replica runs in its own worker process, attached to the roster through
+a SharedRoster (see app.shared_roster). An exchange only sends new
+temperatures to the two workers involved, which is the same as exchanging
+their states, and only each worker's best assignment vector is sent back at
+the end. Proposals are
+swaps and single-member moves (see PartitionState.can_move), scored
+incrementally; moves adding constraint violations are never accepted and
+moves removing one always are.
+"""
+
+import math
+import os
+import random
+import time
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from typing import List, Tuple
+
+from loguru import logger
+
+from .constraints import ConstraintSet
+from .diversity import DiversityConfig
+from .group_divider import Group
+from .history import RepeatPairing
+from .partition import PartitionState, score_improvements
+from .shared_roster import RosterHandle, SharedRoster, attach
+from .single_flight import CancellationToken
+from .telemetry import OptimizerTelemetry
+from .tracing import record_span
+
+# Number of replicas, one worker process each
+TEMPERING_REPLICAS = int(
+    os.getenv("TEMPERING_REPLICAS", str(max(2, min(8, os.cpu_count() or 1))))
+)
+
+# Temperatures are spaced geometrically between these; a typical swap
+# changes the score by about 0.2
+TEMPERING_MIN_TEMPERATURE = float(os.getenv("TEMPERING_MIN_TEMPERATURE", "0.02"))
+TEMPERING_MAX_TEMPERATURE = float(os.getenv("TEMPERING_MAX_TEMPERATURE", "1.0"))
+
+# Proposals each replica makes between exchanges
+TEMPERING_EXCHANGE_STEPS = int(os.getenv("TEMPERING_EXCHANGE_STEPS", "2000"))
+
+# Wall-clock budget when the caller sets none
+TEMPERING_TIME_LIMIT = float(os.getenv("TEMPERING_TIME_LIMIT", "5"))
+
+# Tempering and alternatives workers fork from one server process, which
+# imports both worker modules once. Importing any app module also runs
+# app/__init__.py, building the FastAPI app and, with DB_PATH set, opening
+# the database; workers use neither, but without the preload each of them
+# would do all of that again on start. The preload is process-wide, so it
+# is set here only
+_CONTEXT = get_context("forkserver")
+_CONTEXT.set_forkserver_preload(["app.tempering", "app.alternatives"])
+
+
+def _no_op() -> None:
+    pass
+
+
+def start_forkserver() -> None:
+    """Start the fork server and wait for it to preload this module, e.g. at
+    app start-up.
+
+    Otherwise the first run starts it, and the second or so that takes counts
+    against that run's time limit.
+    """
+    # The server preloads in the background; the first fork waits for it
+    process = _CONTEXT.Process(target=_no_op, daemon=True)
+    process.start()
+    process.join()
+
+
+def temperatures(count: int) -> List[float]:
+    """Geometric ladder from TEMPERING_MIN_TEMPERATURE up."""
+    if count == 1:
+        return [TEMPERING_MIN_TEMPERATURE]
+    ratio = TEMPERING_MAX_TEMPERATURE / TEMPERING_MIN_TEMPERATURE
+    return [
+        TEMPERING_MIN_TEMPERATURE * ratio ** (k / (count - 1)) for k in range(count)
+    ]
+
+
+def _metropolis(
+    state: PartitionState,
+    temperature: float,
+    steps: int,
+    rng: random.Random,
+    best: Tuple[int, float],
+) -> Tuple[int, Tuple[int, float], List[int] | None, float | None]:
+    """Make ``steps`` proposals at ``temperature``.
+
+    :param best: (violations, -total) of the replica's best partition so far
+    :return: Accepted proposals, the new best key, and the assignment and
+        gender imbalance of the best partition if this run improved on
+        ``best`` (None otherwise)
+    """
+    constraint_state = state.constraint_state
+    num_members = len(state.members)
+    num_groups = len(state.group_members)
+    accepted = 0
+    best_assignment = best_imbalance = None
+    for _ in range(steps):
+        i = rng.randrange(num_members)
+        own = state.assignment[i]
+        other = rng.randrange(num_groups - 1)
+        group = other + 1 if other >= own else other
+        if rng.random() < 0.5:
+            if not state.can_move(i, group):
+                continue
+            added = constraint_state.move_delta(i, group) if constraint_state else 0
+            delta = state.move_delta(i, group) if added <= 0 else 0.0
+            apply, args = state.apply_move, (i, group)
+        else:
+            j = rng.choice(state.group_members[group])
+            if not state.can_swap(i, j):
+                continue
+            added = constraint_state.swap_delta(i, j) if constraint_state else 0
+            delta = state.swap_delta(i, j) if added <= 0 else 0.0
+            apply, args = state.apply_swap, (i, j)
+        if added > 0:
+            continue
+        if added == 0 and delta < 0 and rng.random() >= math.exp(delta / temperature):
+            continue
+        apply(*args)
+        accepted += 1
+        key = (state.violations, -state.total)
+        if key < best:
+            best = key
+            best_assignment = list(state.assignment)
+            best_imbalance = state.gender_imbalance()
+    return accepted, best, best_assignment, best_imbalance
+
+
+def _replica_worker(handle: RosterHandle, seed: int, conn: Connection) -> None:
+    """Run one replica; see parallel_tempering for the message protocol."""
+    state = attach(handle).state()
+    rng = random.Random(seed)
+    best = (state.violations, -state.total)
+    best_assignment = list(state.assignment)
+    best_imbalance = state.gender_imbalance()
+    while True:
+        temperature = conn.recv()
+        if temperature is None:
+            conn.send(best_assignment)
+            return
+        accepted, best, improved, imbalance = _metropolis(
+            state, temperature, TEMPERING_EXCHANGE_STEPS, rng, best
+        )
+        if improved is not None:
+            best_assignment, best_imbalance = improved, imbalance
+        conn.send(
+            (state.total, state.violations, -best[1], best[0], best_imbalance, accepted)
+        )
+
+
+def parallel_tempering(
+    groups: List[Group],
+    max_iterations: int = 10_000,
+    target_size: int = 7,
+    cancel_token: CancellationToken | None = None,
+    telemetry: OptimizerTelemetry | None = None,
+    time_limit: float | None = None,
+    diversity: DiversityConfig | None = None,
+    constraints: ConstraintSet | None = None,
+    pairing: RepeatPairing | None = None,
+    replicas: int | None = None,
+) -> List[Group]:
+    """
+    Improve a partition by parallel tempering in worker processes.
+
+    Every round, each worker makes TEMPERING_EXCHANGE_STEPS proposals at its
+    current temperature and reports its score; then neighbouring temperatures
+    are exchanged, alternating between even and odd pairs. The search runs
+    until the time limit, ``max_iterations`` rounds or cancellation, and
+    returns the best partition any replica found.
+
+    :param groups: Partition every replica starts from
+    :param max_iterations: Maximum number of rounds
+    :param target_size: Target size for each group (default: 7)
+    :param cancel_token: Optional token checked every round; raises
+        OptimizationCancelled once it is cancelled
+    :param telemetry: Optional telemetry record filled in with the rounds,
+        accepted proposals, the "tempering" phase time, final scores, the
+        improvement of each score component and remaining violations
+    :param time_limit: Wall-clock budget in seconds; defaults to
+        TEMPERING_TIME_LIMIT
+    :param diversity: Diversity config the score is computed with
+    :param constraints: Optional constraints, minimized before the score
+    :param pairing: Optional repeat-pairing penalty, part of the score
+    :param replicas: Number of replicas; defaults to TEMPERING_REPLICAS
+    :return: The best partition found
+    """
+    phase_start = time.perf_counter()
+    if time_limit is None:
+        time_limit = TEMPERING_TIME_LIMIT
+    deadline = phase_start + time_limit
+    if len(groups) < 2:
+        return groups
+    state = PartitionState(
+        groups,
+        target_size,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    )
+    initial = state.components()
+    ladder = temperatures(replicas or TEMPERING_REPLICAS)
+
+    roster = SharedRoster(groups, target_size, diversity, constraints, pairing)
+    seed = random.randrange(2**32)
+    connections: List[Connection] = []
+    workers = []
+    try:
+        for k in range(len(ladder)):
+            parent_end, worker_end = _CONTEXT.Pipe()
+            worker = _CONTEXT.Process(
+                target=_replica_worker,
+                args=(roster.handle, seed + k, worker_end),
+                daemon=True,
+            )
+            worker.start()
+            worker_end.close()
+            connections.append(parent_end)
+            workers.append(worker)
+
+        # Worker running at each temperature of the ladder
+        at = list(range(len(ladder)))
+        best = (state.violations, -state.total)
+        best_worker = None
+        rounds = 0
+        accepted_moves = 0
+        exchanges = 0
+        stop_reason = "max_iterations"
+        while rounds < max_iterations:
+            if cancel_token is not None and cancel_token.cancelled:
+                stop_reason = "cancelled"
+                break
+            # Worker start-up counts against the limit, but every replica
+            # gets at least one round
+            if rounds and time.perf_counter() > deadline:
+                stop_reason = "time_limit"
+                break
+
+            for t, w in enumerate(at):
+                connections[w].send(ladder[t])
+            reports = [conn.recv() for conn in connections]
+            rounds += 1
+            for w, (_, _, total, violations, imbalance, accepted) in enumerate(reports):
+                accepted_moves += accepted
+                if (violations, -total) < best:
+                    best = (violations, -total)
+                    best_worker = w
+                    if telemetry is not None:
+                        telemetry.record_score(total, imbalance)
+
+            for t in range(rounds % 2, len(ladder) - 1, 2):
+                cold, hot = at[t], at[t + 1]
+                cold_total, cold_violations, *_ = reports[cold]
+                hot_total, hot_violations, *_ = reports[hot]
+                if hot_violations != cold_violations:
+                    swap = hot_violations < cold_violations
+                else:
+                    exponent = (hot_total - cold_total) * (
+                        1 / ladder[t] - 1 / ladder[t + 1]
+                    )
+                    swap = exponent >= 0 or random.random() < math.exp(exponent)
+                if swap:
+                    at[t], at[t + 1] = hot, cold
+                    exchanges += 1
+
+        assignments = []
+        for conn in connections:
+            conn.send(None)
+            assignments.append(conn.recv())
+    finally:
+        for conn in connections:
+            conn.close()
+        for worker in workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        roster.close()
+
+    seconds = time.perf_counter() - phase_start
+    if stop_reason == "cancelled":
+        if telemetry is not None:
+            telemetry.iterations += rounds
+            telemetry.stop_reason = stop_reason
+            telemetry.add_phase("tempering", seconds)
+        cancel_token.raise_if_cancelled()
+
+    result = groups
+    if best_worker is not None:
+        result = roster.to_groups(assignments[best_worker])
+    final = PartitionState(
+        result,
+        target_size,
+        diversity=diversity,
+        constraints=constraints,
+        pairing=pairing,
+    ).components()
+    logger.info(
+        f"Parallel tempering finished ({stop_reason}) after {rounds} rounds of "
+        f"{len(ladder)} replicas: score {initial['total']:.3f} -> "
+        f"{final['total']:.3f}, {exchanges} exchanges"
+    )
+    record_span(
+        "tempering",
+        phase_start,
+        seconds,
+        members=len(state.members),
+        replicas=len(ladder),
+        rounds=rounds,
+        exchanges=exchanges,
+        stop_reason=stop_reason,
+    )
+    if telemetry is not None:
+        telemetry.roster_size = len(state.members)
+        telemetry.num_groups = len(result)
+        telemetry.iterations += rounds
+        telemetry.accepted_moves += accepted_moves
+        telemetry.stop_reason = stop_reason
+        telemetry.add_phase("tempering", seconds)
+        telemetry.score_components = final
+        telemetry.score_improvements = score_improvements(initial, final)
+        telemetry.constraint_violations = best[0]
+    return result
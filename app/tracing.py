@@ -0,0 +1,209 @@
+"""Lightweight request tracing with a local JSON-lines exporter.
+
+A trace is started for sampled requests to the paths in TRACED_PATHS. Code
+running inside the request (including worker threads, which inherit the
+context) adds spans with ``span()`` or ``record_span()``; outside a sampled
+trace both are no-ops. Finished traces are appended to ``traces.jsonl`` in the
+data directory, one JSON object per line, so no external collector is needed.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .database import get_data_dir
+
+# Fraction of requests to traced paths that are recorded
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+
+TRACED_PATHS = {"/", "/groups/generate", "/members/search"}
+
+
+@dataclass
+class Span:
+    span_id: str
+    parent_id: str | None
+    name: str
+    start_offset_ms: float
+    duration_ms: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    name: str
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: float = field(default_factory=time.time)
+    start: float = field(default_factory=time.perf_counter)
+    duration_ms: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    spans: List[Span] = field(default_factory=list)
+
+    def offset_ms(self, perf_time: float) -> float:
+        return (perf_time - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        del data["start"]
+        return data
+
+
+class JsonLinesExporter:
+    """Append finished traces to a JSON-lines file."""
+
+    def __init__(self, path: Path | None = None) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path or get_data_dir() / "traces.jsonl"
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError:
+            logger.exception(f"Could not export trace to {self.path}")
+
+
+exporter = JsonLinesExporter()
+
+_current_trace: ContextVar[Trace | None] = ContextVar("trace", default=None)
+_current_span_id: ContextVar[str | None] = ContextVar("span_id", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name: str, sample_rate: float | None = None, **attributes):
+    """Start a trace for the enclosed block if it is sampled.
+
+    :param name: Name of the root operation, e.g. "POST /groups/generate"
+    :param sample_rate: Probability of recording; defaults to TRACE_SAMPLE_RATE
+    :param attributes: Attributes attached to the trace
+    :yield: The Trace, or None if this request is not sampled
+    """
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if random.random() >= rate:
+        yield None
+        return
+
+    trace = Trace(name=name, attributes=attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span_id.set(None)
+    try:
+        yield trace
+    finally:
+        trace.duration_ms = trace.offset_ms(time.perf_counter())
+        _current_span_id.reset(span_token)
+        _current_trace.reset(trace_token)
+        exporter.export(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record the enclosed block as a child of the current span.
+
+    :yield: The Span (attributes may be added to it), or None when not tracing
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    start = time.perf_counter()
+    new_span = Span(
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=_current_span_id.get(),
+        name=name,
+        start_offset_ms=trace.offset_ms(start),
+        attributes=attributes,
+    )
+    token = _current_span_id.set(new_span.span_id)
+    try:
+        yield new_span
+    finally:
+        _current_span_id.reset(token)
+        new_span.duration_ms = (time.perf_counter() - start) * 1000
+        trace.spans.append(new_span)
+
+
+def record_span(name: str, start: float, seconds: float, **attributes) -> None:
+    """Record an interval that has already finished as a child of the current span.
+
+    :param name: Span name
+    :param start: time.perf_counter() value at the start of the interval
+    :param seconds: Duration of the interval
+    :param attributes: Span attributes
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace.spans.append(
+        Span(
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=_current_span_id.get(),
+            name=name,
+            start_offset_ms=trace.offset_ms(start),
+            duration_ms=seconds * 1000,
+            attributes=attributes,
+        )
+    )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace.get() is not None:
+        conn.info.setdefault("trace_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("trace_query_start")
+    if _current_trace.get() is None or not starts:
+        return
+    start = starts.pop()
+    record_span(
+        "db.query",
+        start,
+        time.perf_counter() - start,
+        statement=statement.strip().splitlines()[0][:200],
+        executemany=executemany,
+    )
+
+
+def install(app: FastAPI) -> None:
+    """Register the tracing middleware on ``app``."""
+
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        if request.url.path not in TRACED_PATHS:
+            return await call_next(request)
+
+        name = f"{request.method} {request.url.path}"
+        with start_trace(name, method=request.method, path=request.url.path) as trace:
+            with span("handler"):
+                response = await call_next(request)
+            if trace is not None:
+                trace.attributes["status_code"] = response.status_code
+                response.headers["X-Trace-Id"] = trace.trace_id
+            return response
@@ -0,0 +1,384 @@
+"""Benchmark the grouping engine on seeded synthetic rosters.
+
+Examples::
+
+    python benchmarks/bench_grouping.py --scale realistic --output bench.json
+    python benchmarks/bench_grouping.py --sizes 1000 10000 --engines greedy \\
+        --baseline benchmarks/baseline.json
+
+Every (profile, size, engine) combination is timed over ``--repeat`` runs
+without tracing, then run once more under tracemalloc to measure peak memory.
+Results are written as JSON; passing ``--baseline`` compares against an earlier
+results file and exits non-zero when a run got slower than ``--tolerance``.
+``--memory-top N`` adds a memory report to each engine result listing the N
+call sites holding the most memory at the end of the run and after it.
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from loguru import logger
+
+from app.diversity import DEFAULT_DIVERSITY
+from app.engines import ENGINES, run_engine
+from app.group_divider import (
+    balance_gender_in_groups,
+    divide_into_groups,
+    partition_averages,
+)
+from app.profiling import MemoryTracker
+from app.telemetry import OptimizerTelemetry
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+SCALES = {
+    "realistic": [10, 30, 100],
+    "large": [300, 1000],
+    "extreme": [3000, 10_000],
+}
+
+
+def num_groups_for(size: int, target_size: int) -> int:
+    """Number of groups /groups/generate would request for a roster."""
+    return max(1, (size + target_size - 1) // target_size)
+
+
+def bench_engine(
+    engine: str,
+    profile: Profile,
+    size: int,
+    seed: int,
+    repeat: int,
+    target_size: int,
+    max_iterations: int,
+    time_limit: float,
+    memory_top: int = 0,
+) -> Dict:
+    """Time one engine on one roster and measure its peak memory.
+
+    With ``memory_top`` > 0 the result includes a full MemoryReport.
+    """
+    members = synthetic_roster(profile, size, seed)
+    num_groups = num_groups_for(size, target_size)
+
+    def run() -> OptimizerTelemetry:
+        random.seed(seed)
+        telemetry = OptimizerTelemetry()
+        run_engine(
+            engine,
+            members,
+            num_groups,
+            target_size=target_size,
+            max_iterations=max_iterations,
+            telemetry=telemetry,
+            time_limit=time_limit,
+        )
+        return telemetry
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        telemetry = run()
+        times.append(time.perf_counter() - start)
+
+    with MemoryTracker(top=memory_top) as tracker:
+        run()
+    memory = tracker.report
+
+    result = {
+        "kind": "engine",
+        "engine": engine,
+        "profile": profile.value,
+        "size": size,
+        "seed": seed,
+        "num_groups": telemetry.num_groups,
+        "median_seconds": statistics.median(times),
+        "min_seconds": min(times),
+        "peak_memory_bytes": memory.peak_bytes,
+        "retained_memory_bytes": memory.retained_bytes,
+        "gc_collections": memory.gc_collections,
+        "iterations": telemetry.iterations,
+        "accepted_moves": telemetry.accepted_moves,
+        "stop_reason": telemetry.stop_reason,
+        "phase_seconds": telemetry.phase_seconds,
+        "score": telemetry.score_components,
+    }
+    if memory_top:
+        result["memory"] = memory.to_dict()
+    return result
+
+
+def bench_balancer(
+    profile: Profile,
+    size: int,
+    seed: int,
+    repeat: int,
+    target_size: int,
+    max_iterations: int,
+    time_limit: float,
+) -> Dict:
+    """Time balance_gender_in_groups alone on a fixed initial placement."""
+    members = synthetic_roster(profile, size, seed)
+    random.seed(seed)
+    initial = divide_into_groups(
+        members,
+        num_groups_for(size, target_size),
+        max_iterations=0,
+        target_size=target_size,
+    )
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        balance_gender_in_groups(
+            initial,
+            max_iterations=max_iterations,
+            target_size=target_size,
+            time_limit=time_limit,
+        )
+        times.append(time.perf_counter() - start)
+
+    return {
+        "kind": "balance_gender_in_groups",
+        "profile": profile.value,
+        "size": size,
+        "seed": seed,
+        "median_seconds": statistics.median(times),
+        "min_seconds": min(times),
+    }
+
+
+def bench_scoring(
+    profile: Profile, size: int, seed: int, repeat: int, target_size: int
+) -> Dict:
+    """Measure Group.calculate_diversity_score throughput on a placement."""
+    members = synthetic_roster(profile, size, seed)
+    random.seed(seed)
+    groups = divide_into_groups(
+        members,
+        num_groups_for(size, target_size),
+        max_iterations=0,
+        target_size=target_size,
+    )
+    averages = partition_averages(groups)
+    kernel = DEFAULT_DIVERSITY.compile(members)
+
+    def score_all(shared_averages, compiled) -> None:
+        for group in groups:
+            if shared_averages is None:
+                group.calculate_diversity_score(groups, target_size)
+            else:
+                group.diversity_components(
+                    groups, target_size, shared_averages, kernel=compiled
+                )
+
+    results = {}
+    for label, shared, compiled in (
+        ("per_group", None, None),
+        ("shared_averages", averages, None),
+        ("compiled_kernel", averages, kernel),
+    ):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            score_all(shared, compiled)
+            times.append(time.perf_counter() - start)
+        results[label] = len(groups) / statistics.median(times)
+
+    return {
+        "kind": "calculate_diversity_score",
+        "profile": profile.value,
+        "size": size,
+        "seed": seed,
+        "num_groups": len(groups),
+        "groups_per_second": results,
+    }
+
+
+def result_key(result: Dict) -> tuple:
+    return (
+        result["kind"],
+        result.get("engine"),
+        result["profile"],
+        result["size"],
+        result["seed"],
+    )
+
+
+def compare_to_baseline(
+    results: List[Dict],
+    baseline: List[Dict],
+    tolerance: float,
+    min_seconds: float = 0.005,
+) -> List[str]:
+    """Describe runs that regressed against a baseline results file.
+
+    :param results: Results of this run
+    :param baseline: Results loaded from the baseline file
+    :param tolerance: Allowed slowdown factor before a run counts as regressed
+    :param min_seconds: Runs faster than this are too noisy to flag
+    :return: Human-readable regression descriptions
+    """
+    baseline_by_key = {result_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_by_key.get(result_key(result))
+        if base is None or "median_seconds" not in result:
+            continue
+        ratio = result["median_seconds"] / max(base["median_seconds"], 1e-9)
+        result["baseline_ratio"] = ratio
+        if ratio > tolerance and result["median_seconds"] >= min_seconds:
+            regressions.append(
+                f"{result_key(result)}: {ratio:.2f}x slower "
+                f"({base['median_seconds']:.4f}s -> {result['median_seconds']:.4f}s)"
+            )
+        if "score" in result and "score" in base:
+            delta = result["score"]["total"] - base["score"]["total"]
+            result["baseline_score_delta"] = delta
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grouping engine")
+    parser.add_argument(
+        "--scale",
+        choices=list(SCALES) + ["all"],
+        default="realistic",
+        help="Preset roster sizes to run",
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", help="Explicit roster sizes (overrides --scale)"
+    )
+    parser.add_argument(
+        "--profiles",
+        type=Profile,
+        nargs="+",
+        choices=list(Profile),
+        default=list(Profile),
+    )
+    parser.add_argument(
+        "--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES)
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--target-size", type=int, default=7)
+    parser.add_argument("--max-iterations", type=int, default=10_000)
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=10.0,
+        help="Wall-clock budget per optimizer run in seconds",
+    )
+    parser.add_argument(
+        "--memory-top",
+        type=int,
+        default=0,
+        help="Include a memory report with this many call sites per engine run",
+    )
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument("--baseline", type=Path, help="Results JSON to compare to")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.005,
+        help="Ignore slowdowns of runs faster than this",
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if args.sizes:
+        sizes = args.sizes
+    elif args.scale == "all":
+        sizes = [size for scale in SCALES.values() for size in scale]
+    else:
+        sizes = SCALES[args.scale]
+
+    results = []
+    for profile in args.profiles:
+        for size in sizes:
+            for engine in args.engines:
+                result = bench_engine(
+                    engine,
+                    profile,
+                    size,
+                    args.seed,
+                    args.repeat,
+                    args.target_size,
+                    args.max_iterations,
+                    args.time_limit,
+                    args.memory_top,
+                )
+                results.append(result)
+                print(
+                    f"{profile.value:>10} {size:>6} {engine:>12} "
+                    f"{result['median_seconds']:9.4f}s "
+                    f"{result['peak_memory_bytes'] / 1e6:8.2f}MB "
+                    f"score={result['score'].get('total', 0.0):9.3f} "
+                    f"stop={result['stop_reason']}"
+                )
+                for site in result.get("memory", {}).get("allocations", []):
+                    print(
+                        f"{'':>30}{site['size_bytes'] / 1e3:10.1f}kB "
+                        f"{site['count']:>7} blocks  {site['site']}"
+                    )
+            results.append(
+                bench_balancer(
+                    profile,
+                    size,
+                    args.seed,
+                    args.repeat,
+                    args.target_size,
+                    args.max_iterations,
+                    args.time_limit,
+                )
+            )
+            results.append(
+                bench_scoring(profile, size, args.seed, args.repeat, args.target_size)
+            )
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "args": {
+                k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+            },
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare_to_baseline(
+            results, baseline, args.tolerance, args.min_seconds
+        )
+        report["regressions"] = regressions
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, default=str))
+        print(f"Wrote {len(results)} results to {args.output}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Load test simulating the check-in rush at the start of a meeting.
+
+Examples::
+
+    python benchmarks/load_test.py --phones 8 --duration 30 --size 300
+    python benchmarks/load_test.py --serve --workers 4 --output load.json
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 \\
+        --db data/small_group.db
+
+A fresh database is generated with populate_db (``--size`` members and
+``--weeks`` of history ending last week, so nobody has checked in today yet).
+``--phones`` clients then loop for ``--duration`` seconds: search for a member
+by name, check them in, pause. After ``--generate-at`` seconds an organizer
+presses "generate groups" ``--clicks`` times at once.
+
+By default the app runs in-process through httpx's ASGI transport. ``--serve``
+starts a local uvicorn (optionally with several ``--workers``, which is where
+SQLite lock contention shows up) and ``--base-url`` targets a server that is
+already running against ``--db``.
+
+The report has client-side latency quantiles and error rates per endpoint plus
+the server's lock waits and lock errors from /debug/request-metrics. With
+several workers that snapshot comes from whichever worker answers it. Lock
+waits are only timed with SQLITE_LOCK_TIMING, which the in-process and
+``--serve`` runs turn on; start a ``--base-url`` server with it set.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from loguru import logger
+from sqlalchemy import select
+
+from app.models import Member
+from app.telemetry import percentile
+from scripts.populate_db import Profile, bulk_populate, create_fresh_database
+
+Roster = List[Tuple[int, str]]
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    seconds: float
+    status: int | None
+    error: str | None = None
+
+
+class LoadResults:
+    """Client-side samples of one load test run."""
+
+    def __init__(self) -> None:
+        self.samples: List[Sample] = []
+
+    async def timed(self, client: httpx.AsyncClient, endpoint: str, **kwargs):
+        """Send ``endpoint`` ("METHOD /path") and record its latency."""
+        method, path = endpoint.split(" ", 1)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.samples.append(
+                Sample(endpoint, time.perf_counter() - start, None, repr(e))
+            )
+            return None
+        self.samples.append(
+            Sample(endpoint, time.perf_counter() - start, response.status_code)
+        )
+        return response
+
+    def summary(self) -> Dict[str, Dict]:
+        by_endpoint: Dict[str, List[Sample]] = {}
+        for sample in self.samples:
+            by_endpoint.setdefault(sample.endpoint, []).append(sample)
+
+        summary = {}
+        for endpoint, samples in sorted(by_endpoint.items()):
+            times = sorted(s.seconds * 1000 for s in samples)
+            errors = sum(1 for s in samples if s.status is None or s.status >= 500)
+            summary[endpoint] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "p50_ms": percentile(times, 0.5),
+                "p95_ms": percentile(times, 0.95),
+                "p99_ms": percentile(times, 0.99),
+                "max_ms": times[-1],
+            }
+        return summary
+
+
+def prepare_database(
+    path: Path, profile: Profile, size: int, weeks: int, seed: int
+) -> Roster:
+    """Create a seeded database at ``path`` and return (id, name) of its members."""
+    engine = create_fresh_database(path)
+    bulk_populate(
+        engine,
+        profile,
+        size=size,
+        weeks=weeks,
+        seed=seed,
+        end=date.today() - timedelta(weeks=1),
+    )
+    return load_roster(path)
+
+
+def load_roster(path: Path) -> Roster:
+    from app.database import get_engine
+
+    with get_engine(path).connect() as conn:
+        rows = conn.execute(select(Member.id, Member.surname, Member.given_name))
+        return [(member_id, surname + given) for member_id, surname, given in rows]
+
+
+async def phone(
+    client: httpx.AsyncClient,
+    results: LoadResults,
+    roster: Roster,
+    deadline: float,
+    think: float,
+    rng: random.Random,
+) -> None:
+    """One phone at the door: find a member by name, then check them in."""
+    today = date.today().isoformat()
+    while time.perf_counter() < deadline:
+        member_id, name = rng.choice(roster)
+        await results.timed(client, "POST /members/search", data={"query": name[:2]})
+        await results.timed(
+            client,
+            "POST /attendance/record",
+            data={"member_id": member_id, "attendance_date": today, "present": "true"},
+        )
+        await asyncio.sleep(rng.expovariate(1 / think) if think > 0 else 0)
+
+
+async def organizer(
+    client: httpx.AsyncClient,
+    results: LoadResults,
+    delay: float,
+    clicks: int,
+    target_size: int,
+) -> None:
+    """Press "generate groups" ``clicks`` times at once after ``delay`` seconds."""
+    await asyncio.sleep(delay)
+    await asyncio.gather(
+        *(
+            results.timed(
+                client, "POST /groups/generate", data={"target_size": target_size}
+            )
+            for _ in range(clicks)
+        )
+    )
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    roster: Roster,
+    phones: int = 8,
+    duration: float = 30.0,
+    generate_at: float | None = None,
+    clicks: int = 2,
+    think: float = 0.5,
+    target_size: int = 7,
+    seed: int = 0,
+) -> Dict:
+    """Drive the check-in rush against ``client`` and return the report.
+
+    :param client: Client for the app under test
+    :param roster: (id, name) of the members that can check in
+    :param phones: Number of concurrent check-in clients
+    :param duration: Seconds the phones keep checking people in
+    :param generate_at: Seconds after the start at which groups are generated;
+        defaults to two thirds of ``duration``
+    :param clicks: Concurrent /groups/generate presses
+    :param think: Mean pause between check-ins of one phone in seconds
+    :param target_size: Target group size sent to /groups/generate
+    :param seed: Seed for the phones' choices
+    :return: Dict with client-side and server-side metrics per endpoint
+    """
+    results = LoadResults()
+    generate_at = duration * 2 / 3 if generate_at is None else generate_at
+    start = time.perf_counter()
+    deadline = start + duration
+
+    await asyncio.gather(
+        organizer(client, results, generate_at, clicks, target_size),
+        *(
+            phone(
+                client, results, roster, deadline, think, random.Random(seed * 1000 + i)
+            )
+            for i in range(phones)
+        ),
+    )
+    elapsed = time.perf_counter() - start
+
+    server = await client.get("/debug/request-metrics")
+    return {
+        "elapsed_seconds": elapsed,
+        "requests_per_second": len(results.samples) / elapsed,
+        "endpoints": results.summary(),
+        "server": server.json() if server.status_code == 200 else {},
+    }
+
+
+async def run_in_process(db_path: Path, **kwargs) -> Dict:
+    from app import app, database, instrumentation
+
+    lock_timing = instrumentation.SQLITE_LOCK_TIMING
+    instrumentation.SQLITE_LOCK_TIMING = True
+    try:
+        database.init_db(db_path)
+        instrumentation.request_metrics.clear()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadtest", timeout=60
+        ) as client:
+            return await run_load(client, load_roster(db_path), **kwargs)
+    finally:
+        instrumentation.SQLITE_LOCK_TIMING = lock_timing
+
+
+async def run_against(base_url: str, db_path: Path, **kwargs) -> Dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        return await run_load(client, load_roster(db_path), **kwargs)
+
+
+def start_server(db_path: Path, port: int, workers: int) -> subprocess.Popen:
+    """Start uvicorn on ``db_path`` and wait until it answers."""
+    env = {**os.environ, "DB_PATH": str(db_path), "SQLITE_LOCK_TIMING": "1"}
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=Path(__file__).parent.parent,
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/debug/request-metrics", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def print_report(report: Dict) -> None:
+    print(
+        f"{report['elapsed_seconds']:.1f}s, "
+        f"{report['requests_per_second']:.1f} requests/s"
+    )
+    for endpoint, stats in report["endpoints"].items():
+        server = report["server"].get(endpoint, {})
+        print(
+            f"{endpoint:<26} n={stats['requests']:>6} "
+            f"err={stats['error_rate']:6.2%} "
+            f"p50={stats['p50_ms']:8.1f}ms p95={stats['p95_ms']:8.1f}ms "
+            f"p99={stats['p99_ms']:8.1f}ms "
+            f"lock_waits={server.get('lock_waits', 0):>5} "
+            f"({server.get('lock_wait_ms', 0.0):.0f}ms) "
+            f"lock_errors={server.get('lock_errors', 0)}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a check-in rush")
+    parser.add_argument("--phones", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--generate-at", type=float)
+    parser.add_argument("--clicks", type=int, default=2)
+    parser.add_argument("--think", type=float, default=0.5)
+    parser.add_argument("--target-size", type=int, default=7)
+    parser.add_argument(
+        "--profile", type=Profile, choices=list(Profile), default=Profile.TYPICAL
+    )
+    parser.add_argument("--size", type=int, default=300)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db",
+        type=Path,
+        help="Database to use; generated unless --base-url is given",
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--base-url", help="Test an already running server")
+    target.add_argument(
+        "--serve", action="store_true", help="Start a local uvicorn to test"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", type=Path, help="Write the report JSON here")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if args.base_url and not args.db:
+        parser.error("--base-url needs --db to read the member roster from")
+    db_path = args.db or Path(tempfile.mkdtemp()) / "load_test.db"
+    if not args.base_url:
+        print(f"Generating {args.size} members into {db_path}")
+        prepare_database(db_path, args.profile, args.size, args.weeks, args.seed)
+
+    load_args = dict(
+        phones=args.phones,
+        duration=args.duration,
+        generate_at=args.generate_at,
+        clicks=args.clicks,
+        think=args.think,
+        target_size=args.target_size,
+        seed=args.seed,
+    )
+    if args.base_url:
+        report = asyncio.run(run_against(args.base_url, db_path, **load_args))
+    elif args.serve:
+        server = start_server(db_path, args.port, args.workers)
+        try:
+            report = asyncio.run(
+                run_against(f"http://127.0.0.1:{args.port}", db_path, **load_args)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        report = asyncio.run(run_in_process(db_path, **load_args))
+
+    report["meta"] = {
+        "args": {
+            k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+        }
+    }
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, default=str))
+        print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
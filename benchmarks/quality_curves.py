@@ -0,0 +1,326 @@
+"""Compare engines by solution quality over wall-clock time.
+
+Examples::
+
+    python benchmarks/quality_curves.py --sizes 30 100 --budget 5 \\
+        --output curves.json
+    python benchmarks/quality_curves.py --format csv --output curves.csv
+
+The CSV format writes the curves to ``--output`` and the time-to-target
+summary, with the suggested budgets, to ``<stem>-summary.csv`` next to it.
+
+Each engine is run on the same seeded rosters with tracing enabled, so every
+new incumbent partition is scored with the full diversity score. The traces
+are turned into step curves sampled on a shared time grid, and a summary
+reports how long each engine needed to get within ``--target-gap`` of the best
+score any engine found for that roster. The suggested budget per roster size
+is the slowest time-to-target over all seeds of the fastest engine.
+"""
+
+import argparse
+import csv
+import json
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from loguru import logger
+
+from app.engines import ENGINES, run_engine
+from app.telemetry import OptimizerTelemetry
+from benchmarks.bench_grouping import num_groups_for
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+
+def trace_engine(
+    engine: str,
+    profile: Profile,
+    size: int,
+    seed: int,
+    budget: float,
+    target_size: int,
+) -> List[Tuple[float, float]]:
+    """Run an engine once and return its (seconds, incumbent score) trace."""
+    members = synthetic_roster(profile, size, seed)
+    random.seed(seed)
+    telemetry = OptimizerTelemetry(trace_enabled=True)
+    run_engine(
+        engine,
+        members,
+        num_groups_for(size, target_size),
+        target_size=target_size,
+        max_iterations=10**9,
+        telemetry=telemetry,
+        time_limit=budget,
+    )
+    return [(seconds, score) for seconds, score, _ in telemetry.trace]
+
+
+def sample_curve(
+    trace: List[Tuple[float, float]], grid: List[float]
+) -> List[float | None]:
+    """Incumbent score at each grid time, None before the first sample.
+
+    The incumbent is what the engine would return if stopped at that time.
+    """
+    curve = []
+    current = None
+    i = 0
+    for t in grid:
+        while i < len(trace) and trace[i][0] <= t:
+            current = trace[i][1]
+            i += 1
+        curve.append(current)
+    return curve
+
+
+def time_to_target(trace: List[Tuple[float, float]], target: float) -> float | None:
+    """First time the trace reached ``target``, or None if it never did."""
+    for seconds, score in trace:
+        if score >= target:
+            return seconds
+    return None
+
+
+def time_grid(budget: float, points: int) -> List[float]:
+    """Log-spaced sample times from 1ms up to the budget."""
+    start = min(1e-3, budget)
+    ratio = (budget / start) ** (1 / max(points - 1, 1))
+    return [start * ratio**i for i in range(points)]
+
+
+def run_comparison(
+    engines: List[str],
+    profiles: List[Profile],
+    sizes: List[int],
+    seeds: List[int],
+    budget: float,
+    target_gap: float,
+    target_size: int = 7,
+    points: int = 40,
+) -> Dict:
+    """Trace every engine on every roster and summarize time-to-target.
+
+    :param engines: Engine names to compare
+    :param profiles: populate_db profiles to draw rosters from
+    :param sizes: Roster sizes
+    :param seeds: Roster seeds; each seed is a different roster
+    :param budget: Time budget per run in seconds
+    :param target_gap: Relative gap to the best known score that counts as
+        reaching the target
+    :param target_size: Target size for each group
+    :param points: Number of samples on the time grid
+    :return: Dict with the time grid, curves and a summary
+    """
+    grid = time_grid(budget, points)
+    curves = []
+    summary = []
+
+    for profile in profiles:
+        for size in sizes:
+            for seed in seeds:
+                traces = {
+                    engine: trace_engine(
+                        engine, profile, size, seed, budget, target_size
+                    )
+                    for engine in engines
+                }
+                best_known = max(score for t in traces.values() for _, score in t)
+                target = best_known - target_gap * max(1.0, abs(best_known))
+
+                for engine, trace in traces.items():
+                    curves.append(
+                        {
+                            "engine": engine,
+                            "profile": profile.value,
+                            "size": size,
+                            "seed": seed,
+                            "score": sample_curve(trace, grid),
+                        }
+                    )
+                    summary.append(
+                        {
+                            "engine": engine,
+                            "profile": profile.value,
+                            "size": size,
+                            "seed": seed,
+                            "final_score": trace[-1][1],
+                            "best_known_score": best_known,
+                            "target_score": target,
+                            "time_to_target": time_to_target(trace, target),
+                        }
+                    )
+
+    return {
+        "grid_seconds": grid,
+        "curves": curves,
+        "summary": summary,
+        "suggested_budgets": suggest_budgets(summary),
+    }
+
+
+def suggest_budgets(summary: List[Dict]) -> Dict[int, Dict]:
+    """Pick the fastest engine per roster size that reached the target on every
+    roster, and the budget it needed in the worst case."""
+    by_size: Dict[int, Dict[str, List[float | None]]] = {}
+    for row in summary:
+        by_size.setdefault(row["size"], {}).setdefault(row["engine"], []).append(
+            row["time_to_target"]
+        )
+
+    suggestions = {}
+    for size, engines in sorted(by_size.items()):
+        reliable = {
+            engine: max(times)
+            for engine, times in engines.items()
+            if all(t is not None for t in times)
+        }
+        if reliable:
+            engine = min(reliable, key=reliable.get)
+            suggestions[size] = {"engine": engine, "budget_seconds": reliable[engine]}
+    return suggestions
+
+
+def summary_path(path: Path) -> Path:
+    """Path of the summary CSV written next to the curves CSV ``path``."""
+    return path.with_name(f"{path.stem}-summary.csv")
+
+
+def write_csv(report: Dict, path: Path) -> None:
+    """Write curves in long format: one row per (run, grid time), and the
+    summary to :func:`summary_path`: one row per run, with the budget
+    suggested for its roster size."""
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["engine", "profile", "size", "seed", "seconds", "score"])
+        for curve in report["curves"]:
+            for seconds, score in zip(report["grid_seconds"], curve["score"]):
+                writer.writerow(
+                    [
+                        curve["engine"],
+                        curve["profile"],
+                        curve["size"],
+                        curve["seed"],
+                        f"{seconds:.6f}",
+                        "" if score is None else f"{score:.6f}",
+                    ]
+                )
+
+    with summary_path(path).open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            [
+                "engine",
+                "profile",
+                "size",
+                "seed",
+                "final_score",
+                "best_known_score",
+                "target_score",
+                "time_to_target",
+                "suggested_engine",
+                "suggested_budget_seconds",
+            ]
+        )
+        for row in report["summary"]:
+            suggestion = report["suggested_budgets"].get(row["size"])
+            writer.writerow(
+                [
+                    row["engine"],
+                    row["profile"],
+                    row["size"],
+                    row["seed"],
+                    f"{row['final_score']:.6f}",
+                    f"{row['best_known_score']:.6f}",
+                    f"{row['target_score']:.6f}",
+                    (
+                        ""
+                        if row["time_to_target"] is None
+                        else f"{row['time_to_target']:.6f}"
+                    ),
+                    "" if suggestion is None else suggestion["engine"],
+                    (
+                        ""
+                        if suggestion is None
+                        else f"{suggestion['budget_seconds']:.6f}"
+                    ),
+                ]
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Quality-versus-time curves for grouping engines"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 30, 100])
+    parser.add_argument(
+        "--profiles",
+        type=Profile,
+        nargs="+",
+        choices=list(Profile),
+        default=[Profile.TYPICAL, Profile.IMBALANCED],
+    )
+    parser.add_argument(
+        "--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES)
+    )
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument(
+        "--budget", type=float, default=5.0, help="Seconds per engine run"
+    )
+    parser.add_argument(
+        "--target-gap",
+        type=float,
+        default=0.01,
+        help="Relative gap to the best known score that counts as on target",
+    )
+    parser.add_argument("--target-size", type=int, default=7)
+    parser.add_argument("--points", type=int, default=40)
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--output", type=Path, help="Write the report here")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    report = run_comparison(
+        args.engines,
+        args.profiles,
+        args.sizes,
+        args.seeds,
+        args.budget,
+        args.target_gap,
+        target_size=args.target_size,
+        points=args.points,
+    )
+
+    for row in report["summary"]:
+        ttt = row["time_to_target"]
+        print(
+            f"{row['profile']:>10} {row['size']:>6} seed={row['seed']} "
+            f"{row['engine']:>12} final={row['final_score']:9.3f} "
+            f"best={row['best_known_score']:9.3f} "
+            f"time_to_target={'never' if ttt is None else f'{ttt:.4f}s'}"
+        )
+    for size, suggestion in report["suggested_budgets"].items():
+        print(
+            f"size {size}: {suggestion['engine']} within "
+            f"{suggestion['budget_seconds']:.4f}s"
+        )
+
+    if args.output:
+        if args.format == "csv":
+            write_csv(report, args.output)
+        else:
+            args.output.write_text(json.dumps(report, indent=2))
+        print(f"Wrote report to {args.output}")
+        if args.format == "csv":
+            print(f"Wrote summary to {summary_path(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Seeded synthetic rosters built from the populate_db profiles."""
+
+import random
+import sys
+from pathlib import Path
+from typing import List
+
+# Add the parent directory to the path so we can import the app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.group_divider import GroupMember, MemberRole
+from scripts.populate_db import Profile, generate_member_rows
+
+
+def synthetic_roster(
+    profile: Profile = Profile.TYPICAL,
+    size: int = 30,
+    seed: int = 0,
+    prep_rate: float = 0.2,
+) -> List[GroupMember]:
+    """Build a reproducible roster of present members.
+
+    :param profile: populate_db profile whose role/education mix is used
+    :param size: Number of members
+    :param seed: Seed for the random number generator
+    :param prep_rate: Fraction of members marked as having attended prep
+    :return: List of present GroupMembers with ids 1..size
+    """
+    rng = random.Random(seed)
+    rows = generate_member_rows(profile, size=size, rng=rng)
+    return [
+        GroupMember(
+            id=i,
+            surname=row["surname"],
+            given_name=row["given_name"],
+            role=MemberRole.from_db_role(row["role"]),
+            gender=row["gender"],
+            faith_status=row["faith_status"],
+            education_status=row["education_status"],
+            is_graduated=row["education_status"] == "graduated",
+            is_present=True,
+            prep_attended=rng.random() < prep_rate,
+        )
+        for i, row in enumerate(rows, 1)
+    ]
@@ -1,18 +1,33 @@
-"""Script to populate the database with mock data."""
+"""Script to populate the database with mock data.
+
+Examples::
+
+    python scripts/populate_db.py --profile typical
+    python scripts/populate_db.py --profile typical --size 100000 --weeks 156 \
+        --seed 1 --output data/load-100k.db
+
+Without ``--size`` the profile's own member counts are used. Members and
+attendance are written with Core ``executemany`` inserts in batches of
+``--batch-size`` rows, so large databases are generated in bounded memory.
+"""
 
 from datetime import date, timedelta
 import random
 from pathlib import Path
 import sys
-from dataclasses import dataclass
-from typing import List, Dict, Optional
+import time
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator, List, Dict, Optional
 from enum import Enum
 
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+
 # Add the parent directory to the path so we can import the app
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app.database import get_db
-from app.models import Member, Attendance
+from app import database
+from app.models import Base, Member, Attendance, GroupCap, GroupHistory, MemberPair
 
 
 class Profile(str, Enum):
@@ -239,94 +254,222 @@ PROFILES = {
 }
 
 
-def create_mock_members(profile: Profile = Profile.DEFAULT):
-    """Create mock members based on the specified profile."""
-    db = next(get_db())
-    created_members = []
+def scale_profile(profile: Profile, size: int | None = None) -> List[MemberProfile]:
+    """Scale a profile's member counts to a roster of ``size`` members.
+
+    The proportions of the profile are kept; rounding leftovers go to the
+    largest entry so the counts always add up to ``size``.
+
+    :param profile: Profile whose mix should be reproduced
+    :param size: Desired roster size; None keeps the profile's own counts
+    :return: Member profiles with scaled counts
+    """
     profile_config = PROFILES[profile]
+    if size is None:
+        return profile_config
+
+    base_total = sum(p.count for p in profile_config)
+    counts = [size * p.count // base_total for p in profile_config]
+    largest = max(range(len(counts)), key=lambda i: profile_config[i].count)
+    counts[largest] += size - sum(counts)
+    return [replace(p, count=count) for p, count in zip(profile_config, counts)]
+
+
+def generate_member_rows(
+    profile: Profile = Profile.DEFAULT,
+    size: int | None = None,
+    rng: random.Random | None = None,
+) -> List[Dict]:
+    """Generate mock member attributes without touching the database.
+
+    Names are unique; once the surname/given-name combinations run out a
+    numeric suffix is appended.
+
+    :param profile: Profile to use for member generation
+    :param size: Number of members to generate; None uses the profile's counts
+    :param rng: Random number generator, pass a seeded one for reproducibility
+    :return: List of dicts with the Member column values
+    """
+    rng = rng or random.Random()
+    rows = []
+    used_names = set()
 
-    try:
-        # Create members according to profile
-        used_names = set()
-
-        for member_profile in profile_config:
-            for _ in range(member_profile.count):
-                # Select a unique name
-                while True:
-                    given_name = random.choice(GIVEN_NAMES)
-                    surname = random.choice(SURNAMES)
-                    full_name = f"{surname}{given_name}"
-                    if full_name not in used_names:
-                        used_names.add(full_name)
-                        break
-
-                # Determine gender based on weights or default to random
-                gender_weights = member_profile.gender_weights or [0.5, 0.5]
-                gender = random.choices(["M", "F"], weights=gender_weights)[0]
-
-                # Determine faith status based on weights or default
-                faith_weights = member_profile.faith_status_weights or [
-                    0.25,
-                    0.25,
-                    0.25,
-                    0.25,
-                ]
-                faith_status = random.choices(FAITH_STATUSES, weights=faith_weights)[0]
-
-                # Determine education status
-                education_status = (
-                    member_profile.education_status
-                    if member_profile.education_status != "any"
-                    else random.choices(
-                        ["undergraduate", "graduate", "graduated"],
-                        weights=[0.5, 0.3, 0.2],
-                    )[0]
-                )
-
-                member = Member(
-                    given_name=given_name,
-                    surname=surname,
-                    gender=gender,
-                    faith_status=faith_status,
-                    role=member_profile.role,
-                    education_status=education_status,
-                    active=True,
-                    notes="這是測試資料",
-                )
-                db.add(member)
-                created_members.append(member)
-
-        db.commit()
-
-        # Print debug information
-        print(f"\nCreated {len(created_members)} members using {profile} profile:")
-        for i, member in enumerate(created_members, 1):
-            print(
-                f"{i}. {member.surname}{member.given_name} "
-                f"({member.gender}, {member.role}, {member.education_status}, "
-                f"{member.faith_status}, active={member.active})"
+    for member_profile in scale_profile(profile, size):
+        for _ in range(member_profile.count):
+            # Select a unique name
+            given_name = rng.choice(GIVEN_NAMES)
+            surname = rng.choice(SURNAMES)
+            attempts = 0
+            while f"{surname}{given_name}" in used_names:
+                attempts += 1
+                if attempts > 20:
+                    given_name = f"{rng.choice(GIVEN_NAMES)}{len(rows)}"
+                else:
+                    given_name = rng.choice(GIVEN_NAMES)
+                    surname = rng.choice(SURNAMES)
+            used_names.add(f"{surname}{given_name}")
+
+            # Determine gender based on weights or default to random
+            gender_weights = member_profile.gender_weights or [0.5, 0.5]
+            gender = rng.choices(["M", "F"], weights=gender_weights)[0]
+
+            # Determine faith status based on weights or default
+            faith_weights = member_profile.faith_status_weights or [
+                0.25,
+                0.25,
+                0.25,
+                0.25,
+            ]
+            faith_status = rng.choices(FAITH_STATUSES, weights=faith_weights)[0]
+
+            # Determine education status
+            education_status = (
+                member_profile.education_status
+                if member_profile.education_status != "any"
+                else rng.choices(
+                    ["undergraduate", "graduate", "graduated"],
+                    weights=[0.5, 0.3, 0.2],
+                )[0]
             )
 
-        # Create today's attendance records for all members
-        today = date.today()
-        for member in created_members:
-            attendance = Attendance(
-                member_id=member.id,
-                date=today,
-                present=True,
-                notes="準時參加",
+            rows.append(
+                {
+                    "given_name": given_name,
+                    "surname": surname,
+                    "gender": gender,
+                    "faith_status": faith_status,
+                    "role": member_profile.role,
+                    "education_status": education_status,
+                    "active": True,
+                    "notes": "這是測試資料",
+                }
             )
-            db.add(attendance)
 
-        db.commit()
-        print(f"\nCreated attendance records for {len(created_members)} members.")
+    return rows
+
+
+def generate_attendance_rows(
+    member_ids: Iterable[int],
+    weeks: int = 1,
+    end: date | None = None,
+    rng: random.Random | None = None,
+) -> Iterator[Dict]:
+    """Generate weekly attendance for members, ending on ``end``.
+
+    Every member attends the last meeting, so the newest date can be used as
+    today's roster. For earlier weeks each member has a personal attendance
+    rate; only attended meetings are recorded, like the check-in page does.
+
+    :param member_ids: Ids of the members to generate attendance for
+    :param weeks: Number of weekly meetings, the last one being ``end``
+    :param end: Date of the last meeting; defaults to today
+    :param rng: Random number generator, pass a seeded one for reproducibility
+    :yield: Dicts with the Attendance column values, week by week
+    """
+    rng = rng or random.Random()
+    end = end or date.today()
+    member_ids = list(member_ids)
+    rates = [rng.betavariate(4, 2) for _ in member_ids]
+
+    for week in range(weeks - 1, -1, -1):
+        meeting = end - timedelta(weeks=week)
+        for member_id, rate in zip(member_ids, rates):
+            if week == 0 or rng.random() < rate:
+                yield {
+                    "member_id": member_id,
+                    "date": meeting,
+                    "present": True,
+                    "notes": "準時參加",
+                }
+
+
+def _batches(rows: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_populate(
+    engine: Engine,
+    profile: Profile = Profile.DEFAULT,
+    size: int | None = None,
+    weeks: int = 1,
+    seed: int | None = None,
+    batch_size: int = 10_000,
+    end: date | None = None,
+) -> Dict[str, int]:
+    """Insert generated members and attendance with batched Core inserts.
 
-    except Exception as e:
-        print(f"Error occurred: {e}")
-        db.rollback()
-        raise
-    finally:
-        db.close()
+    Member ids are assigned here, continuing after the largest existing id, so
+    attendance rows can be generated without reading members back.
+
+    :param engine: Engine of the database to populate
+    :param profile: Profile to use for member generation
+    :param size: Number of members; None uses the profile's counts
+    :param weeks: Number of weekly meetings of attendance history
+    :param seed: Seed for reproducible data
+    :param batch_size: Rows per executemany call
+    :param end: Date of the last meeting; defaults to today
+    :return: Number of members and attendance rows inserted
+    """
+    rng = random.Random(seed)
+    member_rows = generate_member_rows(profile, size=size, rng=rng)
+
+    counts = {"members": 0, "attendance": 0}
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+
+        first_id = (conn.scalar(select(func.max(Member.id))) or 0) + 1
+        for member_id, row in enumerate(member_rows, first_id):
+            row["id"] = member_id
+
+        for batch in _batches(member_rows, batch_size):
+            conn.execute(insert(Member), batch)
+            counts["members"] += len(batch)
+
+        attendance = generate_attendance_rows(
+            (row["id"] for row in member_rows), weeks=weeks, end=end, rng=rng
+        )
+        for batch in _batches(attendance, batch_size):
+            conn.execute(insert(Attendance), batch)
+            counts["attendance"] += len(batch)
+
+    return counts
+
+
+def create_fresh_database(path: Path) -> Engine:
+    """Create an empty database at ``path``, replacing any existing file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    engine = database.get_engine(path)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def clear_database(engine: Engine) -> None:
+    """Delete all members along with their attendance, group history and
+    constraints."""
+    with engine.begin() as conn:
+        conn.execute(delete(GroupHistory))
+        conn.execute(delete(MemberPair))
+        conn.execute(delete(GroupCap))
+        conn.execute(delete(Attendance))
+        conn.execute(delete(Member))
+
+
+def create_mock_members(profile: Profile = Profile.DEFAULT):
+    """Create mock members and today's attendance in the app database."""
+    counts = bulk_populate(database.engine, profile)
+    print(
+        f"\nCreated {counts['members']} members using {profile} profile "
+        f"with {counts['attendance']} attendance records."
+    )
 
 
 if __name__ == "__main__":
@@ -340,24 +483,45 @@ if __name__ == "__main__":
         default=Profile.DEFAULT,
         help="Profile to use for member generation",
     )
+    parser.add_argument(
+        "--size", type=int, help="Number of members (default: the profile's counts)"
+    )
+    parser.add_argument(
+        "--weeks", type=int, default=1, help="Weeks of attendance history"
+    )
+    parser.add_argument("--seed", type=int, help="Seed for reproducible data")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Write to a fresh SQLite file instead of the DB_PATH database",
+    )
 
     args = parser.parse_args()
 
-    # Delete existing data first
-    db = next(get_db())
-    try:
+    if args.output:
+        engine = create_fresh_database(args.output)
+        print(f"Created fresh database at {args.output}")
+    else:
+        engine = database.engine
+        if engine is None:
+            parser.error("Set DB_PATH or pass --output")
+        # Delete existing data first
         print("Clearing existing data...")
-        db.query(Attendance).delete()
-        db.query(Member).delete()
-        db.commit()
+        clear_database(engine)
         print("Database cleared.")
-    except Exception as e:
-        print(f"Error clearing database: {e}")
-        db.rollback()
-        raise
-    finally:
-        db.close()
-
-    # Create new members
+
     print(f"\nCreating new members using {args.profile} profile...")
-    create_mock_members(args.profile)
+    start = time.perf_counter()
+    counts = bulk_populate(
+        engine,
+        args.profile,
+        size=args.size,
+        weeks=args.weeks,
+        seed=args.seed,
+        batch_size=args.batch_size,
+    )
+    print(
+        f"Created {counts['members']} members and {counts['attendance']} "
+        f"attendance records in {time.perf_counter() - start:.1f}s."
+    )
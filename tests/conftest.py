@@ -0,0 +1,93 @@
+import random
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app, database, routes
+from app.group_divider import MemberRole, divide_into_groups
+from app.models import Attendance, Member
+from benchmarks.synthetic import synthetic_roster
+
+LEADERS = (MemberRole.FACILITATOR, MemberRole.COUNSELOR)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Keep traces and profiles written during tests out of the working tree."""
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def route_state(monkeypatch):
+    """Start every test without groups or alternatives left by another."""
+    monkeypatch.setattr(routes, "current_groups", None)
+    monkeypatch.setattr(routes, "current_alternatives", [])
+    monkeypatch.setattr(routes, "alternatives_run", (0, -1))
+
+
+@pytest.fixture
+def make_client(tmp_path):
+    """Factory seeding a fresh database and returning a client of the app.
+
+    Members alternate between women and men and are undergraduates; the
+    first ``leaders`` are facilitators, the others have no role. With
+    ``present`` they are all marked present today.
+    """
+
+    def make(count: int = 12, leaders: int = 3, present: bool = True) -> TestClient:
+        database.init_db(tmp_path / "app.db")
+        db = database.SessionLocal()
+        for i in range(count):
+            member = Member(
+                given_name=str(i),
+                surname="Test",
+                gender="M" if i % 2 else "F",
+                faith_status="believer",
+                role="facilitator" if i < leaders else "none",
+                education_status="undergraduate",
+                active=True,
+            )
+            db.add(member)
+            if present:
+                db.flush()
+                db.add(Attendance(member_id=member.id, date=date.today(), present=True))
+        db.commit()
+        db.close()
+        return TestClient(app)
+
+    return make
+
+
+@pytest.fixture
+def make_groups():
+    """Factory for the heuristic placement of a synthetic roster, seeded so
+    it is the same on every run."""
+
+    def make(profile, size: int, num_groups: int, seed: int):
+        members = synthetic_roster(profile, size, seed=seed)
+        random.seed(seed)
+        return divide_into_groups(members, num_groups, max_iterations=0)
+
+    return make
+
+
+@pytest.fixture
+def check_placement_rules():
+    """Assert that an optimized partition keeps the members of the groups it
+    started from, each group's number of graduates and a leader in every
+    group that had one."""
+
+    def check(groups, result) -> None:
+        assert sorted(m.id for g in result for m in g.members) == sorted(
+            m.id for g in groups for m in g.members
+        )
+        for old, new in zip(groups, result):
+            assert sum(m.is_graduated for m in new.members) == sum(
+                m.is_graduated for m in old.members
+            )
+            if any(m.role in LEADERS for m in old.members):
+                assert any(m.role in LEADERS for m in new.members)
+
+    return check
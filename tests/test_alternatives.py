@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from app import alternatives, routes
+from app.alternatives import canonical_form, find_alternatives
+from app.constraints import AttributeCap, ConstraintSet
+from app.group_divider import Group, divide_into_groups, partition_score_components
+from app.single_flight import CancellationToken, OptimizationCancelled
+from app.telemetry import OptimizerTelemetry
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    yield
+    alternatives.shutdown_pool()
+
+
+@pytest.fixture
+def groups(make_groups):
+    return make_groups(Profile.TYPICAL, 40, 6, seed=7)
+
+
+def test_canonical_form_ignores_order(groups):
+    shuffled = [Group(members=list(reversed(g.members))) for g in reversed(groups)]
+    assert canonical_form(shuffled) == canonical_form(groups)
+    assert canonical_form(groups + [Group(members=[])]) == canonical_form(groups)
+
+
+def test_returns_distinct_partitions_best_first(groups):
+    telemetry = OptimizerTelemetry()
+    result = find_alternatives(groups, k=3, telemetry=telemetry, time_limit=2)
+
+    assert len(result) == 3
+    assert len({canonical_form(a.groups) for a in result}) == 3
+    totals = [a.score_components["total"] for a in result]
+    assert totals == sorted(totals, reverse=True)
+    assert totals[-1] > partition_score_components(groups)["total"]
+    for alternative in result:
+        assert alternative.score_components == pytest.approx(
+            partition_score_components(alternative.groups)
+        )
+        assert sorted(m.id for g in alternative.groups for m in g.members) == sorted(
+            m.id for g in groups for m in g.members
+        )
+    assert telemetry.score_components == result[0].score_components
+    assert "alternatives" in telemetry.phase_seconds
+
+
+def test_satisfies_constraints():
+    members = synthetic_roster(Profile.TYPICAL, 40, seed=5)
+    ids = [m.id for m in members if not m.is_graduated]
+    constraints = ConstraintSet(
+        separate=((ids[0], ids[1]),),
+        together=((ids[2], ids[3]),),
+        caps=(AttributeCap("role", "counselor", 1),),
+    )
+    groups = divide_into_groups(members, 6, max_iterations=0, constraints=constraints)
+    result = find_alternatives(groups, k=2, time_limit=2, constraints=constraints)
+
+    assert result
+    for alternative in result:
+        assert alternative.constraint_violations == 0
+        group_of = {
+            m.id: g for g, group in enumerate(alternative.groups) for m in group.members
+        }
+        assert group_of[ids[0]] != group_of[ids[1]]
+        assert group_of[ids[2]] == group_of[ids[3]]
+
+
+def test_cancellation(groups):
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(OptimizationCancelled):
+        find_alternatives(groups, cancel_token=token, time_limit=1)
+
+
+def test_cancellation_stops_running_searches():
+    members = synthetic_roster(Profile.TYPICAL, 400, seed=2)
+    groups = divide_into_groups(members, 50, max_iterations=0)
+    token = CancellationToken()
+    threading.Timer(0.5, token.cancel).start()
+    start = time.perf_counter()
+    with pytest.raises(OptimizationCancelled):
+        find_alternatives(groups, cancel_token=token, time_limit=10)
+    assert time.perf_counter() - start < 5
+
+    # The workers are free again for the next run
+    assert find_alternatives(groups, k=1, time_limit=3, starts=1)
+
+
+@pytest.fixture
+def client(make_client, monkeypatch):
+    monkeypatch.setattr(alternatives, "ALTERNATIVES_TIME_LIMIT", 1)
+    return make_client()
+
+
+def test_alternatives_route(client):
+    response = client.post("/groups/alternatives", data={"target_size": 4, "k": 2})
+    assert response.status_code == 200
+    result = response.json()["alternatives"]
+    assert 1 <= len(result) <= 2
+    for index, alternative in enumerate(result):
+        assert alternative["index"] == index
+        assert sum(len(group) for group in alternative["groups"]) == 12
+        assert "total" in alternative["score_components"]
+        assert alternative["constraint_violations"] == 0
+
+    for index in reversed(range(len(result))):
+        response = client.post(f"/groups/alternatives/{index}/select")
+        assert response.status_code == 200
+        assert routes.current_groups is routes.current_alternatives[index]
+    assert client.post("/groups/alternatives/5/select").status_code == 404
+
+    # Alternatives of an older roster can no longer be selected
+    routes.optimization_flights.invalidate()
+    assert routes.current_alternatives == []
+    assert client.post("/groups/alternatives/0/select").status_code == 409
+
+    # Nor once newer groups were published
+    client.post("/groups/alternatives", data={"target_size": 4, "k": 1})
+    flights = routes.optimization_flights
+    assert flights.publish(flights.next_seq(), flights.generation)
+    assert client.post("/groups/alternatives/0/select").status_code == 409
+
+    assert client.post("/groups/alternatives", data={"k": 0}).status_code == 400
+
+
+def test_pool_stops_with_app(client):
+    with client:
+        response = client.post("/groups/alternatives", data={"target_size": 4})
+        assert response.status_code == 200
+        assert alternatives._executor is not None
+    assert alternatives._executor is None
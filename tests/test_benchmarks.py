@@ -0,0 +1,114 @@
+import asyncio
+import csv
+from dataclasses import astuple
+
+from benchmarks.bench_grouping import compare_to_baseline
+from benchmarks.load_test import prepare_database, run_in_process
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile, scale_profile
+
+
+def test_scaled_profile_keeps_requested_size():
+    for profile in Profile:
+        for size in (10, 137, 10_000):
+            assert sum(p.count for p in scale_profile(profile, size)) == size
+
+
+def test_synthetic_roster_is_reproducible():
+    first = synthetic_roster(Profile.IMBALANCED, 200, seed=7)
+    second = synthetic_roster(Profile.IMBALANCED, 200, seed=7)
+    assert [astuple(m) for m in first] == [astuple(m) for m in second]
+    assert len({m.name for m in first}) == 200
+
+
+def test_baseline_comparison_flags_slowdowns():
+    base = [
+        {
+            "kind": "engine",
+            "engine": "greedy",
+            "profile": "typical",
+            "size": 100,
+            "seed": 0,
+            "median_seconds": 1.0,
+            "score": {"total": 10.0},
+        }
+    ]
+    slower = [dict(base[0], median_seconds=2.0, score={"total": 9.0})]
+    assert len(compare_to_baseline(slower, base, tolerance=1.25)) == 1
+    assert slower[0]["baseline_score_delta"] == -1.0
+    assert compare_to_baseline(base, base, tolerance=1.25) == []
+
+
+def test_quality_curves_sample_incumbent_and_time_to_target():
+    from benchmarks.quality_curves import sample_curve, suggest_budgets, time_to_target
+
+    trace = [(0.1, 1.0), (0.5, 3.0), (2.0, 2.5)]
+    assert sample_curve(trace, [0.05, 0.2, 1.0, 3.0]) == [None, 1.0, 3.0, 2.5]
+    assert time_to_target(trace, 2.9) == 0.5
+    assert time_to_target(trace, 5.0) is None
+
+    summary = [
+        {"size": 30, "engine": "fast", "time_to_target": 0.1},
+        {"size": 30, "engine": "fast", "time_to_target": 0.3},
+        {"size": 30, "engine": "flaky", "time_to_target": None},
+    ]
+    assert suggest_budgets(summary) == {30: {"engine": "fast", "budget_seconds": 0.3}}
+
+
+def test_quality_curves_csv_includes_summary(tmp_path):
+    from benchmarks.quality_curves import write_csv
+
+    run = {"profile": "typical", "size": 30, "seed": 0}
+    report = {
+        "grid_seconds": [0.5, 1.0],
+        "curves": [dict(run, engine="fast", score=[None, 2.0])],
+        "summary": [
+            dict(
+                run,
+                engine=engine,
+                final_score=2.0,
+                best_known_score=2.0,
+                target_score=1.98,
+                time_to_target=ttt,
+            )
+            for engine, ttt in [("fast", 0.5), ("flaky", None)]
+        ],
+        "suggested_budgets": {30: {"engine": "fast", "budget_seconds": 0.5}},
+    }
+    write_csv(report, tmp_path / "curves.csv")
+
+    with (tmp_path / "curves.csv").open() as f:
+        assert [r["score"] for r in csv.DictReader(f)] == ["", "2.000000"]
+    with (tmp_path / "curves-summary.csv").open() as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["engine"], r["time_to_target"]) for r in rows] == [
+        ("fast", "0.500000"),
+        ("flaky", ""),
+    ]
+    assert {(r["suggested_engine"], r["suggested_budget_seconds"]) for r in rows} == {
+        ("fast", "0.500000")
+    }
+
+
+def test_load_test_reports_every_endpoint(tmp_path):
+    db_path = tmp_path / "load.db"
+    roster = prepare_database(db_path, Profile.TYPICAL, 60, weeks=2, seed=0)
+    assert len(roster) == 60
+
+    report = asyncio.run(
+        run_in_process(db_path, phones=3, duration=0.5, generate_at=0.1, think=0.01)
+    )
+    endpoints = report["endpoints"]
+    assert set(endpoints) == {
+        "POST /members/search",
+        "POST /attendance/record",
+        "POST /groups/generate",
+    }
+    assert endpoints["POST /groups/generate"]["requests"] == 2
+    for stats in endpoints.values():
+        assert stats["error_rate"] == 0
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    assert (
+        report["server"]["POST /attendance/record"]["requests"]
+        == endpoints["POST /attendance/record"]["requests"]
+    )
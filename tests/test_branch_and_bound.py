@@ -0,0 +1,125 @@
+import random
+from itertools import product
+
+import pytest
+
+from app.branch_and_bound import BRANCH_AND_BOUND_MAX_MEMBERS, divide_exact
+from app.constraints import AttributeCap, ConstraintSet
+from app.engines import run_engine, select_engine
+from app.group_divider import (
+    Group,
+    MemberRole,
+    divide_into_groups,
+    partition_score_components,
+)
+from app.history import RepeatPairing
+from app.telemetry import OptimizerTelemetry
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+LEADERS = (MemberRole.FACILITATOR, MemberRole.COUNSELOR)
+
+
+def leaders_placed(members, groups):
+    """Every group has a leader, unless there are fewer leaders than groups."""
+    if sum(m.role in LEADERS for m in members) < len(groups):
+        return True
+    return all(any(m.role in LEADERS for m in g.members) for g in groups)
+
+
+def graduate_quotas(groups):
+    """Graduates of each group and whether it has no other members."""
+    return sorted(
+        (sum(m.is_graduated for m in g.members), all(m.is_graduated for m in g.members))
+        for g in groups
+    )
+
+
+def best_division(members, num_groups, quotas, pairing=None):
+    """Best score over every division following the leader rule and with the
+    given graduate quotas."""
+    best = float("-inf")
+    for labels in product(range(num_groups), repeat=len(members)):
+        groups = [Group(members=[]) for _ in range(num_groups)]
+        for member, g in zip(members, labels):
+            groups[g].members.append(member)
+        if not all(g.members for g in groups) or not leaders_placed(members, groups):
+            continue
+        if graduate_quotas(groups) != quotas:
+            continue
+        best = max(best, partition_score_components(groups, pairing=pairing)["total"])
+    return best
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_division_is_optimal(seed):
+    members = synthetic_roster(Profile.TYPICAL, 8, seed=seed)
+    rng = random.Random(seed)
+    ids = [m.id for m in members]
+    pairing = RepeatPairing(
+        {tuple(sorted(rng.sample(ids, 2))): rng.random() for _ in range(5)}, 1.0
+    )
+    random.seed(seed)
+    groups = divide_into_groups(members, 3, max_iterations=0)
+
+    telemetry = OptimizerTelemetry()
+    result = divide_exact(groups, telemetry=telemetry, pairing=pairing)
+
+    quotas = graduate_quotas(groups)
+    assert any(graduates for graduates, _ in quotas)
+    assert graduate_quotas(result) == quotas
+    score = partition_score_components(result, pairing=pairing)["total"]
+    assert score == pytest.approx(best_division(members, 3, quotas, pairing))
+    assert telemetry.stop_reason == "optimal"
+    assert telemetry.optimality_gap == 0
+    assert telemetry.score_components["total"] == pytest.approx(score)
+
+
+def test_engine_keeps_rules_and_beats_unified():
+    members = synthetic_roster(Profile.IMBALANCED, 18, seed=3)
+    ids = [m.id for m in members]
+    constraints = ConstraintSet(
+        separate=((ids[0], ids[1]),),
+        together=((ids[2], ids[3]),),
+        caps=(AttributeCap("role", "counselor", 1),),
+    )
+    random.seed(0)
+    unified = run_engine("unified", members, 3, constraints=constraints)
+    random.seed(0)
+    telemetry = OptimizerTelemetry()
+    groups = run_engine(
+        "branch_and_bound", members, 3, telemetry=telemetry, constraints=constraints
+    )
+
+    assert telemetry.stop_reason == "optimal"
+    assert telemetry.constraint_violations == 0
+    assert (
+        partition_score_components(groups)["total"]
+        >= partition_score_components(unified)["total"]
+    )
+    assert sorted(m.id for g in groups for m in g.members) == sorted(ids)
+    group_of = {m.id: g for g, group in enumerate(groups) for m in group.members}
+    assert group_of[ids[0]] != group_of[ids[1]]
+    assert group_of[ids[2]] == group_of[ids[3]]
+    assert leaders_placed(members, groups)
+    assert graduate_quotas(groups) == graduate_quotas(unified)
+    for group in groups:
+        assert sum(m.role == MemberRole.COUNSELOR for m in group.members) <= 1
+
+
+def test_time_limit_keeps_best_division_found():
+    members = synthetic_roster(Profile.TYPICAL, 20, seed=2)
+    random.seed(0)
+    groups = divide_into_groups(members, 3, max_iterations=0)
+    telemetry = OptimizerTelemetry()
+    result = divide_exact(groups, telemetry=telemetry, time_limit=0)
+
+    assert telemetry.stop_reason == "time_limit"
+    assert sorted(m.id for g in result for m in g.members) == sorted(
+        m.id for m in members
+    )
+
+
+def test_small_rosters_select_branch_and_bound():
+    assert select_engine(BRANCH_AND_BOUND_MAX_MEMBERS) == "branch_and_bound"
+    assert select_engine(BRANCH_AND_BOUND_MAX_MEMBERS + 1) != "branch_and_bound"
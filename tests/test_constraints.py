@@ -0,0 +1,219 @@
+import random
+
+import pytest
+
+from app import database, routes
+from app.constraints import (
+    AttributeCap,
+    ConstraintSet,
+    ConstraintState,
+    attribute_value,
+    load_constraints,
+)
+from app.engines import run_engine
+from app.group_divider import Group, divide_into_groups
+from app.telemetry import OptimizerTelemetry
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+
+@pytest.fixture
+def members():
+    return synthetic_roster(Profile.TYPICAL, 70, seed=5)
+
+
+@pytest.fixture
+def constraints(members):
+    rng = random.Random(5)
+    ids = [m.id for m in members if not m.is_graduated]
+    pairs = rng.sample(ids, 16)
+    return ConstraintSet(
+        separate=tuple(zip(pairs[0:8:2], pairs[1:8:2])),
+        together=tuple(zip(pairs[8::2], pairs[9::2])),
+        caps=(AttributeCap("role", "counselor", 1),),
+    )
+
+
+def count_violations(groups, constraints):
+    group_of = {m.id: g for g, group in enumerate(groups) for m in group.members}
+    violations = sum(group_of[a] == group_of[b] for a, b in constraints.separate)
+    violations += sum(group_of[a] != group_of[b] for a, b in constraints.together)
+    for group in groups:
+        for cap in constraints.caps:
+            matching = sum(cap.matches(m) for m in group.members)
+            violations += max(0, matching - cap.limit)
+    return violations
+
+
+def test_swap_deltas_match_recount(members, constraints):
+    groups = [Group(members=members[i::10]) for i in range(10)]
+    state = ConstraintState(constraints.compile(members), groups)
+    assert state.violations == count_violations(groups, constraints)
+
+    index = state.compiled.index
+    rng = random.Random(0)
+    for _ in range(300):
+        g1, g2 = rng.sample(range(10), 2)
+        m1, m2 = rng.choice(groups[g1].members), rng.choice(groups[g2].members)
+        i, j = index[m1.id], index[m2.id]
+        expected = state.violations + state.swap_delta(i, j)
+        state.apply_swap(i, j)
+        groups[g1].members[groups[g1].members.index(m1)] = m2
+        groups[g2].members[groups[g2].members.index(m2)] = m1
+        assert state.violations == expected == count_violations(groups, constraints)
+
+
+def test_move_and_rotation_deltas_match_recount(members, constraints):
+    groups = [Group(members=members[i::10]) for i in range(10)]
+    state = ConstraintState(constraints.compile(members), groups)
+
+    index = state.compiled.index
+    rng = random.Random(1)
+    for _ in range(300):
+        g1, g2, g3 = rng.sample(range(10), 3)
+        m1, m2 = rng.choice(groups[g1].members), rng.choice(groups[g2].members)
+        m3 = rng.choice(groups[g3].members)
+        i, j, k = index[m1.id], index[m2.id], index[m3.id]
+        groups[g1].members.remove(m1)
+        if rng.random() < 0.5 and groups[g1].members:
+            expected = state.violations + state.move_delta(i, g2)
+            state.apply_move(i, g2)
+            groups[g2].members.append(m1)
+        else:
+            expected = state.violations + state.rotation_delta(i, j, k)
+            state.apply_rotation(i, j, k)
+            groups[g2].members.remove(m2)
+            groups[g3].members.remove(m3)
+            groups[g1].members.append(m3)
+            groups[g2].members.append(m1)
+            groups[g3].members.append(m2)
+        assert state.violations == expected == count_violations(groups, constraints)
+
+
+@pytest.mark.parametrize("engine", ["greedy", "unified", "neighborhood", "tabu"])
+def test_engines_satisfy_constraints(members, constraints, engine):
+    random.seed(1)
+    unconstrained = run_engine(engine, members, 10)
+    assert count_violations(unconstrained, constraints) > 0
+
+    random.seed(1)
+    telemetry = OptimizerTelemetry()
+    groups = run_engine(
+        engine, members, 10, telemetry=telemetry, constraints=constraints
+    )
+    assert count_violations(groups, constraints) == 0
+    assert telemetry.constraint_violations == 0
+    assert sorted(m.id for g in groups for m in g.members) == sorted(
+        m.id for m in members
+    )
+
+
+def test_unsatisfiable_caps_are_minimized(members):
+    constraints = ConstraintSet(caps=(AttributeCap("gender", "m", 0),))
+    telemetry = OptimizerTelemetry()
+    groups = divide_into_groups(
+        members, 10, telemetry=telemetry, constraints=constraints
+    )
+    males = sum(attribute_value(m, "gender") == "m" for m in members)
+    assert telemetry.constraint_violations == males
+    assert count_violations(groups, constraints) == males
+
+
+def test_caps_validate_attributes():
+    with pytest.raises(ValueError, match="Unknown attribute"):
+        AttributeCap("notes", "x", 1)
+    with pytest.raises(ValueError, match="negative"):
+        AttributeCap("gender", "F", -1)
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(3, leaders=0, present=False)
+
+
+def test_constraints_are_editable(client):
+    response = client.post(
+        "/constraints/pairs",
+        data={"kind": "separate", "member_a_id": 2, "member_b_id": 1},
+    )
+    assert response.status_code == 200
+    pair = response.json()
+    assert (pair["member_a_id"], pair["member_b_id"]) == (1, 2)
+
+    duplicate = client.post(
+        "/constraints/pairs",
+        data={"kind": "together", "member_a_id": 1, "member_b_id": 2},
+    )
+    assert duplicate.status_code == 400
+    missing = client.post(
+        "/constraints/pairs",
+        data={"kind": "together", "member_a_id": 1, "member_b_id": 99},
+    )
+    assert missing.status_code == 404
+
+    cap = client.post(
+        "/constraints/caps",
+        data={"attribute": "role", "value": "counselor", "max_per_group": 2},
+    ).json()
+    replaced = client.post(
+        "/constraints/caps",
+        data={"attribute": "role", "value": "counselor", "max_per_group": 1},
+    ).json()
+    assert replaced["id"] == cap["id"] and replaced["max_per_group"] == 1
+    bad = client.post(
+        "/constraints/caps",
+        data={"attribute": "notes", "value": "x", "max_per_group": 1},
+    )
+    assert bad.status_code == 400
+
+    db = database.SessionLocal()
+    try:
+        assert load_constraints(db) == ConstraintSet(
+            separate=((1, 2),), caps=(AttributeCap("role", "counselor", 1),)
+        )
+    finally:
+        db.close()
+
+    assert client.delete(f"/constraints/pairs/{pair['id']}").status_code == 200
+    assert client.delete(f"/constraints/caps/{cap['id']}").status_code == 200
+    assert client.get("/constraints").json() == {"pairs": [], "caps": []}
+    assert client.delete(f"/constraints/caps/{cap['id']}").status_code == 404
+
+
+def test_home_page_groups_respect_constraints(make_client):
+    client = make_client(12, leaders=3)
+    separate = [(4, 5), (6, 7), (8, 9)]
+    for a, b in separate:
+        client.post(
+            "/constraints/pairs",
+            data={"kind": "separate", "member_a_id": a, "member_b_id": b},
+        )
+    client.post(
+        "/constraints/pairs",
+        data={"kind": "together", "member_a_id": 10, "member_b_id": 11},
+    )
+
+    for _ in range(3):
+        assert client.get("/").status_code == 200
+        group_of = {
+            m.id: g
+            for g, group in enumerate(routes.current_groups)
+            for m in group.members
+        }
+        assert all(group_of[a] != group_of[b] for a, b in separate)
+        assert group_of[10] == group_of[11]
+
+
+def test_deleting_a_member_removes_their_constraints(client):
+    client.post(
+        "/constraints/pairs",
+        data={"kind": "separate", "member_a_id": 1, "member_b_id": 2},
+    )
+    client.post(
+        "/constraints/pairs",
+        data={"kind": "together", "member_a_id": 2, "member_b_id": 3},
+    )
+
+    assert client.delete("/members/3").status_code == 200
+    pairs = client.get("/constraints").json()["pairs"]
+    assert [(p["member_a_id"], p["member_b_id"]) for p in pairs] == [(1, 2)]
@@ -0,0 +1,106 @@
+import json
+from collections import Counter
+from math import log as ln
+
+import pytest
+
+from app.diversity import (
+    DEFAULT_DIVERSITY,
+    DiversityConfig,
+    EntropyTerm,
+    load_diversity_config,
+)
+from app import routes
+from app.group_divider import partition_score_components
+from app.telemetry import telemetry_store
+from scripts.populate_db import Profile
+
+
+@pytest.fixture
+def groups(make_groups):
+    return make_groups(Profile.TYPICAL, 60, 9, seed=1)
+
+
+def string_entropy(members):
+    """The original hard-coded characteristic of calculate_diversity_score."""
+    counts = Counter(f"{m.gender}_{m.faith_status}_{m.role.value}" for m in members)
+    return -sum(c / len(members) * ln(c / len(members)) for c in counts.values())
+
+
+def test_default_config_matches_historical_score(groups):
+    members = [m for g in groups for m in g.members]
+    kernel = DEFAULT_DIVERSITY.compile(members)
+    for group in groups:
+        expected = string_entropy(group.members)
+        assert DEFAULT_DIVERSITY.entropy(group.members) == pytest.approx(expected)
+        assert kernel.entropy(group.members) == pytest.approx(expected)
+
+
+def test_compiled_kernel_matches_uncompiled_config(groups):
+    members = [m for g in groups for m in g.members]
+    config = DiversityConfig(
+        (
+            EntropyTerm(("gender", "role"), 2.0),
+            EntropyTerm(("education_status",), 0.5),
+            EntropyTerm(("prep_attended",), 1.0),
+        )
+    )
+    kernel = config.compile(members)
+    for group in groups:
+        assert kernel.entropy(group.members) == pytest.approx(
+            config.entropy(group.members)
+        )
+        counts = kernel.counts(kernel.index[m.id] for m in group.members)
+        assert kernel.entropy_from_counts(
+            enumerate(counts), len(group.members)
+        ) == pytest.approx(config.entropy(group.members))
+
+
+def test_independent_entropy_adds_weighted_terms(groups):
+    group = groups[0].members
+    gender = DiversityConfig.joint(["gender"]).entropy(group)
+    education = DiversityConfig.joint(["education_status"]).entropy(group)
+    config = DiversityConfig.independent({"gender": 1.0, "education_status": 0.5})
+    assert config.entropy(group) == pytest.approx(gender + 0.5 * education)
+
+
+def test_config_changes_partition_score(groups):
+    default = partition_score_components(groups)
+    gender_only = partition_score_components(
+        groups, diversity=DiversityConfig.joint(["gender"])
+    )
+    assert gender_only["entropy"] < default["entropy"]
+    assert gender_only["size_balance_penalty"] == default["size_balance_penalty"]
+
+
+def test_config_from_json(tmp_path, monkeypatch):
+    assert load_diversity_config() == DEFAULT_DIVERSITY
+
+    data = {"mode": "independent", "attributes": {"gender": 1, "role": 0.5}}
+    monkeypatch.setenv("DIVERSITY_CONFIG", json.dumps(data))
+    assert load_diversity_config() == DiversityConfig.independent(
+        {"gender": 1, "role": 0.5}
+    )
+
+    path = tmp_path / "diversity.json"
+    path.write_text(json.dumps({"mode": "joint", "attributes": ["gender", "role"]}))
+    monkeypatch.setenv("DIVERSITY_CONFIG", str(path))
+    assert load_diversity_config() == DiversityConfig.joint(["gender", "role"])
+
+
+def test_unknown_attributes_and_modes_are_rejected():
+    with pytest.raises(ValueError, match="Unknown diversity attributes"):
+        DiversityConfig.joint(["notes"])
+    with pytest.raises(ValueError, match="Unknown diversity mode"):
+        DiversityConfig.from_dict({"mode": "both", "attributes": ["gender"]})
+
+
+def test_divide_groups_route_scores_with_the_config(make_client, monkeypatch):
+    config = DiversityConfig.joint(["gender"])
+    monkeypatch.setattr(routes, "diversity_config", config)
+    client = make_client()
+
+    assert client.post("/divide-groups").status_code == 200
+    scores = partition_score_components(routes.current_groups, diversity=config)
+    telemetry = telemetry_store.recent(1)[0]
+    assert telemetry.score_components["entropy"] == pytest.approx(scores["entropy"])
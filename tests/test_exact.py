@@ -0,0 +1,122 @@
+import random
+from collections import Counter
+from itertools import product
+
+import pytest
+
+from app.engines import run_engine
+from app.exact import _swap_class, balance_gender_exact
+from app.group_divider import (
+    balance_gender_in_groups,
+    divide_into_groups,
+    gender_imbalance_bound,
+    partition_score_components,
+)
+from app.telemetry import OptimizerTelemetry
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+
+@pytest.fixture
+def placement():
+    members = synthetic_roster(Profile.TYPICAL, 60, seed=7)
+    random.seed(7)
+    return divide_into_groups(members, 8, max_iterations=0)
+
+
+def gender_imbalance(groups):
+    return partition_score_components(groups)["gender_imbalance"]
+
+
+def composition(group):
+    return Counter(_swap_class(m) for m in group.members)
+
+
+def best_imbalance(groups):
+    """Minimum imbalance over every way of spreading each class's men."""
+    classes = sorted({c for g in groups for c in composition(g)} - {None})
+    men = Counter(_swap_class(m) for g in groups for m in g.members if m.gender == "M")
+    fixed = [
+        sum(m.gender == "M" for m in g.members if _swap_class(m) is None)
+        for g in groups
+    ]
+    per_class = []
+    for c in classes:
+        slots = [composition(g)[c] for g in groups]
+        per_class.append(
+            [
+                split
+                for split in product(*(range(n + 1) for n in slots))
+                if sum(split) == men[c]
+            ]
+        )
+    best = float("inf")
+    for splits in product(*per_class):
+        total = 0.0
+        for g, group in enumerate(groups):
+            count = fixed[g] + sum(split[g] for split in splits)
+            total += abs(count / len(group.members) - 0.5)
+        best = min(best, total)
+    return best
+
+
+def test_exact_balance_is_optimal():
+    members = synthetic_roster(Profile.TYPICAL, 14, seed=2)
+    random.seed(2)
+    groups = divide_into_groups(members, 3, max_iterations=0)
+
+    balanced = balance_gender_exact(groups)
+    assert gender_imbalance(balanced) == pytest.approx(best_imbalance(groups))
+
+
+def test_exact_balance_keeps_group_composition(placement):
+    greedy = balance_gender_in_groups(placement)
+    telemetry = OptimizerTelemetry()
+    balanced = balance_gender_exact(placement, telemetry=telemetry)
+
+    assert gender_imbalance(balanced) <= gender_imbalance(greedy) + 1e-9
+    assert sorted(m.id for g in balanced for m in g.members) == sorted(
+        m.id for g in placement for m in g.members
+    )
+    for old, new in zip(placement, balanced):
+        assert composition(new) == composition(old)
+        graduates = [m.id for m in old.members if m.is_graduated]
+        assert graduates == [m.id for m in new.members if m.is_graduated]
+
+    assert telemetry.stop_reason == "optimal"
+    assert telemetry.score_components == pytest.approx(
+        partition_score_components(balanced)
+    )
+
+
+def test_exact_engine_falls_back_when_out_of_time():
+    members = synthetic_roster(Profile.TYPICAL, 30, seed=1)
+    telemetry = OptimizerTelemetry()
+    groups = run_engine("exact", members, 4, telemetry=telemetry, time_limit=0)
+
+    assert telemetry.engine == "exact"
+    assert telemetry.stop_reason == "time_limit"
+    assert sum(len(g.members) for g in groups) == 30
+
+
+@pytest.mark.parametrize("profile", [Profile.TYPICAL, Profile.IMBALANCED])
+def test_bound_is_below_optimum(profile):
+    for seed in range(5):
+        members = synthetic_roster(profile, 50, seed=seed)
+        random.seed(seed)
+        groups = divide_into_groups(members, 7, max_iterations=0)
+        optimum = gender_imbalance(balance_gender_exact(groups))
+        assert gender_imbalance_bound(groups) <= optimum + 1e-9
+
+
+def test_balancer_stops_once_bound_is_met():
+    members = synthetic_roster(Profile.TYPICAL, 200, seed=3)
+    random.seed(3)
+    groups = divide_into_groups(members, 28, max_iterations=0)
+    telemetry = OptimizerTelemetry()
+    balanced = balance_gender_in_groups(groups, telemetry=telemetry)
+
+    assert telemetry.stop_reason == "optimal"
+    assert telemetry.optimality_gap == pytest.approx(0)
+    assert telemetry.iterations < 100
+    assert gender_imbalance(balanced) == pytest.approx(gender_imbalance_bound(groups))
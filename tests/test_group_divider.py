@@ -305,3 +305,48 @@ def test_counselor_distribution(duplicate_prone_members):
 
     # Check that counselor counts don't differ by more than 1
     assert max(counselor_counts) - min(counselor_counts) <= 1
+
+
+def test_members_compare_and_hash_by_id(basic_members):
+    """Members are identified by id, whatever their other attributes."""
+    member = basic_members[0]
+    renamed = GroupMember(
+        id=member.id,
+        surname="Wang",
+        given_name="Wu",
+        role=MemberRole.REGULAR,
+        gender="F",
+        faith_status="seeker",
+        education_status="undergraduate",
+        is_graduated=False,
+        is_present=True,
+        prep_attended=False,
+    )
+    assert renamed == member
+    assert len({member, renamed}) == 1
+    assert member != basic_members[1]
+    assert member != member.id
+    assert not hasattr(member, "__dict__")
+
+
+def test_categorical_fields_are_shared_between_members(basic_members):
+    # Fresh strings, as loaded from the database; literals and one-character
+    # strings would be shared by CPython anyway
+    member = GroupMember(
+        id=99,
+        surname="".join(["Zh", "ang"]),
+        given_name="Liu",
+        role=MemberRole.from_db_role("none"),
+        gender="M",
+        faith_status="".join(["已受", "洗"]),
+        education_status="".join(["gradu", "ated"]),
+        is_graduated=True,
+        is_present=True,
+        prep_attended=False,
+    )
+    first = basic_members[0]
+    assert member.surname is first.surname
+    assert member.faith_status is first.faith_status
+    assert member.education_status is first.education_status
+    assert member.role is MemberRole.REGULAR
+    assert MemberRole.from_db_role("Counselor") is MemberRole.COUNSELOR
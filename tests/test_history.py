@@ -0,0 +1,148 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app, database, routes
+from app.engines import run_engine
+from app.group_divider import Group, partition_score_components
+from app.history import (
+    co_membership,
+    load_division,
+    load_repeat_pairing,
+    record_division,
+)
+from app.models import GroupHistory, Member
+from app.telemetry import OptimizerTelemetry
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+DAY = date(2024, 3, 3)
+
+
+@pytest.fixture
+def db(tmp_path):
+    database.init_db(tmp_path / "history.db")
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def members():
+    return synthetic_roster(Profile.TYPICAL, 6, seed=1)
+
+
+def groups_of(members, *id_groups):
+    by_id = {m.id: m for m in members}
+    return [Group(members=[by_id[i] for i in ids]) for ids in id_groups]
+
+
+def test_record_replaces_division_of_the_same_day(db, members):
+    ids = [m.id for m in members]
+    record_division(db, DAY, groups_of(members, ids[:3], ids[3:]))
+    record_division(db, DAY, groups_of(members, ids[::2], ids[1::2]))
+    db.commit()
+
+    assert load_division(db, DAY) == [ids[::2], ids[1::2]]
+    assert db.query(GroupHistory).count() == 6
+
+
+def test_co_membership_counts_pairs_in_window(db, members):
+    a, b, c, d, e, f = [m.id for m in members]
+    record_division(db, DAY, groups_of(members, [a, b, c], [d, e, f]))
+    record_division(
+        db, DAY - timedelta(weeks=1), groups_of(members, [a, b], [c, d, e, f])
+    )
+    record_division(db, DAY - timedelta(weeks=4), groups_of(members, [a, b]))
+    db.commit()
+
+    assert co_membership(db, weeks=1, end=DAY) == {
+        (a, b): 1,
+        (a, c): 1,
+        (b, c): 1,
+        (d, e): 1,
+        (d, f): 1,
+        (e, f): 1,
+    }
+    recent = co_membership(db, weeks=2, end=DAY)
+    assert recent[(a, b)] == 2 and recent[(e, f)] == 2 and recent[(c, d)] == 1
+    assert (a, d) not in recent
+    assert co_membership(db, weeks=5, end=DAY)[(a, b)] == 3
+
+
+def test_repeat_pairing_weights_decay_per_week(db, members):
+    a, b, c = [m.id for m in members[:3]]
+    record_division(db, DAY, groups_of(members, [a, b, c]))
+    record_division(db, DAY - timedelta(weeks=2), groups_of(members, [a, b]))
+    record_division(db, DAY - timedelta(weeks=3), groups_of(members, [b, c]))
+    db.commit()
+
+    pairing = load_repeat_pairing(db, DAY, weeks=3, decay=0.5, weight=2.0)
+    assert pairing.pairs == {(a, b): 1.25, (a, c): 1.0, (b, c): 1.0}
+    assert pairing.penalty(groups_of(members, [a, b], [c])) == 2.5
+    assert load_repeat_pairing(db, DAY, weight=0) is None
+
+
+def test_unified_engine_avoids_recent_pairs(db):
+    roster = synthetic_roster(Profile.TYPICAL, 49, seed=3)
+    random.seed(0)
+    last_week = run_engine("unified", roster, 7)
+    record_division(db, DAY - timedelta(weeks=1), last_week)
+    db.commit()
+    pairing = load_repeat_pairing(db, DAY, decay=0.5, weight=1.0)
+
+    random.seed(0)
+    again = run_engine("unified", roster, 7)
+    random.seed(0)
+    telemetry = OptimizerTelemetry()
+    rotated = run_engine("unified", roster, 7, telemetry=telemetry, pairing=pairing)
+
+    assert pairing.penalty(rotated) < pairing.penalty(again) / 2
+    scores = partition_score_components(rotated, pairing=pairing)
+    assert telemetry.score_components == pytest.approx(scores)
+    assert telemetry.score_improvements["repeat_pairing_penalty"] > 0
+
+
+def add_members(db, members):
+    for m in members:
+        db.add(
+            Member(
+                id=m.id,
+                given_name=m.given_name,
+                surname=m.surname,
+                gender=m.gender,
+                faith_status=m.faith_status,
+                role="none",
+            )
+        )
+    db.commit()
+
+
+def test_finalize_route_stores_current_groups(db, members, monkeypatch):
+    add_members(db, members)
+    client = TestClient(app)
+    assert client.post("/groups/finalize").status_code == 400
+
+    ids = [m.id for m in members]
+    monkeypatch.setattr(routes, "current_groups", groups_of(members, ids[:3], ids[3:]))
+    response = client.post("/groups/finalize", data={"meeting_date": str(DAY)})
+    assert response.json() == {"date": str(DAY), "groups": 2, "members": 6}
+
+    assert client.get(f"/groups/history/{DAY}").json()["groups"] == [ids[:3], ids[3:]]
+    pairs = client.get(
+        "/groups/history/co-membership", params={"weeks": 1, "end": str(DAY)}
+    ).json()["pairs"]
+    assert len(pairs) == 6 and [ids[0], ids[1], 1] in pairs
+
+
+def test_deleting_a_member_removes_their_history(db, members):
+    add_members(db, members)
+    ids = [m.id for m in members]
+    record_division(db, DAY, groups_of(members, ids[:3], ids[3:]))
+    db.commit()
+
+    assert TestClient(app).delete(f"/members/{ids[0]}").status_code == 200
+    db.expire_all()
+    assert load_division(db, DAY) == [ids[1:3], ids[3:]]
@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app import database, instrumentation
+from app.instrumentation import request_metrics
+
+
+@pytest.fixture
+def client(make_client, monkeypatch):
+    monkeypatch.setattr(instrumentation, "SQLITE_LOCK_TIMING", True)
+    client = make_client(25, leaders=4, present=False)
+    request_metrics.clear()
+    return client
+
+
+def test_server_timing_header_reports_queries(client):
+    response = client.post("/members/search", data={"query": ""})
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert 'desc="2 queries"' in timing
+    assert "tpl;dur=" in timing and "total;dur=" in timing
+
+
+def test_n_plus_one_routes_are_flagged(client):
+    client.post("/attendance/select-all")
+    client.post("/members/search", data={"query": ""})
+    metrics = client.get("/debug/request-metrics").json()
+
+    select_all = metrics["POST /attendance/select-all"]
+    assert select_all["requests"] == 1
+    assert select_all["max_sql_queries"] > 25
+    assert select_all["suspected_n_plus_one"]
+    assert not metrics["POST /members/search"]["suspected_n_plus_one"]
+
+
+def test_routes_are_grouped_by_template(client):
+    client.post("/members/1/prep", data={"prep_attended": "true"})
+    client.post("/members/2/prep", data={"prep_attended": "false"})
+    metrics = client.get("/debug/request-metrics").json()
+    assert metrics["POST /members/{member_id}/prep"]["requests"] == 2
+
+
+def test_writes_blocked_by_another_connection_count_as_lock_waits(client, tmp_path):
+    blocker = sqlite3.connect(tmp_path / "app.db", check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.1, blocker.commit)
+    release.start()
+
+    response = client.post(
+        "/attendance/record",
+        data={"member_id": 1, "attendance_date": "2024-01-07", "present": "true"},
+    )
+    release.join()
+    blocker.close()
+
+    assert response.status_code == 204
+    metrics = client.get("/debug/request-metrics").json()["POST /attendance/record"]
+    assert metrics["lock_waits"] == 1
+    assert metrics["lock_wait_ms"] >= 50
+    assert metrics["lock_errors"] == 0
+
+
+def test_commits_blocked_by_a_reader_count_as_lock_waits(client, tmp_path):
+    record = {"member_id": 1, "attendance_date": "2024-01-07", "present": "true"}
+    assert client.post("/attendance/record", data=record).status_code == 204
+
+    # An open read transaction keeps the commit from taking the exclusive lock
+    reader = sqlite3.connect(
+        tmp_path / "app.db", isolation_level=None, check_same_thread=False
+    )
+    reader.execute("BEGIN")
+    reader.execute("SELECT count(*) FROM members").fetchall()
+    release = threading.Timer(0.1, reader.commit)
+    release.start()
+
+    response = client.post("/attendance/record", data={**record, "member_id": 2})
+    release.join()
+    reader.close()
+
+    assert response.status_code == 204
+    metrics = client.get("/debug/request-metrics").json()["POST /attendance/record"]
+    assert metrics["requests"] == 2
+    # The uncontended first write did not wait
+    assert metrics["lock_waits"] == 1
+    assert metrics["lock_wait_ms"] >= 50
+    assert metrics["lock_errors"] == 0
+
+
+def test_lock_timing_is_off_by_default(make_client):
+    make_client(3, leaders=0, present=False)
+    connection = database.engine.raw_connection()
+    try:
+        assert type(connection.driver_connection) is sqlite3.Connection
+    finally:
+        connection.close()
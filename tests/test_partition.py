@@ -0,0 +1,158 @@
+import random
+
+import pytest
+
+from app.diversity import DiversityConfig
+from app.engines import run_engine
+from app.group_divider import partition_score_components
+from app.history import RepeatPairing
+from app.partition import PartitionState, optimize_partition, tabu_partition
+from app.telemetry import OptimizerTelemetry
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+
+@pytest.fixture
+def groups(make_groups):
+    return make_groups(Profile.TYPICAL, 80, 11, seed=4)
+
+
+@pytest.mark.parametrize(
+    "diversity", [None, DiversityConfig.independent({"gender": 1, "role": 0.5})]
+)
+def test_swap_deltas_match_full_rescoring(groups, diversity):
+    state = PartitionState(groups, diversity=diversity)
+    assert state.components() == pytest.approx(
+        partition_score_components(groups, diversity=diversity)
+    )
+
+    rng = random.Random(0)
+    for _ in range(200):
+        i, j = rng.sample(range(len(state.members)), 2)
+        if state.assignment[i] == state.assignment[j]:
+            continue
+        delta = state.swap_delta(i, j)
+        before = state.total
+        state.apply_swap(i, j)
+        after = partition_score_components(state.to_groups(), diversity=diversity)
+        assert state.total == pytest.approx(after["total"])
+        assert state.total - before == pytest.approx(delta)
+
+
+def test_repeat_pairing_deltas_match_full_rescoring(groups):
+    rng = random.Random(1)
+    ids = [m.id for g in groups for m in g.members]
+    pairing = RepeatPairing(
+        {tuple(sorted(rng.sample(ids, 2))): rng.random() for _ in range(300)}, 2.0
+    )
+    state = PartitionState(groups, pairing=pairing)
+    assert state.components() == pytest.approx(
+        partition_score_components(groups, pairing=pairing)
+    )
+
+    for _ in range(200):
+        i, j = rng.sample(range(len(state.members)), 2)
+        if state.assignment[i] == state.assignment[j]:
+            continue
+        delta = state.swap_delta(i, j)
+        before = state.total
+        state.apply_swap(i, j)
+        after = partition_score_components(state.to_groups(), pairing=pairing)
+        assert state.components() == pytest.approx(after)
+        assert state.total - before == pytest.approx(delta)
+
+
+def test_optimize_reports_component_improvements(groups):
+    before = partition_score_components(groups)
+    telemetry = OptimizerTelemetry()
+    random.seed(0)
+    result = optimize_partition(groups, telemetry=telemetry)
+    after = partition_score_components(result)
+
+    assert after["total"] > before["total"]
+    assert telemetry.score_components == pytest.approx(after)
+    improvements = telemetry.score_improvements
+    assert improvements["total"] == pytest.approx(after["total"] - before["total"])
+    assert improvements["entropy"] == pytest.approx(
+        after["entropy"] - before["entropy"]
+    )
+    assert improvements["prep_penalty"] == pytest.approx(
+        before["prep_penalty"] - after["prep_penalty"]
+    )
+    assert telemetry.stop_reason == "stagnation"
+    assert "optimization" in telemetry.phase_seconds
+
+
+def test_swaps_keep_placement_rules(groups, check_placement_rules):
+    result = optimize_partition(groups)
+
+    check_placement_rules(groups, result)
+    assert [len(g.members) for g in result] == [len(g.members) for g in groups]
+
+
+def test_unified_engine_is_registered():
+    members = synthetic_roster(Profile.TYPICAL, 30, seed=1)
+    telemetry = OptimizerTelemetry()
+    groups = run_engine("unified", members, 4, telemetry=telemetry, time_limit=0)
+
+    assert telemetry.engine == "unified"
+    assert telemetry.stop_reason == "time_limit"
+    assert sum(len(g.members) for g in groups) == 30
+
+
+def test_move_and_rotation_deltas_match_full_rescoring(groups):
+    rng = random.Random(2)
+    ids = [m.id for g in groups for m in g.members]
+    pairing = RepeatPairing(
+        {tuple(sorted(rng.sample(ids, 2))): rng.random() for _ in range(300)}, 2.0
+    )
+    state = PartitionState(groups, pairing=pairing)
+
+    applied = 0
+    for _ in range(400):
+        i, j, k = rng.sample(range(len(state.members)), 3)
+        before = state.total
+        if state.can_move(i, state.assignment[j]):
+            delta = state.move_delta(i, state.assignment[j])
+            state.apply_move(i, state.assignment[j])
+        elif state.can_rotate(i, j, k):
+            delta = state.rotation_delta(i, j, k)
+            state.apply_rotation(i, j, k)
+        else:
+            continue
+        applied += 1
+        after = partition_score_components(state.to_groups(), pairing=pairing)
+        assert state.components() == pytest.approx(after)
+        assert state.total - before == pytest.approx(delta)
+    assert applied > 100
+    assert len(set(state.sizes)) > 1
+
+
+def test_neighborhood_keeps_placement_rules(groups, check_placement_rules):
+    random.seed(0)
+    unified = optimize_partition(groups)
+    random.seed(0)
+    result = optimize_partition(groups, neighborhood=True)
+
+    assert (
+        partition_score_components(result)["total"]
+        >= partition_score_components(unified)["total"]
+    )
+    check_placement_rules(groups, result)
+    assert all(5 <= len(g.members) <= 8 for g in result)
+
+
+def test_tabu_search_returns_best_partition_seen(groups, check_placement_rules):
+    random.seed(0)
+    local_optimum = optimize_partition(groups)
+    telemetry = OptimizerTelemetry(trace_enabled=True)
+    result = tabu_partition(local_optimum, telemetry=telemetry)
+
+    score = partition_score_components(result)["total"]
+    assert score > partition_score_components(local_optimum)["total"]
+    assert score == pytest.approx(max(total for _, total, _ in telemetry.trace))
+    assert telemetry.score_components["total"] == pytest.approx(score)
+    assert telemetry.stop_reason == "stagnation"
+    assert "tabu" in telemetry.phase_seconds
+    check_placement_rules(groups, result)
+    assert [len(g.members) for g in result] == [len(g.members) for g in groups]
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app.models import Attendance, GroupCap, GroupHistory, Member, MemberPair
+from scripts.populate_db import (
+    Profile,
+    bulk_populate,
+    clear_database,
+    create_fresh_database,
+    generate_attendance_rows,
+)
+
+
+def dump(engine):
+    with engine.connect() as conn:
+        members = conn.execute(
+            select(Member.id, Member.surname, Member.given_name, Member.role)
+        ).all()
+        attendance = conn.execute(
+            select(Attendance.member_id, Attendance.date).order_by(Attendance.id)
+        ).all()
+    return members, attendance
+
+
+def test_bulk_populate_is_reproducible(tmp_path):
+    end = date(2024, 6, 2)
+    engines = [create_fresh_database(tmp_path / f"{i}.db") for i in range(2)]
+    for engine in engines:
+        counts = bulk_populate(
+            engine, Profile.TYPICAL, size=500, weeks=10, seed=3, batch_size=64, end=end
+        )
+        assert counts["members"] == 500
+
+    members, attendance = dump(engines[0])
+    assert (members, attendance) == dump(engines[1])
+    assert len(attendance) == counts["attendance"]
+    assert len({(m.surname, m.given_name) for m in members}) == 500
+
+    # Everybody is present at the last meeting, earlier weeks are sparser
+    last = [a for a in attendance if a.date == end]
+    assert len(last) == 500
+    assert 10 * 500 > len(attendance) > 500
+    assert min(a.date for a in attendance) == end - timedelta(weeks=9)
+
+
+def test_bulk_populate_appends_after_existing_ids(tmp_path):
+    engine = create_fresh_database(tmp_path / "append.db")
+    bulk_populate(engine, Profile.DEFAULT, seed=1)
+    bulk_populate(engine, Profile.DEFAULT, size=10, seed=2)
+
+    with engine.connect() as conn:
+        assert conn.scalar(select(func.count(Member.id))) == 40
+        orphans = conn.scalar(
+            select(func.count(Attendance.id)).where(
+                Attendance.member_id.not_in(select(Member.id))
+            )
+        )
+    assert orphans == 0
+
+
+def test_create_fresh_database_replaces_file(tmp_path):
+    path = tmp_path / "fresh.db"
+    bulk_populate(create_fresh_database(path), size=5, seed=0)
+    members, _ = dump(create_fresh_database(path))
+    assert members == []
+
+
+def test_clear_database_removes_rows_referencing_members(tmp_path):
+    engine = create_fresh_database(tmp_path / "clear.db")
+    bulk_populate(engine, Profile.DEFAULT, size=4, seed=0)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(MemberPair),
+            [{"kind": "separate", "member_a_id": 1, "member_b_id": 2}],
+        )
+        conn.execute(
+            insert(GroupCap),
+            [{"attribute": "role", "value": "counselor", "max_per_group": 1}],
+        )
+        conn.execute(
+            insert(GroupHistory),
+            [{"date": date(2024, 1, 7), "group_no": 0, "member_id": 3}],
+        )
+
+    clear_database(engine)
+    with engine.connect() as conn:
+        for model in (Member, Attendance, MemberPair, GroupCap, GroupHistory):
+            assert conn.scalar(select(func.count()).select_from(model)) == 0
+
+
+def test_attendance_rows_cover_requested_weeks():
+    rows = list(generate_attendance_rows([1, 2, 3], weeks=4, end=date(2024, 1, 28)))
+    assert {r["date"] for r in rows if r["member_id"] == 1} >= {date(2024, 1, 28)}
+    assert {r["date"] for r in rows} <= {
+        date(2024, 1, 28) - timedelta(weeks=w) for w in range(4)
+    }
@@ -0,0 +1,111 @@
+import json
+import pstats
+from pathlib import Path
+
+import pytest
+
+from app import profiling
+
+
+@pytest.fixture
+def client(make_client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    return make_client()
+
+
+def test_profiling_is_off_without_config(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    response = client.post(
+        "/groups/generate", data={"target_size": 4}, headers={"X-Profile": "1"}
+    )
+    assert "X-Profile-File" not in response.headers
+    assert not (tmp_path / "profiles").exists()
+    assert client.get("/debug/profiles").status_code == 404
+
+
+def test_cprofile_includes_optimizer_thread(client, tmp_path):
+    response = client.post(
+        "/groups/generate", data={"target_size": 4}, headers={"X-Profile": "cprofile"}
+    )
+    assert response.status_code == 200
+    path = tmp_path / "profiles" / response.headers["X-Profile-File"]
+    assert path.suffix == ".prof"
+
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "divide_exact" in functions
+    assert "generate_groups" in functions
+
+    listing = client.get("/debug/profiles").json()
+    assert [p["name"] for p in listing["profiles"]] == [path.name]
+    download = client.get(f"/debug/profiles/{path.name}")
+    assert download.status_code == 200
+    assert download.content == path.read_bytes()
+
+
+def test_single_process_profile_covers_optimizer_thread(client, tmp_path, monkeypatch):
+    # From Python 3.12 on the request's profile sees every thread, and the
+    # optimizer thread must not enable a second one
+    monkeypatch.setattr(profiling, "_CPROFILE_PER_THREAD", False)
+    response = client.post(
+        "/groups/generate", data={"target_size": 4}, headers={"X-Profile": "cprofile"}
+    )
+    assert response.status_code == 200
+    path = tmp_path / "profiles" / response.headers["X-Profile-File"]
+    functions = {name for _, _, name in pstats.Stats(str(path)).stats}
+    assert "generate_groups" in functions
+
+
+def test_concurrent_cprofile_request_is_rejected(client, tmp_path):
+    with profiling._cprofile_lock:
+        response = client.get("/", headers={"X-Profile": "cprofile"})
+    assert response.status_code == 409
+    assert not (tmp_path / "profiles").exists()
+
+    response = client.get("/", headers={"X-Profile": "cprofile"})
+    assert response.status_code == 200
+    assert "X-Profile-File" in response.headers
+
+
+def test_sampling_profile_writes_collapsed_stacks(client, tmp_path):
+    response = client.get("/", params={"profile": "sample"})
+    assert response.status_code == 200
+    path = tmp_path / "profiles" / response.headers["X-Profile-File"]
+    assert path.suffix == ".folded"
+    for line in path.read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert stack
+
+
+def test_download_rejects_paths_outside_profiles_dir(client):
+    assert client.get("/debug/profiles/..%2Fprofiling.db").status_code == 404
+
+
+def test_memory_tracker_reports_peak_and_retained():
+    kept = []
+    with profiling.MemoryTracker(top=5) as tracker:
+        garbage = [bytearray(1000) for _ in range(200)]
+        del garbage
+        kept.append([bytearray(1000) for _ in range(50)])
+
+    report = tracker.report
+    assert report.peak_bytes >= 200_000
+    assert 50_000 <= report.retained_bytes < 200_000
+    assert "test_profiling.py" in report.retained[0]["site"]
+    assert report.retained[0]["count"] >= 50
+
+
+def test_memory_profile_of_optimizer_run(client, tmp_path):
+    response = client.post(
+        "/groups/generate", data={"target_size": 4}, headers={"X-Profile": "memory"}
+    )
+    assert response.status_code == 200
+    path = tmp_path / "profiles" / response.headers["X-Profile-File"]
+    assert path.suffix == ".json"
+
+    (run,) = json.loads(path.read_text())["runs"]
+    assert run["peak_bytes"] > 0
+    # The engine picked for 12 members keeps its own allocations, so any
+    # optimizer module may top the list
+    app_dir = str(Path(profiling.__file__).parent)
+    assert any(site["site"].startswith(app_dir) for site in run["allocations"])
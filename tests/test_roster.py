@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app import database, routes
+from app.group_divider import MemberRole
+from app.models import Attendance, Member
+from app.roster import load_present_roster
+
+
+@pytest.fixture
+def db(tmp_path):
+    database.init_db(tmp_path / "roster.db")
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+def add_member(db, name, role="none", active=True, **attendance):
+    member = Member(
+        given_name=name,
+        surname="Test",
+        gender="F",
+        faith_status="seeker",
+        role=role,
+        education_status="graduated" if role == "counselor" else "undergraduate",
+        active=active,
+        prep_attended=role == "facilitator",
+        notes="not loaded",
+    )
+    db.add(member)
+    db.flush()
+    for day, present in attendance.items():
+        db.add(
+            Attendance(
+                member_id=member.id, date=date.fromisoformat(day), present=present
+            )
+        )
+    return member
+
+
+def test_only_active_members_present_that_day_are_loaded(db):
+    day = date(2024, 3, 3)
+    other_day = str(day - timedelta(weeks=1))
+    expected = [
+        add_member(db, "a", role="facilitator", **{str(day): True}),
+        add_member(db, "b", role="counselor", **{str(day): True, other_day: True}),
+    ]
+    add_member(db, "absent", **{str(day): False})
+    add_member(db, "last week", **{other_day: True})
+    add_member(db, "inactive", active=False, **{str(day): True})
+    db.commit()
+
+    roster = load_present_roster(db, day)
+
+    assert [m.id for m in roster] == [m.id for m in expected]
+    facilitator, counselor = roster
+    assert facilitator.role == MemberRole.FACILITATOR
+    assert facilitator.prep_attended and not facilitator.is_graduated
+    assert counselor.role == MemberRole.COUNSELOR
+    assert counselor.is_graduated and counselor.is_present
+    assert counselor.name == "Testb"
+
+
+def test_duplicate_attendance_rows_do_not_duplicate_members(db):
+    day = date(2024, 3, 3)
+    member = add_member(db, "twice", **{str(day): True})
+    db.add(Attendance(member_id=member.id, date=day, present=True))
+    db.commit()
+
+    assert [m.id for m in load_present_roster(db, day)] == [member.id]
+
+
+def test_home_page_places_the_projected_roster(make_client, monkeypatch):
+    client = make_client()
+    loaded = []
+
+    def spy(db, day=None):
+        loaded.append(load_present_roster(db, day))
+        return loaded[-1]
+
+    monkeypatch.setattr(routes, "load_present_roster", spy)
+    assert client.get("/").status_code == 200
+
+    assert len(loaded) == 1 and len(loaded[0]) == 12
+    placed = {id(m) for g in routes.current_groups for m in g.members}
+    assert placed == {id(m) for m in loaded[0]}
@@ -0,0 +1,96 @@
+import pickle
+import random
+from multiprocessing import get_context
+
+import pytest
+
+from app.constraints import AttributeCap, ConstraintSet
+from app.diversity import DiversityConfig
+from app.group_divider import divide_into_groups
+from app.history import RepeatPairing
+from app.partition import PartitionState
+from app.shared_roster import SharedRoster, attach
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+DIVERSITY = DiversityConfig.independent({"gender": 1, "role": 0.5, "faith_status": 1})
+
+
+@pytest.fixture
+def groups(make_groups):
+    return make_groups(Profile.TYPICAL, 60, 8, seed=6)
+
+
+@pytest.fixture
+def config(groups):
+    rng = random.Random(6)
+    ids = [m.id for g in groups for m in g.members]
+    constraints = ConstraintSet(
+        separate=tuple(tuple(rng.sample(ids, 2)) for _ in range(4)),
+        together=tuple(tuple(rng.sample(ids, 2)) for _ in range(4)),
+        caps=(AttributeCap("role", "counselor", 1),),
+    )
+    pairing = RepeatPairing(
+        {tuple(sorted(rng.sample(ids, 2))): rng.random() for _ in range(100)}, 1.0
+    )
+    return {"diversity": DIVERSITY, "constraints": constraints, "pairing": pairing}
+
+
+def worker_total(handle, assignment):
+    state = attach(handle).state(assignment)
+    return state.total, state.violations
+
+
+def test_attached_state_matches_roster(groups, config):
+    expected = PartitionState(groups, **config)
+    with SharedRoster(groups, **config) as roster:
+        state = attach(roster.handle).state()
+        assert attach(roster.handle) is attach(roster.handle)
+        assert state.components() == pytest.approx(expected.components())
+        assert state.violations == expected.violations
+
+        rng = random.Random(0)
+        for _ in range(100):
+            i, j = rng.sample(range(len(state.members)), 2)
+            if state.assignment[i] == state.assignment[j]:
+                continue
+            assert state.swap_delta(i, j) == pytest.approx(expected.swap_delta(i, j))
+            assert state.constraint_state.swap_delta(
+                i, j
+            ) == expected.constraint_state.swap_delta(i, j)
+            state.apply_swap(i, j)
+            expected.apply_swap(i, j)
+
+
+def test_workers_score_assignments(groups, config):
+    rng = random.Random(1)
+    assignments = [[rng.randrange(len(groups)) for _ in range(60)] for _ in range(3)]
+    with SharedRoster(groups, **config) as roster:
+        with get_context("forkserver").Pool(1) as pool:
+            results = pool.starmap(
+                worker_total, [(roster.handle, a) for a in assignments]
+            )
+        for assignment, (total, violations) in zip(assignments, results):
+            expected = PartitionState(roster.to_groups(assignment), **config)
+            assert total == pytest.approx(expected.total)
+            assert violations == expected.violations
+
+
+def test_handle_size_does_not_grow_with_roster():
+    sizes = []
+    for n in (50, 2000):
+        members = synthetic_roster(Profile.TYPICAL, n, seed=1)
+        groups = divide_into_groups(members, n // 7, max_iterations=0)
+        with SharedRoster(groups) as roster:
+            sizes.append(len(pickle.dumps(roster.handle)))
+    # Only the integers in the column layout get a little longer
+    assert sizes[1] - sizes[0] < 32
+    assert sizes[1] < len(pickle.dumps(members)) / 100
+
+
+def test_closed_roster_cannot_be_attached(groups):
+    roster = SharedRoster(groups)
+    handle = roster.handle
+    roster.close()
+    with pytest.raises(FileNotFoundError):
+        attach(handle)
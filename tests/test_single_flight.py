@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+from app.group_divider import (
+    GroupMember,
+    MemberRole,
+    Group,
+    balance_gender_in_groups,
+)
+from app.single_flight import (
+    CancellationToken,
+    OptimizationCancelled,
+    SingleFlight,
+    roster_fingerprint,
+)
+
+
+def make_member(id: int, gender: str = "M") -> GroupMember:
+    return GroupMember(
+        id=id,
+        surname="Test",
+        given_name=str(id),
+        role=MemberRole.REGULAR,
+        gender=gender,
+        faith_status="believer",
+        education_status="undergraduate",
+        is_graduated=False,
+        is_present=True,
+        prep_attended=False,
+    )
+
+
+def test_fingerprint_ignores_order_but_not_parameters():
+    members = [make_member(1), make_member(2, "F")]
+    assert roster_fingerprint(members, target_size=7) == roster_fingerprint(
+        list(reversed(members)), target_size=7
+    )
+    assert roster_fingerprint(members, target_size=7) != roster_fingerprint(
+        members, target_size=6
+    )
+
+
+def test_identical_requests_share_one_run():
+    flights = SingleFlight(poll_interval=0.01)
+    calls = []
+    release = threading.Event()
+
+    def work(token):
+        calls.append(token)
+        release.wait(5)
+        return "groups"
+
+    async def scenario():
+        first = asyncio.ensure_future(flights.run("key", work))
+        second = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await first, await second
+
+    (result1, flight1), (result2, flight2) = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert result1 == result2 == "groups"
+    assert flight1 is flight2
+
+
+def test_invalidate_cancels_and_rejects_stale_results():
+    flights = SingleFlight(poll_interval=0.01)
+
+    def work(token):
+        while True:
+            token.raise_if_cancelled()
+
+    async def scenario():
+        task = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0.05)
+        flights.invalidate()
+        with pytest.raises(OptimizationCancelled):
+            await task
+
+    asyncio.run(scenario())
+    # A result computed in an older generation must never be published
+    assert not flights.publish(flights.next_seq(), flights.generation - 1)
+    newer = flights.next_seq()
+    assert flights.publish(newer, flights.generation)
+    assert not flights.publish(newer - 1, flights.generation)
+
+
+def test_disconnected_client_cancels_run():
+    flights = SingleFlight(poll_interval=0.01)
+    tokens = []
+
+    def work(token):
+        tokens.append(token)
+        while True:
+            token.raise_if_cancelled()
+
+    async def disconnected():
+        return True
+
+    async def scenario():
+        with pytest.raises(OptimizationCancelled):
+            await flights.run("key", work, is_disconnected=disconnected)
+
+    asyncio.run(scenario())
+    assert tokens[0].cancelled
+    assert flights.in_flight() == 0
+
+
+def test_balancer_honours_cancellation():
+    token = CancellationToken()
+    token.cancel("attendance changed")
+    groups = [
+        Group(members=[make_member(1), make_member(2)]),
+        Group(members=[make_member(3, "F"), make_member(4, "F")]),
+    ]
+    with pytest.raises(OptimizationCancelled):
+        balance_gender_in_groups(groups, cancel_token=token)
@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app import database, routes
+from app.group_divider import GroupMember, MemberRole, divide_into_groups
+from app.models import OptimizerRun
+from app.telemetry import OptimizerTelemetry, TelemetryStore, telemetry_store
+
+
+@pytest.fixture
+def members():
+    return [
+        GroupMember(
+            id=i,
+            surname="Test",
+            given_name=str(i),
+            role=MemberRole.FACILITATOR if i < 3 else MemberRole.REGULAR,
+            gender="M" if i % 3 else "F",
+            faith_status="believer",
+            education_status="undergraduate",
+            is_graduated=False,
+            is_present=True,
+            prep_attended=i % 4 == 0,
+        )
+        for i in range(14)
+    ]
+
+
+def test_divide_records_phases_and_scores(members):
+    telemetry = OptimizerTelemetry()
+    groups = divide_into_groups(members, 3, max_iterations=500, telemetry=telemetry)
+
+    assert telemetry.roster_size == 14
+    assert telemetry.num_groups == len(groups)
+    assert set(telemetry.phase_seconds) == {"placement", "balancing"}
+    assert telemetry.stop_reason in ("optimal", "stagnation", "max_iterations")
+    assert telemetry.optimality_gap >= 0
+    assert telemetry.iterations >= telemetry.accepted_moves
+    assert telemetry.score_components["total"] == pytest.approx(
+        sum(g.calculate_diversity_score(groups) for g in groups)
+    )
+
+
+def test_store_is_bounded_and_persists(tmp_path, members):
+    database.init_db(tmp_path / "telemetry.db")
+    store = TelemetryStore(maxlen=2)
+    for _ in range(3):
+        telemetry = OptimizerTelemetry()
+        divide_into_groups(members, 3, max_iterations=10, telemetry=telemetry)
+        store.record(telemetry)
+
+    assert len(store.recent()) == 2
+    assert store.summary()["greedy"]["runs"] == 2
+
+    store.flush()
+    db = database.SessionLocal()
+    try:
+        assert db.query(OptimizerRun).count() == 3
+    finally:
+        db.close()
+
+
+def test_record_does_not_wait_for_the_database(tmp_path):
+    database.init_db(tmp_path / "telemetry.db")
+    store = TelemetryStore()
+    blocker = sqlite3.connect(tmp_path / "telemetry.db", check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.5, blocker.commit)
+    release.start()
+
+    start = time.perf_counter()
+    for _ in range(3):
+        store.record(OptimizerTelemetry())
+    assert time.perf_counter() - start < 0.25
+
+    store.flush()
+    release.join()
+    blocker.close()
+    db = database.SessionLocal()
+    try:
+        assert db.query(OptimizerRun).count() == 3
+    finally:
+        db.close()
+
+
+def test_home_page_views_are_not_recorded_as_runs(make_client):
+    client = make_client()
+    telemetry_store.clear()
+    for _ in range(3):
+        response = client.get("/")
+        assert response.status_code == 200
+
+    assert routes.current_groups
+    assert telemetry_store.recent() == []
+    assert "opt;dur=" in response.headers["Server-Timing"]
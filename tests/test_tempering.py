@@ -0,0 +1,90 @@
+import multiprocessing
+import time
+
+import pytest
+
+from app.constraints import AttributeCap, ConstraintSet
+from app.engines import run_engine
+from app.group_divider import partition_score_components
+from app.single_flight import CancellationToken, OptimizationCancelled
+from app.telemetry import OptimizerTelemetry
+from app.tempering import parallel_tempering, start_forkserver, temperatures
+from benchmarks.synthetic import synthetic_roster
+from scripts.populate_db import Profile
+
+
+@pytest.fixture
+def groups(make_groups):
+    return make_groups(Profile.IMBALANCED, 60, 8, seed=3)
+
+
+def test_temperature_ladder_is_geometric():
+    ladder = temperatures(4)
+    assert ladder[0] < ladder[-1]
+    assert ladder[1] / ladder[0] == pytest.approx(ladder[3] / ladder[2])
+
+
+def test_returns_best_partition_found(groups, check_placement_rules):
+    telemetry = OptimizerTelemetry(trace_enabled=True)
+    result = parallel_tempering(groups, telemetry=telemetry, time_limit=1, replicas=3)
+
+    score = partition_score_components(result)["total"]
+    assert score > partition_score_components(groups)["total"]
+    assert score == pytest.approx(max(total for _, total, _ in telemetry.trace))
+    assert telemetry.score_components["total"] == pytest.approx(score)
+    assert telemetry.stop_reason == "time_limit"
+    assert telemetry.iterations > 0
+    assert not multiprocessing.active_children()
+
+    check_placement_rules(groups, result)
+
+
+def test_engine_satisfies_constraints():
+    members = synthetic_roster(Profile.TYPICAL, 70, seed=5)
+    ids = [m.id for m in members if not m.is_graduated]
+    constraints = ConstraintSet(
+        separate=((ids[0], ids[1]),),
+        together=((ids[2], ids[3]),),
+        caps=(AttributeCap("role", "counselor", 1),),
+    )
+    telemetry = OptimizerTelemetry()
+    groups = run_engine(
+        "tempering",
+        members,
+        10,
+        telemetry=telemetry,
+        time_limit=1,
+        constraints=constraints,
+    )
+
+    assert telemetry.engine == "tempering"
+    assert telemetry.constraint_violations == 0
+    group_of = {m.id: g for g, group in enumerate(groups) for m in group.members}
+    assert group_of[ids[0]] != group_of[ids[1]]
+    assert group_of[ids[2]] == group_of[ids[3]]
+
+
+def test_cancellation_stops_workers(groups):
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(OptimizationCancelled):
+        parallel_tempering(groups, cancel_token=token, time_limit=1, replicas=2)
+    assert not multiprocessing.active_children()
+
+
+def test_started_forkserver_keeps_runs_within_limit(groups):
+    start_forkserver()
+    start = time.perf_counter()
+    parallel_tempering(groups, time_limit=0.1, replicas=2)
+    assert time.perf_counter() - start < 0.6
+
+
+def test_forkserver_preloads_both_worker_modules():
+    from multiprocessing import forkserver
+
+    import app.alternatives  # noqa: F401
+
+    assert sorted(forkserver._forkserver._preload_modules) == [
+        "app.alternatives",
+        "app.tempering",
+    ]
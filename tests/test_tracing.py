@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from app import tracing
+
+
+@pytest.fixture
+def client(make_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(
+        tracing, "exporter", tracing.JsonLinesExporter(tmp_path / "t.jsonl")
+    )
+    return make_client()
+
+
+def read_traces(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_generate_request_produces_full_trace(client, tmp_path):
+    response = client.post("/groups/generate", data={"target_size": 4})
+    assert response.status_code == 200
+
+    (trace,) = read_traces(tmp_path / "t.jsonl")
+    assert trace["name"] == "POST /groups/generate"
+    assert response.headers["X-Trace-Id"] == trace["trace_id"]
+
+    names = {s["name"] for s in trace["spans"]}
+    assert {
+        "handler",
+        "db.query",
+        "group_member_conversion",
+        "optimizer",
+        "divide_into_groups.placement",
+        "branch_and_bound",
+        "template.render",
+    } <= names
+
+    # Optimizer phases are nested under the optimizer span
+    spans = {s["span_id"]: s for s in trace["spans"]}
+    placement = next(
+        s for s in trace["spans"] if s["name"] == "divide_into_groups.placement"
+    )
+    assert spans[placement["parent_id"]]["name"] == "optimizer"
+
+
+def test_untraced_paths_and_unsampled_requests_export_nothing(
+    client, tmp_path, monkeypatch
+):
+    client.get("/debug/members")
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    client.post("/members/search", data={"query": ""})
+    assert not (tmp_path / "t.jsonl").exists()
+
+
+def test_span_is_noop_outside_trace():
+    with tracing.span("anything") as s:
+        assert s is None